@@ -0,0 +1,134 @@
+# backend/db_routing.py
+"""
+Read-replica routing.
+
+Reads made while serving a GET/HEAD/OPTIONS request go to a replica; every
+write, and every read after a write in the same request, goes to the
+primary. A client that has just written successfully is pinned to the
+primary for REPLICA_STICKY_SECONDS so it reads its own writes despite
+replication lag: by a cookie, and for authenticated users also by a
+PrimaryPin row, which holds for token clients that don't keep cookies and
+for the same user on another device.
+
+Any alias in DATABASES other than 'default' is treated as a replica. With
+no replica configured everything stays on 'default'.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.authentication import get_authorization_header
+
+PRIMARY = 'default'
+STICKY_COOKIE = 'db_pin_primary'
+
+# True while the current request may read from a replica
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias != PRIMARY]
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Route reads inside this block to a replica (the middleware does this per request)"""
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def pin_primary():
+    """Send the remaining reads of the current request to the primary"""
+    _replica_reads.set(False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get():
+            replicas = replica_aliases()
+            if replicas:
+                return random.choice(replicas)
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        # Read-your-writes within a request: nothing after this may hit a lagging replica
+        pin_primary()
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+def _pinned_users(request):
+    """PrimaryPin rows that would pin this request's user: by API token, else by session user"""
+    from medicalapp.models import PrimaryPin
+
+    auth = get_authorization_header(request).split()
+    if len(auth) == 2 and auth[0].lower() == b'token':
+        return PrimaryPin.objects.filter(user__auth_token__key=auth[1].decode(errors='replace'))
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return PrimaryPin.objects.filter(user_id=user.id)
+    return None
+
+
+def pin_user(user, seconds):
+    """Pin `user`'s reads to the primary for `seconds`, from any client"""
+    from medicalapp.models import PrimaryPin
+
+    PrimaryPin.objects.bulk_create(
+        [PrimaryPin(user_id=user.id, pinned_until=timezone.now() + timedelta(seconds=seconds))],
+        update_conflicts=True, unique_fields=['user'], update_fields=['pinned_until'],
+    )
+
+
+class ReplicaRoutingMiddleware:
+    """Enable replica reads for safe requests from clients that have not written recently"""
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def pinned(self, request):
+        pinned_until = request.COOKIES.get(STICKY_COOKIE)
+        try:
+            if pinned_until is not None and float(pinned_until) > time.time():
+                return True
+        except ValueError:
+            pass
+        # Read outside replica_reads, so from the primary: a replica may not have the pin yet
+        pins = _pinned_users(request)
+        return pins is not None and pins.filter(pinned_until__gt=timezone.now()).exists()
+
+    def __call__(self, request):
+        if not replica_aliases():
+            return self.get_response(request)
+
+        sticky_seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+        safe = request.method in self.SAFE_METHODS
+        use_replica = safe and not self.pinned(request)
+        with replica_reads(use_replica):
+            response = self.get_response(request)
+
+        # Failed writes changed nothing worth reading back
+        if not safe and sticky_seconds and response.status_code < 400:
+            response.set_cookie(
+                STICKY_COOKIE, str(time.time() + sticky_seconds),
+                max_age=sticky_seconds, httponly=True, samesite='Lax'
+            )
+            # DRF sets the authenticated user on the underlying request
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                pin_user(user, sticky_seconds)
+        return response
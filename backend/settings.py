@@ -36,6 +36,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Local Apps
     'medicalapp.apps.MedicalappConfig',
@@ -53,6 +54,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'backend.db_routing.ReplicaRoutingMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -93,6 +95,35 @@ DATABASES = {
     }
 }
 
+# Optional read replica. Any extra alias is used for reads by backend.db_routing;
+# for local testing point it at a second Postgres (or SQLite) database.
+if os.environ.get('DATABASE_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ['DATABASE_REPLICA_HOST'],
+        'PORT': os.environ.get('DATABASE_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['backend.db_routing.ReplicaRouter']
+
+# Seconds a client reads from the primary after writing (read-your-writes)
+REPLICA_STICKY_SECONDS = 5
+
+
+# The cache only holds derived data (medication stats, availability
+# calendars) under keys that include database-backed versions
+# (medicalapp.caching.current_version, slots.slot_state), so a write in one
+# worker changes the key every worker reads. State that must be shared, such
+# as chatbot sessions, lives in the database. A per-process backend is
+# therefore safe; a shared one just saves each worker recomputing.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'medicalapp-default',
+    }
+}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -142,4 +173,18 @@ REST_FRAMEWORK = {
 
 # Whisper configuration
 WHISPER_MODEL_SIZE = 'small'  # Options: 'tiny', 'base', 'small', 'medium', 'large-v2'
-WHISPER_DEVICE = 'cuda'  # Use 'cuda' for your GTX 1650 Ti
\ No newline at end of file
+WHISPER_DEVICE = 'cuda'  # Use 'cuda' for your GTX 1650 Ti
+
+# Conversations idle this long are moved to MessageArchive by `manage.py archive_messages`
+MESSAGE_ARCHIVE_INACTIVE_DAYS = 90
+
+# Server-side appointment chatbot sessions expire after this many idle seconds
+APPOINTMENT_CHAT_SESSION_TTL = 30 * 60
+
+# Appointment reminders (`manage.py send_reminders --interval 60`)
+APPOINTMENT_REMINDER_LEADS = [24 * 60, 2 * 60]  # minutes before the appointment
+APPOINTMENT_REMINDER_TRANSPORT = 'medicalapp.reminders.ConsoleTransport'
+APPOINTMENT_REMINDER_FILE = BASE_DIR / 'appointment_reminders.ndjson'  # used by FileTransport
+
+# Wearable batches sent to /api/health-metrics/ingest/ (read outside DATA_UPLOAD_MAX_MEMORY_SIZE)
+HEALTH_INGEST_MAX_BYTES = 32 * 1024 * 1024
@@ -0,0 +1,165 @@
+# medicalapp/adherence.py
+"""
+Medication adherence from daily rollups.
+
+Every dose log adds to its medication's AdherenceDay row for the local day
+it was logged (taken, late or missed), so the adherence endpoint sums at
+most one row per medication per day in the window instead of scanning the
+log table. The doses that were due come from the schedules, which are
+small and already prefetched.
+
+record_doses() is the only writer: the MedicationLog post_save signal calls
+it for single logs and bulk writers call it with the whole batch.
+"""
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .dosing import MISSED_AFTER, expand_doses
+from .models import AdherenceDay, DoseSchedule, MedicationLog
+
+# Windows reported by the adherence endpoint, in days
+WINDOWS = (7, 30, 90)
+# A taken dose logged more than this after it was due counts as late
+LATE_AFTER = timedelta(minutes=30)
+
+
+def is_late(schedules, taken_at):
+    """True if the latest dose due before `taken_at` was due more than LATE_AFTER earlier"""
+    due = None
+    for due_at, _schedule in expand_doses(schedules, taken_at - timedelta(days=1), taken_at + LATE_AFTER):
+        if due_at <= taken_at:
+            due = due_at
+    return due is not None and taken_at - due > LATE_AFTER
+
+
+def record_doses(logs):
+    """
+    Add `logs` (MedicationLog instances, saved or not) to the daily rollups.
+    Three queries however many logs: make sure every (medication, day) row
+    exists, lock them, and write the new counts back.
+    """
+    if not logs:
+        return
+    medication_ids = {log.medication_id for log in logs}
+    schedules = {}
+    for schedule in DoseSchedule.objects.filter(medication_id__in=medication_ids).prefetch_related('times'):
+        schedules.setdefault(schedule.medication_id, []).append(schedule)
+
+    counts = {}
+    for log in logs:
+        key = (log.medication_id, timezone.localtime(log.taken_at).date())
+        row = counts.setdefault(key, Counter())
+        if log.status == 'taken':
+            row['taken'] += 1
+            if is_late(schedules.get(log.medication_id, []), log.taken_at):
+                row['late'] += 1
+        elif log.status == 'missed':
+            row['missed'] += 1
+
+    with transaction.atomic():
+        AdherenceDay.objects.bulk_create(
+            [AdherenceDay(medication_id=medication_id, day=day) for medication_id, day in counts],
+            ignore_conflicts=True,
+        )
+        keys = Q()
+        for medication_id, day in counts:
+            keys |= Q(medication_id=medication_id, day=day)
+        rows = list(AdherenceDay.objects.select_for_update().filter(keys))
+        for row in rows:
+            added = counts[(row.medication_id, row.day)]
+            row.taken += added['taken']
+            row.late += added['late']
+            row.missed += added['missed']
+        AdherenceDay.objects.bulk_update(rows, ['taken', 'late', 'missed'])
+
+
+def rebuild_adherence(medications, chunk_size=2000):
+    """Recompute the rollups of `medications` (a queryset) from their logs; returns logs counted"""
+    AdherenceDay.objects.filter(medication__in=medications).delete()
+    logs = MedicationLog.objects.filter(medication__in=medications).only(
+        'medication_id', 'taken_at', 'status'
+    ).order_by('id')
+    counted = 0
+    batch = []
+    for log in logs.iterator(chunk_size=chunk_size):
+        batch.append(log)
+        if len(batch) >= chunk_size:
+            record_doses(batch)
+            counted += len(batch)
+            batch = []
+    record_doses(batch)
+    return counted + len(batch)
+
+
+def _window_summary(scheduled, taken, late, missed):
+    return {
+        'scheduled': scheduled,
+        'taken': taken,
+        'late': late,
+        # Doses nobody logged are missed too, once they're due
+        'missed': max(missed, scheduled - taken),
+    }
+
+
+def _with_rate(counts):
+    scheduled = counts['scheduled']
+    counts['adherence'] = round(min(counts['taken'] / scheduled, 1.0), 3) if scheduled else None
+    return counts
+
+
+def adherence_report(medications, now=None):
+    """
+    Adherence per medication and overall over each of WINDOWS, ending now:
+    {'windows': {7: {...}, ...}, 'medications': [{'id', 'name', 'windows': {...}}]}.
+    `medications` must have schedules__times prefetched.
+    """
+    now = now or timezone.now()
+    today = timezone.localtime(now).date()
+    first_days = {days: today - timedelta(days=days - 1) for days in WINDOWS}
+
+    sums = {}
+    for days, first_day in first_days.items():
+        in_window = Q(day__gte=first_day)
+        sums[f'taken_{days}'] = Sum('taken', filter=in_window)
+        sums[f'late_{days}'] = Sum('late', filter=in_window)
+        sums[f'missed_{days}'] = Sum('missed', filter=in_window)
+    rollups = {
+        row['medication_id']: row
+        for row in AdherenceDay.objects.filter(
+            medication__in=medications, day__gte=first_days[max(WINDOWS)], day__lte=today
+        ).values('medication_id').annotate(**sums).order_by()
+    }
+
+    start = timezone.make_aware(datetime.combine(first_days[max(WINDOWS)], time(0)))
+    totals = {days: Counter() for days in WINDOWS}
+    report = []
+    for medication in medications:
+        rollup = rollups.get(medication.id, {})
+        due_dates = [
+            timezone.localtime(due_at).date()
+            # A dose isn't missed until MISSED_AFTER has passed, so don't expect it yet
+            for due_at, _schedule in expand_doses(medication.schedules.all(), start, now - MISSED_AFTER)
+        ]
+        windows = {}
+        for days, first_day in first_days.items():
+            summary = _window_summary(
+                scheduled=sum(1 for day in due_dates if day >= first_day),
+                taken=rollup.get(f'taken_{days}') or 0,
+                late=rollup.get(f'late_{days}') or 0,
+                missed=rollup.get(f'missed_{days}') or 0,
+            )
+            totals[days].update(summary)
+            windows[days] = _with_rate(summary)
+        report.append({'id': medication.id, 'name': medication.name, 'windows': windows})
+
+    return {
+        'windows': {
+            days: _with_rate({field: totals[days][field] for field in ('scheduled', 'taken', 'late', 'missed')})
+            for days in WINDOWS
+        },
+        'medications': report,
+    }
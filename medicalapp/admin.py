@@ -1,6 +1,6 @@
 # medicalapp/admin.py
 from django.contrib import admin
-from .models import Conversation, Message, MedicalImage, Medication, MedicationLog,MedicalSpecialty, Doctor, DoctorAvailability, AppointmentCategory,AppointmentSubcategory, LocationOption, Appointment
+from .models import Conversation, Message, MedicalImage, MessageArchive, Medication, MedicationLog,MedicalSpecialty, Doctor, DoctorAvailability, AppointmentCategory,AppointmentSubcategory, LocationOption, Appointment, AvailabilityTemplate, AvailabilityException, Language, AppointmentReminder, DoctorRecommendation, DoseSchedule, DoseTime, AdherenceDay, HealthAlert
 
 
 # Register your models here
@@ -8,34 +8,88 @@ admin.site.register(Conversation)
 admin.site.register(Message)
 admin.site.register(MedicalImage)
 
+@admin.register(MessageArchive)
+class MessageArchiveAdmin(admin.ModelAdmin):
+    list_display = ('conversation', 'message_count', 'codec', 'last_message_at', 'archived_at')
+    exclude = ('payload',)
+
 @admin.register(Medication)
 class MedicationAdmin(admin.ModelAdmin):
     list_display = ('name', 'user', 'next_dose', 'status', 'refill_date', 'remaining')
     list_filter = ('status', 'refill_date')
     search_fields = ('name', 'user__username')
 
+class DoseTimeInline(admin.TabularInline):
+    model = DoseTime
+    extra = 0
+
+@admin.register(DoseSchedule)
+class DoseScheduleAdmin(admin.ModelAdmin):
+    list_display = ('medication', 'interval_days', 'start_date', 'end_date', 'is_active')
+    list_filter = ('is_active',)
+    search_fields = ('medication__name', 'medication__user__username')
+    inlines = [DoseTimeInline]
+
 @admin.register(MedicationLog)
 class MedicationLogAdmin(admin.ModelAdmin):
     list_display = ('medication', 'taken_at', 'status')
     list_filter = ('status', 'taken_at')
     search_fields = ('medication__name', 'medication__user__username')
 
+@admin.register(AdherenceDay)
+class AdherenceDayAdmin(admin.ModelAdmin):
+    list_display = ('medication', 'day', 'taken', 'late', 'missed')
+    list_filter = ('day',)
+    search_fields = ('medication__name', 'medication__user__username')
+
+@admin.register(HealthAlert)
+class HealthAlertAdmin(admin.ModelAdmin):
+    list_display = ('user', 'metric', 'value', 'severity', 'kind', 'reading_at', 'acknowledged_at')
+    list_filter = ('severity', 'kind', 'metric')
+    search_fields = ('user__username',)
+
 #  Admin classes with improved display
 @admin.register(MedicalSpecialty)
 class MedicalSpecialtyAdmin(admin.ModelAdmin):
     list_display = ['name', 'description']
     search_fields = ['name']
 
+class AvailabilityTemplateInline(admin.TabularInline):
+    model = AvailabilityTemplate
+    extra = 0
+
 @admin.register(Doctor)
 class DoctorAdmin(admin.ModelAdmin):
     list_display = ['name', 'specialty', 'is_active', 'languages']
-    list_filter = ['specialty', 'is_active']
+    list_filter = ['specialty', 'is_active', 'spoken_languages']
     search_fields = ['name', 'specialty__name']
+    inlines = [AvailabilityTemplateInline]
+
+@admin.register(Language)
+class LanguageAdmin(admin.ModelAdmin):
+    list_display = ['name']
+    search_fields = ['name']
+
+@admin.register(DoctorRecommendation)
+class DoctorRecommendationAdmin(admin.ModelAdmin):
+    list_display = ['doctor', 'score', 'next_free_at', 'free_slots_week', 'upcoming_appointments', 'refreshed_at']
+    ordering = ['-score']
 
 @admin.register(DoctorAvailability)
 class DoctorAvailabilityAdmin(admin.ModelAdmin):
-    list_display = ['doctor', 'date', 'start_time', 'end_time', 'is_available']
-    list_filter = ['date', 'is_available', 'doctor']
+    list_display = ['doctor', 'date', 'start_time', 'end_time', 'is_available', 'generated']
+    list_filter = ['date', 'is_available', 'generated', 'doctor']
+    date_hierarchy = 'date'
+
+@admin.register(AvailabilityTemplate)
+class AvailabilityTemplateAdmin(admin.ModelAdmin):
+    list_display = ['doctor', 'weekday', 'start_time', 'end_time', 'slot_minutes', 'is_active']
+    list_filter = ['weekday', 'is_active', 'doctor']
+
+@admin.register(AvailabilityException)
+class AvailabilityExceptionAdmin(admin.ModelAdmin):
+    list_display = ['date', 'doctor', 'start_time', 'end_time', 'reason']
+    list_filter = ['date', 'doctor']
     date_hierarchy = 'date'
 
 @admin.register(AppointmentCategory)
@@ -60,3 +114,9 @@ class AppointmentAdmin(admin.ModelAdmin):
     list_filter = ['status', 'appointment_date', 'doctor']
     date_hierarchy = 'appointment_date'
     search_fields = ['patient_name', 'patient_email', 'doctor__name']
+
+@admin.register(AppointmentReminder)
+class AppointmentReminderAdmin(admin.ModelAdmin):
+    list_display = ['appointment', 'lead_minutes', 'scheduled_for', 'status', 'attempts', 'sent_at']
+    list_filter = ['status', 'lead_minutes']
+    date_hierarchy = 'scheduled_for'
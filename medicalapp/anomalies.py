@@ -0,0 +1,155 @@
+# medicalapp/anomalies.py
+"""
+Flag dangerous or unusual HealthMetrics readings as they arrive.
+
+Two checks run on every new reading:
+
+- limits: fixed clinical bounds (a systolic of 180, SpO2 under 90) that
+  are dangerous for anyone, whatever their history;
+- deviation: a z-score against the user's own baseline, an exponentially
+  weighted mean and variance per metric, so a resting heart rate of 105
+  stands out for someone who usually sits at 60.
+
+Baselines are one HealthBaseline row per user holding [mean, variance,
+count] per metric. Folding in a reading is O(1) (no history is read), and
+a batch of readings costs a handful of queries however large it is. They
+follow new readings only: edits and deletes don't rewind them, and
+rebuild_baselines() replays history after a correction or a change to
+ALPHA.
+"""
+import math
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import HealthAlert, HealthBaseline, HealthMetricRollup
+
+# Weight of the newest reading; ~1/ALPHA readings dominate the baseline
+ALPHA = 0.1
+# Readings a metric's baseline needs before deviations are flagged
+WARMUP_READINGS = 10
+Z_THRESHOLD = 3.5
+# Alerts the alerts endpoint returns at most
+MAX_ALERTS = 100
+
+# metric -> (critical low, warning low, warning high, critical high); None where there's no bound
+LIMITS = {
+    'systolic_bp': (80, 90, 160, 180),
+    'diastolic_bp': (None, 50, 100, 120),
+    'heart_rate': (40, 50, 120, 150),
+    'oxygen_saturation': (90, 94, None, None),
+    'blood_glucose': (54, 70, 250, 300),
+    'weight': (None, None, None, None),
+}
+# Smallest standard deviation a baseline is credited with, so a run of
+# identical readings doesn't turn the next small change into a huge z-score
+MIN_SPREAD = {
+    'systolic_bp': 5, 'diastolic_bp': 4, 'heart_rate': 5,
+    'oxygen_saturation': 1, 'blood_glucose': 8, 'weight': 0.5,
+}
+LABELS = dict(HealthMetricRollup.METRIC_CHOICES)
+
+
+def fold(stats, value, alpha=ALPHA):
+    """[mean, variance, count] after one more reading; `stats` is None for the first"""
+    if stats is None:
+        return [value, 0.0, 1]
+    mean, variance, count = stats
+    diff = value - mean
+    increment = alpha * diff
+    return [mean + increment, (1 - alpha) * (variance + diff * increment), count + 1]
+
+
+def _limit_alert(metric, value):
+    critical_low, warning_low, warning_high, critical_high = LIMITS[metric]
+    for bound, severity, low in [(critical_low, 'critical', True), (critical_high, 'critical', False),
+                                 (warning_low, 'warning', True), (warning_high, 'warning', False)]:
+        if bound is not None and (value < bound if low else value >= bound):
+            side = 'below' if low else 'at or above'
+            return severity, f"{LABELS[metric]} {value:g} is {side} the safe limit of {bound:g}"
+    return None
+
+
+def check_reading(baseline, reading):
+    """Unsaved HealthAlerts for `reading`, folding it into `baseline.state` as it goes"""
+    alerts = []
+    for metric in LIMITS:
+        value = getattr(reading, metric)
+        if value is None:
+            continue
+        value = float(value)
+        stats = baseline.state.get(metric)
+        expected = z_score = None
+        if stats is not None:
+            mean, variance, count = stats
+            expected = round(mean, 2)
+            z_score = round((value - mean) / max(math.sqrt(variance), MIN_SPREAD[metric]), 2)
+
+        limit = _limit_alert(metric, value)
+        if limit is not None:
+            severity, message = limit
+            kind = 'limit'
+        elif stats is not None and stats[2] >= WARMUP_READINGS and abs(z_score) >= Z_THRESHOLD:
+            severity, kind = 'warning', 'deviation'
+            message = (f"{LABELS[metric]} {value:g} is unusually {'high' if z_score > 0 else 'low'} "
+                       f"(usually around {expected:g})")
+        else:
+            kind = None
+        if kind is not None:
+            alerts.append(HealthAlert(
+                user_id=reading.user_id, metric=metric, value=value, reading_at=reading.timestamp,
+                kind=kind, severity=severity, expected=expected, z_score=z_score, message=message,
+            ))
+
+        baseline.state[metric] = fold(stats, value)
+    if baseline.last_at is None or reading.timestamp > baseline.last_at:
+        baseline.last_at = reading.timestamp
+    return alerts
+
+
+def observe_readings(readings):
+    """Check newly created readings (saved HealthMetrics) and fold them into their users' baselines; returns the alerts"""
+    by_user = defaultdict(list)
+    for reading in readings:
+        by_user[reading.user_id].append(reading)
+    if not by_user:
+        return []
+
+    alerts = []
+    with transaction.atomic():
+        HealthBaseline.objects.bulk_create(
+            [HealthBaseline(user_id=user_id) for user_id in by_user], ignore_conflicts=True
+        )
+        baselines = list(HealthBaseline.objects.select_for_update().filter(user_id__in=by_user).order_by('user_id'))
+        now = timezone.now()
+        for baseline in baselines:
+            for reading in sorted(by_user[baseline.user_id], key=lambda reading: reading.timestamp):
+                alerts += check_reading(baseline, reading)
+            baseline.updated_at = now
+        HealthBaseline.objects.bulk_update(baselines, ['state', 'last_at', 'updated_at'])
+        if alerts:
+            HealthAlert.objects.bulk_create(alerts)
+    return alerts
+
+
+def rebuild_baselines(readings, chunk_size=5000):
+    """Replay `readings` (a HealthMetrics queryset) into fresh baselines for their users, without alerting"""
+    baselines = {}
+    counted = 0
+    for reading in readings.only('user_id', 'timestamp', *LIMITS).order_by('user_id', 'timestamp').iterator(
+        chunk_size=chunk_size
+    ):
+        baseline = baselines.get(reading.user_id)
+        if baseline is None:
+            baseline = baselines[reading.user_id] = HealthBaseline(user_id=reading.user_id)
+        for metric in LIMITS:
+            value = getattr(reading, metric)
+            if value is not None:
+                baseline.state[metric] = fold(baseline.state.get(metric), float(value))
+        baseline.last_at = reading.timestamp
+        counted += 1
+    with transaction.atomic():
+        HealthBaseline.objects.filter(user_id__in=baselines).delete()
+        HealthBaseline.objects.bulk_create(baselines.values(), batch_size=1000)
+    return counted
@@ -0,0 +1,128 @@
+# medicalapp/archive.py
+import json
+import zlib
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Conversation, Message, MessageArchive
+
+try:
+    import zstandard
+except ImportError:  # zstd is preferred, zlib keeps archiving working without it
+    zstandard = None
+
+ZSTD_LEVEL = 10
+
+
+def compress(data):
+    """Compress bytes, returning (payload, codec)"""
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data), 'zstd'
+    return zlib.compress(data, 9), 'zlib'
+
+
+def decompress(payload, codec):
+    payload = bytes(payload)
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed archives")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    return zlib.decompress(payload)
+
+
+def _load_records(archive):
+    return json.loads(decompress(archive.payload, archive.codec))
+
+
+def inactive_conversations(inactive_days):
+    """Conversations with messages whose newest message is older than `inactive_days`"""
+    cutoff = timezone.now() - timedelta(days=inactive_days)
+    return Conversation.objects.filter(is_archived=False).annotate(
+        newest_message=Max('messages__timestamp')
+    ).filter(newest_message__lt=cutoff)
+
+
+@transaction.atomic
+def archive_conversation(conversation_id):
+    """
+    Move every message of a conversation into its compressed archive row.
+
+    Returns the number of messages moved.
+    """
+    conversation = Conversation.objects.select_for_update().get(id=conversation_id)
+    rows = list(
+        Message.objects.filter(conversation=conversation)
+        .order_by('timestamp', 'id')
+        .values_list('sender', 'content', 'timestamp')
+    )
+    if not rows:
+        return 0
+
+    archive = MessageArchive.objects.filter(conversation=conversation).first()
+    records = _load_records(archive) if archive else []
+    records.extend([sender, content, timestamp.isoformat()] for sender, content, timestamp in rows)
+
+    payload, codec = compress(json.dumps(records, separators=(',', ':')).encode('utf-8'))
+    first_user_message = next((content for sender, content, _ in records if sender == 'user'), "")
+
+    MessageArchive.objects.update_or_create(
+        conversation=conversation,
+        defaults={
+            'payload': payload,
+            'codec': codec,
+            'message_count': len(records),
+            'preview': first_user_message[:50],
+            'last_message_at': parse_datetime(records[-1][2]),
+            'archived_at': timezone.now(),
+        }
+    )
+    Message.objects.filter(conversation=conversation).delete()
+    # update() rather than save() so last_interaction keeps its real value
+    Conversation.objects.filter(id=conversation.id).update(is_archived=True)
+    return len(rows)
+
+
+def archive_inactive_conversations(inactive_days, limit=None):
+    """Archive conversations idle for `inactive_days`; returns (conversations, messages) moved"""
+    conversation_ids = inactive_conversations(inactive_days).values_list('id', flat=True)
+    if limit:
+        conversation_ids = conversation_ids[:limit]
+
+    conversations = messages = 0
+    for conversation_id in list(conversation_ids):
+        moved = archive_conversation(conversation_id)
+        if moved:
+            conversations += 1
+            messages += moved
+    return conversations, messages
+
+
+@transaction.atomic
+def restore_conversation(conversation):
+    """
+    Read-through for a reopened conversation: move its archived messages
+    back into the hot Message table. A no-op for conversations that were
+    never archived, so callers can use it unconditionally.
+    """
+    if not conversation.is_archived:
+        return 0
+
+    archive = MessageArchive.objects.select_for_update().filter(conversation=conversation).first()
+    restored = 0
+    if archive:
+        records = _load_records(archive)
+        Message.objects.bulk_create([
+            Message(conversation=conversation, sender=sender, content=content,
+                    timestamp=parse_datetime(timestamp))
+            for sender, content, timestamp in records
+        ])
+        archive.delete()
+        restored = len(records)
+
+    Conversation.objects.filter(id=conversation.id).update(is_archived=False)
+    conversation.is_archived = False
+    return restored
@@ -0,0 +1,93 @@
+# medicalapp/availability.py
+"""
+Month calendars of free appointment slots.
+
+Calendar screens only need "how many free slots on each day", so the
+counts for any number of doctors come from one GROUP BY query instead of
+the raw slot rows. Results are cached under slots.slot_state(), which
+moves on every availability or appointment write, so a change to either
+makes the next request recount.
+"""
+import hashlib
+from datetime import date
+
+from django.core.cache import cache
+from django.db.models import Count, Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import Appointment, DoctorAvailability
+from .slots import slot_state
+
+# Today's count drops as slots start, so cached months can't live forever
+CALENDAR_CACHE_TIMEOUT = 60 * 5
+MAX_CALENDAR_DOCTORS = 50
+
+
+def month_range(year, month):
+    """(first day, first day of the next month)"""
+    first = date(year, month, 1)
+    following = date(year + (month == 12), month % 12 + 1, 1)
+    return first, following
+
+
+def free_slots(start_date, end_date, now=None):
+    """
+    DoctorAvailability rows in [start_date, end_date) that are still free:
+    marked available, not started yet and with no live appointment inside.
+    """
+    now = now or timezone.localtime()
+    booked = Appointment.objects.filter(
+        doctor_id=OuterRef('doctor_id'),
+        appointment_date=OuterRef('date'),
+        appointment_time__gte=OuterRef('start_time'),
+        appointment_time__lt=OuterRef('end_time'),
+    ).exclude(status='cancelled')
+
+    return DoctorAvailability.objects.filter(
+        date__gte=max(start_date, now.date()),
+        date__lt=end_date,
+        is_available=True,
+    ).exclude(
+        Q(date=now.date(), start_time__lte=now.time())
+    ).exclude(
+        Exists(booked)
+    )
+
+
+def free_slot_counts(doctor_ids, start_date, end_date, now=None):
+    """{doctor_id: {date: free slot count}} for [start_date, end_date)"""
+    rows = free_slots(start_date, end_date, now).filter(
+        doctor_id__in=doctor_ids
+    ).values('doctor_id', 'date').annotate(free=Count('id')).order_by()
+
+    counts = {doctor_id: {} for doctor_id in doctor_ids}
+    for row in rows:
+        counts[row['doctor_id']][row['date']] = row['free']
+    return counts
+
+
+def month_calendar(doctor_ids, year, month):
+    """
+    Cached per-day free slot counts for the doctors over one month:
+    {'doctors': {doctor_id: {'YYYY-MM-DD': count}}, 'totals': {'YYYY-MM-DD': count}}
+    """
+    doctor_ids = sorted(set(doctor_ids))
+    ids_digest = hashlib.md5(','.join(map(str, doctor_ids)).encode()).hexdigest()
+    key = f"availability_calendar:{slot_state()}:{year}-{month:02d}:{ids_digest}"
+    calendar = cache.get(key)
+    if calendar is None:
+        start_date, end_date = month_range(year, month)
+        counts = free_slot_counts(doctor_ids, start_date, end_date)
+        totals = {}
+        for days in counts.values():
+            for day, free in days.items():
+                totals[day] = totals.get(day, 0) + free
+        calendar = {
+            'doctors': {
+                doctor_id: {day.isoformat(): free for day, free in sorted(days.items())}
+                for doctor_id, days in counts.items()
+            },
+            'totals': {day.isoformat(): free for day, free in sorted(totals.items())},
+        }
+        cache.set(key, calendar, CALENDAR_CACHE_TIMEOUT)
+    return calendar
@@ -0,0 +1,126 @@
+# medicalapp/booking.py
+from django.db import IntegrityError, transaction
+
+from .models import Appointment, DoctorAvailability
+
+
+class SlotUnavailable(Exception):
+    """The requested slot doesn't exist or was booked by someone else"""
+
+
+def book_appointment(user, doctor_id, appointment_date, appointment_time, idempotency_key=None, **fields):
+    """
+    Atomically claim a DoctorAvailability slot and create the appointment
+    for `user`.
+
+    The slot is claimed with a conditional UPDATE (is_available=True ->
+    False), so of several concurrent requests for the same slot exactly
+    one succeeds; the others raise SlotUnavailable. A repeated request
+    from the same user with the same idempotency key returns the original
+    appointment; keys are never matched across users.
+
+    Returns (appointment, created).
+    """
+    if idempotency_key:
+        existing = Appointment.objects.filter(user=user, idempotency_key=idempotency_key).first()
+        if existing:
+            return existing, False
+
+    try:
+        with transaction.atomic():
+            claimed = DoctorAvailability.objects.filter(
+                doctor_id=doctor_id,
+                date=appointment_date,
+                start_time=appointment_time,
+                is_available=True
+            ).update(is_available=False)
+            if not claimed:
+                raise SlotUnavailable("This time slot is no longer available")
+
+            appointment = Appointment.objects.create(
+                user=user,
+                doctor_id=doctor_id,
+                appointment_date=appointment_date,
+                appointment_time=appointment_time,
+                idempotency_key=idempotency_key or None,
+                **fields
+            )
+    except IntegrityError:
+        # Lost a race on the idempotency key or the per-doctor booking constraint
+        if idempotency_key:
+            existing = Appointment.objects.filter(user=user, idempotency_key=idempotency_key).first()
+            if existing:
+                return existing, False
+        raise SlotUnavailable("This time slot is no longer available")
+
+    return appointment, True
+
+
+def _slot(doctor_id, appointment_date, appointment_time):
+    return DoctorAvailability.objects.filter(
+        doctor_id=doctor_id, date=appointment_date, start_time=appointment_time
+    )
+
+
+def _held_slot(appointment):
+    """(doctor_id, date, time) of the slot a live appointment holds; None once cancelled"""
+    if appointment.status == 'cancelled':
+        return None
+    return appointment.doctor_id, appointment.appointment_date, appointment.appointment_time
+
+
+@transaction.atomic
+def cancel_appointment(appointment):
+    """
+    Cancel an appointment and hand its slot back to the doctor's
+    availability. Cancelling twice is a no-op: by then the slot may belong
+    to someone else's booking. Returns whether the appointment was cancelled now.
+    """
+    # Lock the row so two concurrent cancels can't both see it live
+    locked = Appointment.objects.select_for_update().get(pk=appointment.pk)
+    appointment.status = locked.status
+    if locked.status == 'cancelled':
+        return False
+    locked.status = 'cancelled'
+    locked.save()
+    appointment.status, appointment.updated_at = locked.status, locked.updated_at
+    _slot(locked.doctor_id, locked.appointment_date, locked.appointment_time).update(is_available=True)
+    return True
+
+
+def change_appointment(appointment, **changes):
+    """
+    Apply `changes` (field -> value) to an appointment, moving its slot with
+    it: a new doctor, date or time claims the new slot the way
+    book_appointment does and frees the old one, and a status change to or
+    from 'cancelled' frees or claims it. Raises SlotUnavailable if the new
+    slot is taken. Returns the saved appointment.
+    """
+    try:
+        with transaction.atomic():
+            locked = Appointment.objects.select_for_update().get(pk=appointment.pk)
+            old_slot = _held_slot(locked)
+            for field, value in changes.items():
+                setattr(locked, field, value)
+            new_slot = _held_slot(locked)
+            if new_slot != old_slot:
+                if new_slot and not _slot(*new_slot).filter(is_available=True).update(is_available=False):
+                    raise SlotUnavailable("This time slot is no longer available")
+                if old_slot:
+                    _slot(*old_slot).update(is_available=True)
+            locked.save()
+    except IntegrityError:
+        raise SlotUnavailable("This time slot is no longer available")
+    return locked
+
+
+@transaction.atomic
+def delete_appointment(appointment):
+    """Delete an appointment, freeing its slot if it still held one"""
+    locked = Appointment.objects.select_for_update().filter(pk=appointment.pk).first()
+    if locked is None:
+        return
+    held = _held_slot(locked)
+    locked.delete()
+    if held:
+        _slot(*held).update(is_available=True)
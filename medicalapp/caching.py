@@ -0,0 +1,76 @@
+# medicalapp/caching.py
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import CacheVersion
+
+MEDICATION_STATS_TIMEOUT = 60 * 15
+
+
+def medication_stats(queryset):
+    """Medication dashboard counters computed in a single conditional-aggregate query"""
+    refill_cutoff = timezone.localdate() + timedelta(days=7)
+    return queryset.order_by().aggregate(
+        total=Count('id'),
+        upcoming=Count('id', filter=Q(status='upcoming')),
+        taken=Count('id', filter=Q(status='taken')),
+        missed=Count('id', filter=Q(status='missed')),
+        refill_soon=Count('id', filter=Q(refill_date__lte=refill_cutoff)),
+    )
+
+
+def medication_stats_version_key(user_id):
+    scope = user_id if user_id is not None else 'all'
+    return f"medication_stats_version:{scope}"
+
+
+def medication_stats_key(user_id):
+    # refill_soon depends on today's date, so the key rolls over daily; the
+    # version changes on every write, in every process at once
+    scope = user_id if user_id is not None else 'all'
+    version = current_version(medication_stats_version_key(user_id))
+    return f"medication_stats:{scope}:{timezone.localdate().isoformat()}:{version}"
+
+
+def cached_medication_stats(user_id, queryset):
+    """Per-user medication stats, cached until one of the user's medications changes"""
+    key = medication_stats_key(user_id)
+    stats = cache.get(key)
+    if stats is None:
+        stats = medication_stats(queryset)
+        cache.set(key, stats, MEDICATION_STATS_TIMEOUT)
+    return stats
+
+
+def invalidate_medication_stats(user_id):
+    # The unscoped 'all' entry covers every user's medications
+    bump_version(medication_stats_version_key(user_id), medication_stats_version_key(None))
+
+
+def current_version(key):
+    """
+    Read a shared version counter, creating it if it doesn't exist yet.
+
+    Counters live in the database rather than the cache: with a
+    process-local cache backend a bump would only reach the worker that
+    made it, and every other worker would keep serving its old snapshot.
+    """
+    version = CacheVersion.objects.filter(key=key).values_list('version', flat=True).first()
+    if version is None:
+        # Seed from the clock so a re-created key never matches an old value
+        CacheVersion.objects.bulk_create([CacheVersion(key=key, version=time.time_ns())], ignore_conflicts=True)
+        version = CacheVersion.objects.filter(key=key).values_list('version', flat=True).first()
+    return version
+
+
+def bump_version(*keys):
+    """Advance shared version counters so readers holding the old values rebuild"""
+    if CacheVersion.objects.filter(key__in=keys).update(version=F('version') + 1) < len(keys):
+        # Only the missing counters are created; existing ones conflict and are skipped
+        CacheVersion.objects.bulk_create(
+            [CacheVersion(key=key, version=time.time_ns()) for key in keys], ignore_conflicts=True
+        )
@@ -0,0 +1,81 @@
+# medicalapp/chat_sessions.py
+"""
+Server-side state for the appointment chatbot.
+
+Each conversation gets a short token; the selections the server has
+already resolved (category, subcategory, location, doctor, date, time and
+the time slots it offered) are kept in a ChatSession row under that
+token, so clients only send the token and the current selection instead
+of echoing every selected_* field back on each step. Rows live in the
+database so any worker can continue a conversation another one started;
+expired rows are removed as new conversations start.
+"""
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ChatSession
+
+# Broadest first: choosing a new value at one level forgets everything below it
+SELECTION_LEVELS = [
+    ('selected_category_id', 'selected_category'),
+    ('selected_subcategory_id', 'selected_subcategory'),
+    ('selected_location_id', 'selected_location'),
+    ('selected_doctor_id', 'selected_doctor'),
+    ('selected_date', None),
+    ('selected_time', None),
+]
+
+
+def session_ttl():
+    return getattr(settings, 'APPOINTMENT_CHAT_SESSION_TTL', 30 * 60)
+
+
+def load_session(token, reset=False):
+    """Return (token, state); unknown or expired tokens start a fresh session"""
+    state = None
+    if token:
+        state = ChatSession.objects.filter(
+            token=token, expires_at__gt=timezone.now()
+        ).values_list('state', flat=True).first()
+    if state is None:
+        ChatSession.objects.filter(expires_at__lte=timezone.now()).delete()
+        token = secrets.token_urlsafe(8)
+        state = {}
+    elif reset:
+        state = {}
+    return token, state
+
+
+def save_session(token, state):
+    ChatSession.objects.bulk_create(
+        [ChatSession(token=token, state=state, expires_at=timezone.now() + timedelta(seconds=session_ttl()))],
+        update_conflicts=True, unique_fields=['token'], update_fields=['state', 'expires_at'],
+    )
+
+
+def apply_session(state, data):
+    """Fill selections the client didn't send from the session"""
+    for id_key, name_key in SELECTION_LEVELS:
+        if id_key not in data and id_key in state:
+            data[id_key] = state[id_key]
+
+
+def remember_selections(state, payload):
+    """Record the selections a chatbot response resolved"""
+    for level, (id_key, name_key) in enumerate(SELECTION_LEVELS):
+        if id_key not in payload:
+            continue
+        if state.get(id_key) != payload[id_key]:
+            for lower_id_key, lower_name_key in SELECTION_LEVELS[level + 1:]:
+                state.pop(lower_id_key, None)
+                state.pop(lower_name_key, None)
+            state.pop('offered_times', None)
+        state[id_key] = payload[id_key]
+        if name_key and name_key in payload:
+            state[name_key] = payload[name_key]
+
+    if payload.get('next_step') == 'time_selected':
+        state['offered_times'] = [option['id'] for option in payload.get('options', [])]
@@ -0,0 +1,64 @@
+# medicalapp/dose_logging.py
+"""
+Logging many doses at once.
+
+A morning regimen is several medications logged together. log_doses()
+writes the whole batch with one bulk_update of the medications and one
+bulk_create of the logs inside a transaction. Bulk operations don't send
+signals, so it also does what the Medication and MedicationLog signals
+would: refresh updated_at (list ETags and ?since= depend on it), add the
+logs to the adherence rollups, take taken doses off the remaining supply
+and drop the cached stats.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .adherence import record_doses
+from .caching import invalidate_medication_stats
+from .models import Medication, MedicationLog
+from .refills import consume_doses
+
+MAX_DOSE_ENTRIES = 200
+
+
+def log_doses(medications, entries, now=None):
+    """
+    Log `entries` (dicts with medication_id, status, taken_at, notes)
+    against `medications`, a {id: Medication} mapping already checked for
+    ownership. Each medication takes the status of its latest entry.
+    Returns the created logs.
+    """
+    now = now or timezone.now()
+    logs = [
+        MedicationLog(
+            medication=medications[entry['medication_id']],
+            status=entry['status'],
+            taken_at=entry.get('taken_at') or now,
+            notes=entry.get('notes', ''),
+        )
+        for entry in entries
+    ]
+
+    latest = {}
+    for log in logs:
+        if log.medication_id not in latest or log.taken_at >= latest[log.medication_id].taken_at:
+            latest[log.medication_id] = log
+    changed = []
+    for medication_id, log in latest.items():
+        medication = medications[medication_id]
+        medication.status = log.status
+        medication.updated_at = now
+        changed.append(medication)
+
+    with transaction.atomic():
+        Medication.objects.bulk_update(changed, ['status', 'updated_at'])
+        MedicationLog.objects.bulk_create(logs)
+        record_doses(logs)
+        taken = {}
+        for log in logs:
+            if log.status == 'taken':
+                taken[log.medication_id] = taken.get(log.medication_id, 0) + 1
+        consume_doses(taken, now)
+        for user_id in {medication.user_id for medication in changed}:
+            transaction.on_commit(lambda user_id=user_id: invalidate_medication_stats(user_id))
+    return logs
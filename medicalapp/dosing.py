@@ -0,0 +1,143 @@
+# medicalapp/dosing.py
+"""
+Expansion of DoseSchedules into dose instances.
+
+Doses are never stored: a schedule plus a date range is enough to list
+them, so these helpers expand only the window a caller asks about. The
+cross-user "due soon" query starts from the time-of-day index on DoseTime
+and only then applies the date rules, so it touches just the few minutes
+of schedules in the window.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import DoseSchedule, DoseTime, MedicationLog
+
+# A dose not logged this long after it was due counts as missed
+MISSED_AFTER = timedelta(hours=1)
+
+
+def runs_on(schedule, day):
+    """True if the schedule has doses on `day`"""
+    if day < schedule.start_date or (schedule.end_date and day > schedule.end_date):
+        return False
+    return (day - schedule.start_date).days % schedule.interval_days == 0
+
+
+def dose_at(day, time_of_day):
+    return timezone.make_aware(datetime.combine(day, time_of_day))
+
+
+def expand_doses(schedules, start, end):
+    """
+    Yield (due_at, schedule) for every dose of `schedules` (with times
+    prefetched) due in [start, end), in time order per day.
+    """
+    start, end = timezone.localtime(start), timezone.localtime(end)
+    day = start.date()
+    while day <= end.date():
+        todays = []
+        for schedule in schedules:
+            if not schedule.is_active or not runs_on(schedule, day):
+                continue
+            for dose_time in schedule.times.all():
+                due_at = dose_at(day, dose_time.time_of_day)
+                if start <= due_at < end:
+                    todays.append((due_at, schedule))
+        todays.sort(key=lambda dose: (dose[0], dose[1].medication_id))
+        yield from todays
+        day += timedelta(days=1)
+
+
+def create_default_schedule(medication):
+    """A daily schedule at the medication's next_dose, for medications created without one"""
+    schedule = DoseSchedule.objects.create(
+        medication=medication, interval_days=1, start_date=timezone.localdate()
+    )
+    DoseTime.objects.create(schedule=schedule, time_of_day=medication.next_dose)
+    return schedule
+
+
+def _time_windows(start, end):
+    """Split [start, end) into (date, from_time, to_time or None) pieces that don't cross midnight"""
+    start, end = timezone.localtime(start), timezone.localtime(end)
+    windows = []
+    while start < end:
+        next_midnight = dose_at(start.date() + timedelta(days=1), time(0))
+        if end < next_midnight:
+            windows.append((start.date(), start.time(), end.time()))
+            break
+        windows.append((start.date(), start.time(), None))
+        start = next_midnight
+    return windows
+
+
+def doses_due(now=None, minutes=60, users=None):
+    """
+    Doses due in the next `minutes` minutes across all users (or only
+    `users`), as a time-ordered list of dicts with due_at, medication and
+    schedule_id. One indexed query per calendar day the window touches.
+    """
+    now = now or timezone.now()
+    end = now + timedelta(minutes=minutes)
+    doses = []
+    for day, from_time, to_time in _time_windows(now, end):
+        window = Q(time_of_day__gte=from_time)
+        if to_time is not None:
+            window &= Q(time_of_day__lt=to_time)
+        dose_times = DoseTime.objects.filter(
+            window,
+            schedule__is_active=True,
+            schedule__start_date__lte=day,
+        ).filter(
+            Q(schedule__end_date__isnull=True) | Q(schedule__end_date__gte=day)
+        ).select_related('schedule__medication')
+        if users is not None:
+            dose_times = dose_times.filter(schedule__medication__user__in=users)
+
+        for dose_time in dose_times:
+            schedule = dose_time.schedule
+            if runs_on(schedule, day):
+                doses.append({
+                    'due_at': dose_at(day, dose_time.time_of_day),
+                    'medication': schedule.medication,
+                    'schedule_id': schedule.id,
+                })
+    doses.sort(key=lambda dose: (dose['due_at'], dose['medication'].id))
+    return doses
+
+
+def todays_doses(medications, now=None):
+    """
+    {medication_id: [{'due_at', 'status'}]} for today's doses of
+    `medications` (with schedules__times prefetched). Each 'taken' log
+    today covers the earliest uncovered dose; later doses are 'upcoming'
+    until MISSED_AFTER has passed.
+    """
+    now = now or timezone.now()
+    today = timezone.localtime(now).date()
+    start = dose_at(today, time(0))
+
+    taken_counts = {}
+    for medication_id in MedicationLog.objects.filter(
+        medication__in=medications, status='taken',
+        taken_at__gte=start, taken_at__lt=start + timedelta(days=1)
+    ).values_list('medication_id', flat=True):
+        taken_counts[medication_id] = taken_counts.get(medication_id, 0) + 1
+
+    doses = {}
+    for medication in medications:
+        taken = taken_counts.get(medication.id, 0)
+        for n, (due_at, _schedule) in enumerate(
+            expand_doses(medication.schedules.all(), start, start + timedelta(days=1))
+        ):
+            if n < taken:
+                dose_status = 'taken'
+            elif due_at + MISSED_AFTER < now:
+                dose_status = 'missed'
+            else:
+                dose_status = 'upcoming'
+            doses.setdefault(medication.id, []).append({'due_at': due_at, 'status': dose_status})
+    return doses
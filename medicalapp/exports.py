@@ -0,0 +1,192 @@
+# medicalapp/exports.py
+"""
+Streaming exports of HealthMetrics, MedicationLog and Appointment history.
+
+Rows are read with values_list(...).iterator(chunk_size=...), which on
+Postgres is a server-side cursor, and each chunk is encoded and handed on
+before the next is fetched. Nothing holds more than one chunk, so memory
+stays flat however large the table is. The same generators feed the
+export endpoints (as a StreamingHttpResponse) and `manage.py export_data`
+(written to a file).
+
+Formats: NDJSON and CSV always; Parquet when pyarrow is installed, one row
+group per chunk.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime, time
+
+from .models import Appointment, HealthMetrics, MedicationLog
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet export is optional; NDJSON and CSV need nothing extra
+    pyarrow = None
+
+CHUNK_SIZE = 5000
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+class Dataset:
+    """An exportable table: the model, the columns and the path from a row to its user"""
+
+    def __init__(self, model, user_path, fields):
+        self.model = model
+        self.user_path = user_path
+        self.fields = fields
+
+    def queryset(self, user=None):
+        """Every row in id order, or only `user`'s"""
+        rows = self.model.objects.order_by('id')
+        if user is not None:
+            rows = rows.filter(**{self.user_path: user})
+        return rows
+
+    def columns(self):
+        return [field.replace('__', '_') for field in self.fields]
+
+    def model_field(self, path):
+        model = self.model
+        *relations, name = path.split('__')
+        for relation in relations:
+            model = model._meta.get_field(relation).related_model
+        return model._meta.get_field(name)
+
+
+DATASETS = {
+    'health-metrics': Dataset(HealthMetrics, 'user', [
+        'id', 'user_id', 'timestamp', 'systolic_bp', 'diastolic_bp', 'heart_rate', 'oxygen_saturation',
+        'blood_glucose', 'weight', 'height', 'daily_steps', 'sleep_hours', 'bmi', 'health_score',
+    ]),
+    'medication-logs': Dataset(MedicationLog, 'medication__user', [
+        'id', 'medication_id', 'medication__name', 'medication__user_id', 'taken_at', 'status', 'notes',
+    ]),
+    'appointments': Dataset(Appointment, 'user', [
+        'id', 'user_id', 'doctor_id', 'doctor__name', 'appointment_date', 'appointment_time',
+        'category__name', 'subcategory__name', 'location__name', 'status', 'patient_name',
+        'patient_phone', 'patient_email', 'notes', 'created_at', 'updated_at',
+    ]),
+}
+
+
+def parquet_available():
+    return pyarrow is not None
+
+
+def _chunks(queryset, fields, chunk_size):
+    """Lists of up to chunk_size value tuples, read through a server-side cursor"""
+    chunk = []
+    for row in queryset.values_list(*fields).iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return value
+
+
+def stream_ndjson(dataset, queryset, chunk_size=CHUNK_SIZE):
+    columns = dataset.columns()
+    for chunk in _chunks(queryset, dataset.fields, chunk_size):
+        yield ''.join(
+            json.dumps(dict(zip(columns, map(_plain, row)))) + '\n' for row in chunk
+        ).encode()
+
+
+def stream_csv(dataset, queryset, chunk_size=CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(dataset.columns())
+    for chunk in _chunks(queryset, dataset.fields, chunk_size):
+        writer.writerows([_plain(value) for value in row] for row in chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _arrow_type(field):
+    internal = field.get_internal_type()
+    if internal in ('ForeignKey', 'OneToOneField'):
+        return _arrow_type(field.target_field)
+    if internal.endswith('AutoField') or internal.endswith('IntegerField'):
+        return pyarrow.int64()
+    if internal in ('FloatField', 'DecimalField'):
+        return pyarrow.float64()
+    if internal == 'BooleanField':
+        return pyarrow.bool_()
+    if internal == 'DateTimeField':
+        return pyarrow.timestamp('us', tz='UTC')
+    if internal == 'DateField':
+        return pyarrow.date32()
+    if internal == 'TimeField':
+        return pyarrow.time64('us')
+    return pyarrow.string()
+
+
+class _ParquetSink(io.RawIOBase):
+    """Write-only file that collects what ParquetWriter writes until it's drained"""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def stream_parquet(dataset, queryset, chunk_size=CHUNK_SIZE):
+    if pyarrow is None:
+        raise RuntimeError("pyarrow is required for Parquet export")
+    schema = pyarrow.schema([
+        (column, _arrow_type(dataset.model_field(path)))
+        for column, path in zip(dataset.columns(), dataset.fields)
+    ])
+    sink = _ParquetSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression='zstd')
+    try:
+        for chunk in _chunks(queryset, dataset.fields, chunk_size):
+            columns = list(zip(*chunk))
+            writer.write_table(pyarrow.Table.from_arrays(
+                [pyarrow.array(column, type=schema.field(i).type) for i, column in enumerate(columns)],
+                schema=schema,
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+STREAMERS = {'ndjson': stream_ndjson, 'csv': stream_csv, 'parquet': stream_parquet}
+
+
+def stream_export(dataset_name, output_format, user=None, chunk_size=CHUNK_SIZE):
+    """Byte chunks of one dataset in one format, optionally limited to `user`'s rows"""
+    dataset = DATASETS[dataset_name]
+    return STREAMERS[output_format](dataset, dataset.queryset(user), chunk_size)
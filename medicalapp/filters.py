@@ -0,0 +1,26 @@
+# medicalapp/filters.py
+from rest_framework import filters
+
+from .search import filter_doctors_by_language, search_doctors
+
+
+class DoctorSearchFilter(filters.BaseFilterBackend):
+    """`?search=` fuzzy name/specialty search, ranked best match first"""
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query_text = request.query_params.get(self.search_param, '').strip()
+        if not query_text:
+            return queryset
+        return search_doctors(queryset, query_text)
+
+
+class DoctorLanguageFilter(filters.BaseFilterBackend):
+    """`?language=hindi` or `?language=hindi,tamil` (any of)"""
+    language_param = 'language'
+
+    def filter_queryset(self, request, queryset, view):
+        languages = request.query_params.get(self.language_param)
+        if not languages:
+            return queryset
+        return filter_doctors_by_language(queryset, languages)
@@ -0,0 +1,162 @@
+# medicalapp/health_rollups.py
+"""
+Daily and weekly rollups of HealthMetrics readings.
+
+New readings are folded into their day and week rows incrementally
+(count, sum, min, max and the latest value), three queries per batch
+however many readings it holds. Editing or deleting a reading can lower a
+min or max, which can't be undone incrementally, so those recompute the
+affected week and its days from the raw readings instead.
+
+trends() answers from the rollups alone: at most one row per metric per
+period, so 90 days of vitals is 90 (or 13 weekly) points per metric.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import HealthMetricRollup, HealthMetrics
+
+METRICS = [metric for metric, _label in HealthMetricRollup.METRIC_CHOICES]
+RESOLUTIONS = [resolution for resolution, _label in HealthMetricRollup.RESOLUTION_CHOICES]
+# ?resolution=auto switches from daily to weekly points beyond this many days
+AUTO_DAILY_MAX_DAYS = 31
+MAX_TREND_DAYS = 366
+
+
+def period_starts(timestamp):
+    """{'day': local date, 'week': Monday of that week} for a reading's timestamp"""
+    day = timezone.localtime(timestamp).date()
+    return {'day': day, 'week': day - timedelta(days=day.weekday())}
+
+
+def _fold(totals, reading):
+    """Add one reading to `totals`, {(user_id, metric, resolution, period_start): stats}"""
+    starts = period_starts(reading.timestamp)
+    for metric in METRICS:
+        value = getattr(reading, metric)
+        if value is None:
+            continue
+        value = float(value)
+        for resolution, period_start in starts.items():
+            stats = totals.get((reading.user_id, metric, resolution, period_start))
+            if stats is None:
+                totals[(reading.user_id, metric, resolution, period_start)] = {
+                    'count': 1, 'total': value, 'minimum': value, 'maximum': value,
+                    'last': value, 'last_at': reading.timestamp,
+                }
+                continue
+            stats['count'] += 1
+            stats['total'] += value
+            stats['minimum'] = min(stats['minimum'], value)
+            stats['maximum'] = max(stats['maximum'], value)
+            if reading.timestamp >= stats['last_at']:
+                stats['last'], stats['last_at'] = value, reading.timestamp
+
+
+def add_readings(readings):
+    """Fold newly created readings (saved HealthMetrics) into their rollups"""
+    added = {}
+    for reading in readings:
+        _fold(added, reading)
+    if not added:
+        return
+
+    with transaction.atomic():
+        HealthMetricRollup.objects.bulk_create([
+            HealthMetricRollup(user_id=user_id, metric=metric, resolution=resolution, period_start=period_start)
+            for user_id, metric, resolution, period_start in added
+        ], batch_size=1000, ignore_conflicts=True)
+        # A range over the batch's users and dates is far cheaper to plan than
+        # an OR per key; rows in it that the batch didn't touch are skipped
+        days = [period_start for _user, _metric, _resolution, period_start in added]
+        candidates = HealthMetricRollup.objects.select_for_update().filter(
+            user_id__in={user_id for user_id, _metric, _resolution, _start in added},
+            period_start__gte=min(days), period_start__lte=max(days),
+        ).order_by('id')
+        rows = [
+            row for row in candidates
+            if (row.user_id, row.metric, row.resolution, row.period_start) in added
+        ]
+        for row in rows:
+            stats = added[(row.user_id, row.metric, row.resolution, row.period_start)]
+            row.count += stats['count']
+            row.total += stats['total']
+            row.minimum = stats['minimum'] if row.minimum is None else min(row.minimum, stats['minimum'])
+            row.maximum = stats['maximum'] if row.maximum is None else max(row.maximum, stats['maximum'])
+            if row.last_at is None or stats['last_at'] >= row.last_at:
+                row.last, row.last_at = stats['last'], stats['last_at']
+        HealthMetricRollup.objects.bulk_update(
+            rows, ['count', 'total', 'minimum', 'maximum', 'last', 'last_at'], batch_size=1000
+        )
+
+
+def _rollup_rows(totals):
+    return [
+        HealthMetricRollup(user_id=user_id, metric=metric, resolution=resolution, period_start=period_start, **stats)
+        for (user_id, metric, resolution, period_start), stats in totals.items()
+    ]
+
+
+def recompute_periods(user_id, timestamps):
+    """Rebuild the rollups of the weeks (and their days) containing `timestamps` from the raw readings"""
+    weeks = {period_starts(timestamp)['week'] for timestamp in timestamps}
+    with transaction.atomic():
+        for week in weeks:
+            start = timezone.make_aware(datetime.combine(week, time(0)))
+            totals = {}
+            for reading in HealthMetrics.objects.filter(
+                user_id=user_id, timestamp__gte=start, timestamp__lt=start + timedelta(days=7)
+            ).only('user_id', 'timestamp', *METRICS).iterator():
+                _fold(totals, reading)
+            HealthMetricRollup.objects.filter(user_id=user_id).filter(
+                Q(resolution='week', period_start=week)
+                | Q(resolution='day', period_start__gte=week, period_start__lt=week + timedelta(days=7))
+            ).delete()
+            HealthMetricRollup.objects.bulk_create(_rollup_rows(totals))
+
+
+def rebuild_health_rollups(readings, chunk_size=5000):
+    """Recompute every rollup of the users in `readings` (a HealthMetrics queryset); returns readings counted"""
+    user_ids = set(readings.values_list('user_id', flat=True).distinct().order_by())
+    totals = {}
+    counted = 0
+    for reading in readings.only('user_id', 'timestamp', *METRICS).order_by('id').iterator(chunk_size=chunk_size):
+        _fold(totals, reading)
+        counted += 1
+    with transaction.atomic():
+        HealthMetricRollup.objects.filter(user_id__in=user_ids).delete()
+        HealthMetricRollup.objects.bulk_create(_rollup_rows(totals), batch_size=chunk_size)
+    return counted
+
+
+def choose_resolution(resolution, days):
+    if resolution == 'auto':
+        return 'day' if days <= AUTO_DAILY_MAX_DAYS else 'week'
+    return resolution
+
+
+def trends(user, metrics, resolution, days, now=None):
+    """
+    {metric: [{'period', 'min', 'max', 'mean', 'last', 'count'}]} for the
+    last `days` days at `resolution` ('day' or 'week'), oldest first.
+    """
+    first = timezone.localtime(now or timezone.now()).date() - timedelta(days=days - 1)
+    if resolution == 'week':
+        first -= timedelta(days=first.weekday())
+    series = {metric: [] for metric in metrics}
+    rows = HealthMetricRollup.objects.filter(
+        user=user, metric__in=metrics, resolution=resolution, period_start__gte=first
+    ).order_by('metric', 'period_start')
+    for row in rows:
+        series[row.metric].append({
+            'period': row.period_start.isoformat(),
+            'min': row.minimum,
+            'max': row.maximum,
+            'mean': round(row.mean, 2) if row.mean is not None else None,
+            'last': row.last,
+            'count': row.count,
+        })
+    return series
@@ -0,0 +1,124 @@
+# medicalapp/health_scores.py
+"""
+Vectorized HealthMetrics scoring.
+
+health_scores() evaluates the same rules as
+HealthMetrics.calculate_health_score, but over NumPy columns, so scoring a
+million stored readings after a rule change is a few array operations per
+chunk rather than a Python call and a save per row. The two must agree on
+every row; the parity test in tests.py checks that, so a rule changed in
+one place must change in the other.
+
+Missing values are NaN. The per-row method tests fields for truthiness,
+so a zero counts as missing here too.
+"""
+import numpy as np
+from django.db import transaction
+
+from .models import HealthMetrics
+
+SCORE_FIELDS = [
+    'systolic_bp', 'diastolic_bp', 'blood_glucose', 'bmi', 'daily_steps',
+    'heart_rate', 'sleep_hours', 'oxygen_saturation', 'weight', 'height',
+]
+CHUNK_SIZE = 10000
+
+
+def to_columns(rows, fields):
+    """Rows of values (None for missing) -> {field: float64 array with NaN for missing}"""
+    matrix = np.array(
+        [[np.nan if value is None else value for value in row] for row in rows], dtype=np.float64
+    ).reshape(-1, len(fields))
+    return {field: matrix[:, i] for i, field in enumerate(fields)}
+
+
+def _present(column):
+    return ~np.isnan(column) & (column != 0)
+
+
+def compute_bmi(weight, height):
+    """BMI rounded to one decimal like HealthMetrics.save, NaN where weight or height is missing"""
+    present = _present(weight) & _present(height)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bmi = weight / (height / 100) ** 2
+    # Python's round(), not np.round: np.round scales by 10 and rounds half to
+    # even, so 84.2 kg at 200 cm (21.05...) would be 21.0 here but 21.1 in save()
+    bmi = np.array([round(value, 1) for value in bmi.tolist()], dtype=np.float64)
+    return np.where(present, bmi, np.nan)
+
+
+def health_scores(columns):
+    """Health score (0-100) for every row of `columns` ({field: array} covering SCORE_FIELDS)"""
+    c = columns
+    score = np.zeros(len(c['bmi']), dtype=np.int64)
+
+    # Blood pressure (30 points max)
+    systolic, diastolic = c['systolic_bp'], c['diastolic_bp']
+    score += np.where(
+        _present(systolic) & _present(diastolic),
+        np.select(
+            [(systolic <= 120) & (diastolic <= 80), (systolic <= 130) & (diastolic <= 85),
+             (systolic <= 140) | (diastolic <= 90)],
+            [30, 25, 15], default=5,
+        ),
+        0,
+    )
+
+    # Blood glucose (20 points max)
+    glucose = c['blood_glucose']
+    score += np.where(_present(glucose), np.select([glucose <= 100, glucose <= 125], [20, 10], default=5), 0)
+
+    # BMI (15 points max)
+    bmi = c['bmi']
+    score += np.where(
+        _present(bmi),
+        np.select([(bmi >= 18.5) & (bmi <= 24.9), (bmi >= 25) & (bmi <= 29.9)], [15, 8], default=3),
+        0,
+    )
+
+    # Activity (15 points max)
+    steps = c['daily_steps']
+    score += np.where(_present(steps), np.select([steps >= 10000, steps >= 8000], [15, 10], default=5), 0)
+
+    # Other metrics (5 points each)
+    heart_rate, sleep, oxygen = c['heart_rate'], c['sleep_hours'], c['oxygen_saturation']
+    score += 5 * (_present(heart_rate) & (heart_rate >= 60) & (heart_rate <= 80))
+    score += 5 * (_present(sleep) & (sleep >= 7) & (sleep <= 9))
+    score += 5 * (_present(oxygen) & (oxygen >= 95))
+    score += 5 * (_present(c['weight']) & _present(c['height']))
+
+    return np.clip(score, 0, 100)
+
+
+def rescore_health_metrics(readings, chunk_size=CHUNK_SIZE):
+    """
+    Recompute health_score for a HealthMetrics queryset, chunk by chunk in
+    id order (keyset pagination), writing back only rows whose score
+    changed. Returns (rows scored, rows updated).
+    """
+    scored = updated = 0
+    last_id = 0
+    while True:
+        rows = list(
+            readings.filter(id__gt=last_id).order_by('id').values_list('id', 'health_score', *SCORE_FIELDS)[:chunk_size]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        columns = to_columns([row[2:] for row in rows], SCORE_FIELDS)
+        scores = health_scores(columns)
+
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        current = np.array([-1 if row[1] is None else row[1] for row in rows], dtype=np.int64)
+        changed = current != scores
+
+        # Scores take at most 101 values, so one UPDATE ... WHERE id IN (...)
+        # per distinct new score replaces bulk_update's per-row CASE
+        with transaction.atomic():
+            for score in np.unique(scores[changed]):
+                HealthMetrics.objects.filter(id__in=ids[changed & (scores == score)].tolist()).update(
+                    health_score=int(score)
+                )
+        scored += len(rows)
+        updated += int(changed.sum())
+    return scored, updated
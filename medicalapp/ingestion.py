@@ -0,0 +1,190 @@
+# medicalapp/ingestion.py
+"""
+Bulk ingestion of wearable HealthMetrics readings.
+
+Wearable syncs send thousands of readings at once, as a JSON array (or
+{"readings": [...]}) or as NDJSON, one reading per line. Each reading is
+checked with plain type and range tests instead of a DRF serializer per
+row, BMI and health score are computed over NumPy columns for the whole
+batch, and the rows go in with one bulk_create.
+
+Readings are deduplicated on (user, timestamp): repeats within the batch
+keep the last one, and readings already stored are skipped, so a device
+can safely re-send a batch after a timeout. Every HealthMetrics create
+for a user (a batch here, a single reading through the API) takes the same
+transaction-scoped advisory lock, so the duplicate check holds until commit
+and no reading is counted in the rollups twice. The lock isn't on the user
+row, so the user's other writes (which lock that row FOR KEY SHARE through
+their foreign keys) never wait for a large batch.
+"""
+import json
+import math
+from datetime import datetime
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .anomalies import observe_readings
+from .health_rollups import add_readings
+from .health_scores import SCORE_FIELDS, compute_bmi, health_scores, to_columns
+from .models import HealthMetrics
+
+MAX_INGEST_READINGS = 50000
+BATCH_SIZE = 5000
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+# field -> (type, min, max); integers must fit the model's column
+READING_FIELDS = {
+    'systolic_bp': (int, 0, 32767),
+    'diastolic_bp': (int, 0, 32767),
+    'heart_rate': (int, 0, 32767),
+    'oxygen_saturation': (int, 0, 100),
+    'blood_glucose': (int, 0, 32767),
+    'weight': (float, 0, 1000),
+    'height': (float, 0, 300),
+    'daily_steps': (int, 0, 2147483647),
+    'sleep_hours': (float, 0, 24),
+}
+
+
+class IngestionError(Exception):
+    """The payload as a whole can't be ingested"""
+
+
+def max_ingest_bytes():
+    """Body size cap for ingestion, separate from DATA_UPLOAD_MAX_MEMORY_SIZE (2.5 MB by default)"""
+    return getattr(settings, 'HEALTH_INGEST_MAX_BYTES', 32 * 1024 * 1024)
+
+
+def parse_payload(stream, content_type):
+    """
+    Decode a JSON or NDJSON request body read from `stream` into a list of
+    reading dicts. NDJSON is decoded line by line as it is read.
+    """
+    limit = max_ingest_bytes()
+    try:
+        if content_type in NDJSON_TYPES:
+            readings = []
+            size = 0
+            for line in stream:
+                size += len(line)
+                if size > limit:
+                    raise IngestionError(f"Body larger than {limit} bytes")
+                if line.strip():
+                    readings.append(json.loads(line))
+        else:
+            body = stream.read(limit + 1)
+            if len(body) > limit:
+                raise IngestionError(f"Body larger than {limit} bytes")
+            readings = json.loads(body)
+            if isinstance(readings, dict):
+                readings = readings.get('readings')
+    except UnicodeDecodeError:
+        raise IngestionError("Body must be UTF-8")
+    except json.JSONDecodeError as e:
+        raise IngestionError(f"Invalid JSON: {e}")
+    if not isinstance(readings, list):
+        raise IngestionError("Expected a list of readings")
+    if len(readings) > MAX_INGEST_READINGS:
+        raise IngestionError(f"At most {MAX_INGEST_READINGS} readings per request")
+    return readings
+
+
+def clean_reading(reading):
+    """(timestamp, {field: value}) for a valid reading dict, otherwise raise ValueError"""
+    if not isinstance(reading, dict):
+        raise ValueError("reading must be an object")
+    try:
+        timestamp = datetime.fromisoformat(reading['timestamp'])
+    except KeyError:
+        raise ValueError("timestamp is required")
+    except (TypeError, ValueError):
+        raise ValueError("timestamp must be an ISO 8601 datetime")
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp)
+
+    values = {}
+    for field, (kind, low, high) in READING_FIELDS.items():
+        value = reading.get(field)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"{field} must be a number")
+        if not math.isfinite(value):
+            raise ValueError(f"{field} must be a finite number")
+        if kind is int:
+            if value != int(value):
+                raise ValueError(f"{field} must be a whole number")
+            value = int(value)
+        if not low <= value <= high:
+            raise ValueError(f"{field} must be between {low} and {high}")
+        values[field] = kind(value)
+    if not values:
+        raise ValueError("reading has no metrics")
+    systolic, diastolic = values.get('systolic_bp'), values.get('diastolic_bp')
+    if systolic is not None and diastolic is not None and systolic < diastolic:
+        raise ValueError("Systolic must be higher than diastolic")
+    return timestamp, values
+
+
+def lock_user_readings(user):
+    """Serialize HealthMetrics creation for `user` until the surrounding transaction ends"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtextextended(%s, 0))", [f"health_readings:{user.id}"])
+
+
+def ingest_readings(user, readings):
+    """
+    Validate, score and store `readings` (dicts) for `user`. Returns
+    {'received', 'created', 'duplicates', 'alerts', 'rejected': [{'index', 'error'}]}.
+    """
+    rejected = []
+    alerts = []
+    by_timestamp = {}
+    for index, reading in enumerate(readings):
+        try:
+            timestamp, values = clean_reading(reading)
+        except ValueError as e:
+            rejected.append({'index': index, 'error': str(e)})
+            continue
+        by_timestamp[timestamp] = values
+    in_batch_duplicates = len(readings) - len(rejected) - len(by_timestamp)
+
+    created = []
+    with transaction.atomic():
+        # Held until commit, so the duplicate check below stays true and every row inserts
+        lock_user_readings(user)
+        if by_timestamp:
+            stored = set(HealthMetrics.objects.filter(
+                user=user, timestamp__gte=min(by_timestamp), timestamp__lte=max(by_timestamp)
+            ).values_list('timestamp', flat=True))
+            fresh = [(timestamp, values) for timestamp, values in by_timestamp.items() if timestamp not in stored]
+
+            if fresh:
+                columns = to_columns(
+                    [[values.get(field) for field in SCORE_FIELDS] for _timestamp, values in fresh], SCORE_FIELDS
+                )
+                columns['bmi'] = compute_bmi(columns['weight'], columns['height'])
+                scores = health_scores(columns)
+                bmis = columns['bmi']
+                created = [
+                    HealthMetrics(
+                        user_id=user.id, timestamp=timestamp, **values,
+                        bmi=None if np.isnan(bmis[i]) else float(bmis[i]),
+                        health_score=int(scores[i]),
+                    )
+                    for i, (timestamp, values) in enumerate(fresh)
+                ]
+                HealthMetrics.objects.bulk_create(created, batch_size=BATCH_SIZE)
+                add_readings(created)
+                alerts = observe_readings(created)
+
+    return {
+        'received': len(readings),
+        'created': len(created),
+        'duplicates': in_batch_duplicates + (len(by_timestamp) - len(created)),
+        'alerts': len(alerts),
+        'rejected': rejected,
+    }
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class PeriodicCommand(BaseCommand):
+    """
+    Base for maintenance jobs that can run once (from cron) or as a
+    long-running scheduler with --interval.
+
+    Subclasses implement run_once(**options) and return a summary line.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help="Repeat every N seconds instead of running once"
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            summary = self.run_once(**options)
+            if summary:
+                self.stdout.write(self.style.SUCCESS(summary))
+            if not interval:
+                break
+            time.sleep(interval)
+
+    def run_once(self, **options):
+        raise NotImplementedError
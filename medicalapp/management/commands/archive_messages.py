@@ -0,0 +1,26 @@
+from django.conf import settings
+
+from medicalapp.archive import archive_inactive_conversations
+from ._periodic import PeriodicCommand
+
+
+class Command(PeriodicCommand):
+    help = "Move messages of inactive conversations into compressed cold storage"
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--inactive-days', type=int,
+            default=getattr(settings, 'MESSAGE_ARCHIVE_INACTIVE_DAYS', 90),
+            help="Archive conversations whose newest message is older than this"
+        )
+        parser.add_argument(
+            '--limit', type=int, default=None,
+            help="Maximum number of conversations to archive per run"
+        )
+
+    def run_once(self, **options):
+        conversations, messages = archive_inactive_conversations(
+            options['inactive_days'], limit=options['limit']
+        )
+        return f"Archived {messages} messages from {conversations} conversations"
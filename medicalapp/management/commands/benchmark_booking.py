@@ -0,0 +1,88 @@
+import random
+import threading
+import time as clock
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from medicalapp.booking import book_appointment, SlotUnavailable
+from medicalapp.models import Appointment, Doctor, DoctorAvailability, MedicalSpecialty
+
+
+class Command(BaseCommand):
+    help = "Measure booking throughput with many clients competing for the same slots"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--attempts', type=int, default=2000, help="Total booking attempts")
+        parser.add_argument('--slots', type=int, default=200, help="Slots the clients compete for")
+        parser.add_argument('--retry-rate', type=float, default=0.1,
+                            help="Fraction of attempts that replay an earlier idempotency key")
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(username='booking-benchmark')
+        specialty = MedicalSpecialty.objects.create(name='Booking benchmark')
+        doctor = Doctor.objects.create(name='Benchmark', specialty=specialty)
+        day = timezone.localdate() + timedelta(days=1)
+        start = datetime.combine(day, time(0, 0))
+        slot_times = [(start + timedelta(minutes=5 * i)).time() for i in range(options['slots'])]
+        DoctorAvailability.objects.bulk_create(
+            DoctorAvailability(doctor=doctor, date=day, start_time=t,
+                               end_time=(datetime.combine(day, t) + timedelta(minutes=5)).time())
+            for t in slot_times
+        )
+
+        counts = {'booked': 0, 'conflicts': 0, 'replayed': 0}
+        lock = threading.Lock()
+        per_thread = options['attempts'] // options['threads']
+
+        def client(worker):
+            rng = random.Random(worker)
+            keys = []
+            try:
+                for attempt in range(per_thread):
+                    if keys and rng.random() < options['retry_rate']:
+                        key = rng.choice(keys)
+                    else:
+                        key = f"bench-{worker}-{attempt}"
+                        keys.append(key)
+                    try:
+                        _, created = book_appointment(
+                            doctor_id=doctor.id, appointment_date=day,
+                            appointment_time=rng.choice(slot_times), idempotency_key=key,
+                            user=user, patient_name='Bench', patient_phone='0',
+                            patient_email='bench@example.com'
+                        )
+                        outcome = 'booked' if created else 'replayed'
+                    except SlotUnavailable:
+                        outcome = 'conflicts'
+                    with lock:
+                        counts[outcome] += 1
+            finally:
+                connection.close()
+
+        started = clock.perf_counter()
+        workers = [threading.Thread(target=client, args=(i,)) for i in range(options['threads'])]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = clock.perf_counter() - started
+
+        double_booked = Appointment.objects.filter(doctor=doctor).exclude(status='cancelled').values(
+            'appointment_time'
+        ).annotate(n=Count('id')).filter(n__gt=1).count()
+        total = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} attempts from {options['threads']} threads in {elapsed:.2f}s "
+            f"({total / elapsed:.0f}/s): {counts['booked']} booked, {counts['conflicts']} conflicts, "
+            f"{counts['replayed']} idempotent replays, {double_booked} double-booked slots"
+        ))
+
+        Appointment.objects.filter(doctor=doctor).delete()
+        specialty.delete()
+        user.delete()
@@ -0,0 +1,99 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+from medicalapp.models import Doctor, Language, MedicalSpecialty
+from medicalapp.search import filter_doctors_by_language, search_doctors
+
+FIRST_NAMES = [
+    'Aarav', 'Priya', 'Rahul', 'Ananya', 'Vikram', 'Meera', 'Arjun', 'Kavya', 'Rohan', 'Isha',
+    'James', 'Maria', 'David', 'Sarah', 'Michael', 'Laura', 'Daniel', 'Emma', 'Omar', 'Fatima',
+]
+LAST_NAMES = [
+    'Sharma', 'Patel', 'Iyer', 'Reddy', 'Nair', 'Gupta', 'Menon', 'Shankar', 'Rao', 'Kapoor',
+    'Smith', 'Garcia', 'Johnson', 'Brown', 'Martinez', 'Wilson', 'Khan', 'Ahmed', 'Silva', 'Chen',
+]
+SPECIALTIES = ['Cardiology', 'Dermatology', 'Orthopedics', 'Pediatrics', 'Neurology', 'Oncology']
+LANGUAGES = ['english', 'hindi', 'tamil', 'telugu', 'malayalam', 'kannada', 'spanish', 'arabic']
+
+
+class Command(BaseCommand):
+    help = "Seed a synthetic doctor catalog and compare indexed search with the old icontains scan"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--keep', action='store_true', help="Keep the seeded catalog")
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        specialties = list(MedicalSpecialty.objects.filter(name__startswith='Benchmark '))
+        if not specialties:
+            specialties = self.seed(options['doctors'], rng)
+        doctors = Doctor.objects.filter(is_active=True)
+
+        queries = []
+        for _ in range(options['queries']):
+            name = rng.choice(LAST_NAMES + FIRST_NAMES)
+            # Half the queries are type-ahead prefixes of a name
+            queries.append(name[:rng.randint(min(4, len(name)), len(name))] if rng.random() < 0.5 else name)
+
+        def indexed(text, language):
+            return filter_doctors_by_language(search_doctors(doctors, text), language)
+
+        def scan(text, language):
+            return doctors.filter(
+                Q(name__icontains=text) | Q(specialty__name__icontains=text),
+                languages__icontains=language
+            ).order_by('name')
+
+        for label, search in [('trigram + language relation', indexed), ('icontains scan', scan)]:
+            timings = []
+            for text in queries:
+                started = time.perf_counter()
+                list(search(text, rng.choice(LANGUAGES)).values_list('id', flat=True)[:20])
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            self.stdout.write(self.style.SUCCESS(
+                f"{label}: {len(timings)} queries, p50 {statistics.median(timings):.1f} ms, "
+                f"p95 {p95:.1f} ms, max {timings[-1]:.1f} ms"
+            ))
+
+        if not options['keep']:
+            for specialty in specialties:
+                specialty.delete()
+
+    def seed(self, count, rng):
+        specialties = MedicalSpecialty.objects.bulk_create(
+            MedicalSpecialty(name=f"Benchmark {name}") for name in SPECIALTIES
+        )
+        Language.objects.bulk_create([Language(name=name) for name in LANGUAGES], ignore_conflicts=True)
+        language_ids = dict(Language.objects.filter(name__in=LANGUAGES).values_list('name', 'id'))
+
+        spoken = []
+        batch = []
+        for i in range(count):
+            names = rng.sample(LANGUAGES, rng.randint(1, 3))
+            spoken.append(names)
+            batch.append(Doctor(
+                name=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}",
+                specialty=rng.choice(specialties),
+                languages=", ".join(name.title() for name in names),
+            ))
+        # bulk_create skips the post_save signal, so fill the relation directly
+        doctors = Doctor.objects.bulk_create(batch, batch_size=5000)
+        through = Doctor.spoken_languages.through
+        through.objects.bulk_create([
+            through(doctor_id=doctor.id, language_id=language_ids[name])
+            for doctor, names in zip(doctors, spoken)
+            for name in names
+        ], batch_size=5000)
+        # Fresh planner statistics, as autovacuum would have after a real import
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Doctor._meta.db_table}, {through._meta.db_table}")
+        return specialties
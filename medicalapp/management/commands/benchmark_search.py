@@ -0,0 +1,71 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+
+from medicalapp.models import Conversation, Message
+from medicalapp.search import search_messages
+
+VOCABULARY = [
+    'headache', 'fever', 'cough', 'rash', 'fatigue', 'nausea', 'dizziness',
+    'knee', 'shoulder', 'back', 'pain', 'swelling', 'allergy', 'asthma',
+    'insulin', 'glucose', 'pressure', 'medication', 'dose', 'sleep',
+    'throat', 'chest', 'stomach', 'infection', 'antibiotic', 'vitamin',
+]
+
+
+class Command(BaseCommand):
+    help = "Seed a synthetic message corpus and measure conversation search latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=200000)
+        parser.add_argument('--conversations', type=int, default=2000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--keep', action='store_true', help="Keep the seeded corpus")
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(username='search-benchmark')
+        rng = random.Random(42)
+
+        if not Message.objects.filter(conversation__user=user).exists():
+            self.seed(user, options['conversations'], options['messages'], rng)
+
+        timings = []
+        for _ in range(options['queries']):
+            terms = " ".join(rng.sample(VOCABULARY, 2))
+            started = time.perf_counter()
+            page = Paginator(search_messages(user, terms).values('id', 'snippet'), 20).get_page(1)
+            list(page.object_list)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(timings)} queries: p50 {statistics.median(timings):.1f} ms, "
+            f"p95 {p95:.1f} ms, max {timings[-1]:.1f} ms"
+        ))
+
+        if not options['keep']:
+            Conversation.objects.filter(user=user).delete()
+            user.delete()
+
+    def seed(self, user, conversation_count, message_count, rng):
+        conversations = Conversation.objects.bulk_create(
+            Conversation(user=user) for _ in range(conversation_count)
+        )
+        batch = []
+        for i in range(message_count):
+            words = rng.choices(VOCABULARY, k=rng.randint(8, 30))
+            batch.append(Message(
+                conversation=rng.choice(conversations),
+                content=" ".join(words),
+                sender='user' if i % 2 == 0 else 'ai'
+            ))
+            if len(batch) == 5000:
+                Message.objects.bulk_create(batch)
+                batch = []
+        Message.objects.bulk_create(batch)
+        self.stdout.write(f"Seeded {message_count} messages in {conversation_count} conversations")
@@ -0,0 +1,42 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from medicalapp.exports import CHUNK_SIZE, DATASETS, FORMATS, parquet_available, stream_export
+
+
+class Command(BaseCommand):
+    help = "Stream a HealthMetrics, medication log or appointment export to a file (or stdout)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(DATASETS))
+        parser.add_argument('--output-format', choices=sorted(FORMATS), default='ndjson')
+        parser.add_argument('--file', help="Write here instead of stdout")
+        parser.add_argument('--user', type=int, help="Only this user's rows")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        output_format = options['output_format']
+        if output_format == 'parquet' and not parquet_available():
+            raise CommandError("Parquet export needs pyarrow installed")
+        if output_format == 'parquet' and not options['file']:
+            raise CommandError("Parquet export needs --file")
+
+        chunks = stream_export(options['dataset'], output_format, user=options['user'],
+                               chunk_size=options['chunk_size'])
+        started = time.perf_counter()
+        written = 0
+        if options['file']:
+            with open(options['file'], 'wb') as out:
+                for chunk in chunks:
+                    out.write(chunk)
+                    written += len(chunk)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(
+                f"Wrote {written} bytes of {options['dataset']} to {options['file']} in {elapsed:.1f}s"
+            ))
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
@@ -0,0 +1,16 @@
+from django.utils import timezone
+
+from medicalapp.schedules import sync_availability
+from ._periodic import PeriodicCommand
+
+
+class Command(PeriodicCommand):
+    help = "Expand weekly availability templates into DoctorAvailability slots for a rolling horizon"
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--days', type=int, default=90, help="Horizon length in days")
+
+    def run_once(self, **options):
+        created, updated, deleted = sync_availability(timezone.localdate(), options['days'])
+        return f"Availability synced: {created} created, {updated} updated, {deleted} removed"
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from medicalapp.adherence import rebuild_adherence
+from medicalapp.models import Medication
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily adherence rollups from the medication logs (after migrating or a bulk log import)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help="Only this user's medications")
+
+    def handle(self, *args, **options):
+        medications = Medication.objects.all()
+        if options['user'] is not None:
+            medications = medications.filter(user_id=options['user'])
+        counted = rebuild_adherence(medications)
+        self.stdout.write(self.style.SUCCESS(f"Adherence rebuilt from {counted} logs"))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from medicalapp.anomalies import rebuild_baselines
+from medicalapp.models import HealthMetrics
+
+
+class Command(BaseCommand):
+    help = "Replay stored readings into the per-user anomaly baselines (after edits or an ALPHA change)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help="Only this user's readings")
+
+    def handle(self, *args, **options):
+        readings = HealthMetrics.objects.all()
+        if options['user'] is not None:
+            readings = readings.filter(user_id=options['user'])
+        counted = rebuild_baselines(readings)
+        self.stdout.write(self.style.SUCCESS(f"Health baselines rebuilt from {counted} readings"))
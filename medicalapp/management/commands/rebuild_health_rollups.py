@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from medicalapp.health_rollups import rebuild_health_rollups
+from medicalapp.models import HealthMetrics
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily and weekly health metric rollups from the raw readings"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help="Only this user's readings")
+
+    def handle(self, *args, **options):
+        readings = HealthMetrics.objects.all()
+        if options['user'] is not None:
+            readings = readings.filter(user_id=options['user'])
+        counted = rebuild_health_rollups(readings)
+        self.stdout.write(self.style.SUCCESS(f"Health rollups rebuilt from {counted} readings"))
@@ -0,0 +1,10 @@
+from medicalapp.recommendations import refresh_recommendations
+from ._periodic import PeriodicCommand
+
+
+class Command(PeriodicCommand):
+    help = "Recompute the precomputed doctor recommendation table"
+
+    def run_once(self, **options):
+        count = refresh_recommendations()
+        return f"Refreshed recommendations for {count} doctors"
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from medicalapp.health_scores import CHUNK_SIZE, rescore_health_metrics
+from medicalapp.models import HealthMetrics
+
+
+class Command(BaseCommand):
+    help = "Recompute every stored health score with the vectorized engine (after a scoring rule change)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help="Only this user's readings")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        readings = HealthMetrics.objects.all()
+        if options['user'] is not None:
+            readings = readings.filter(user_id=options['user'])
+        started = time.perf_counter()
+        scored, updated = rescore_health_metrics(readings, options['chunk_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Scored {scored} readings in {elapsed:.1f}s ({scored / elapsed if elapsed else 0:.0f}/s), {updated} changed"
+        ))
@@ -0,0 +1,23 @@
+from medicalapp.reminders import BATCH_SIZE, dispatch_due, get_transport, schedule_reminders
+from ._periodic import PeriodicCommand
+
+
+class Command(PeriodicCommand):
+    help = "Schedule reminders for upcoming appointments and send the ones that are due"
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--transport', default=None,
+            help="Dotted path of a transport class (default: APPOINTMENT_REMINDER_TRANSPORT)"
+        )
+
+    def run_once(self, **options):
+        transport = get_transport(options['transport'])
+        scheduled = schedule_reminders(batch_size=options['batch_size'])
+        outcome = dispatch_due(transport, batch_size=options['batch_size'])
+        return (
+            f"Reminders: {scheduled} scheduled, {outcome['sent']} sent, "
+            f"{outcome['pending']} to retry, {outcome['failed']} failed, {outcome['skipped']} skipped"
+        )
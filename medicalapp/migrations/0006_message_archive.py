@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:08
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicalapp', '0005_healthmetrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='is_archived',
+            field=models.BooleanField(default=False, help_text='Messages live in MessageArchive'),
+        ),
+        migrations.CreateModel(
+            name='MessageArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload', models.BinaryField()),
+                ('codec', models.CharField(choices=[('zstd', 'Zstandard'), ('zlib', 'zlib')], default='zstd', max_length=10)),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('preview', models.CharField(blank=True, max_length=50)),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('conversation', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='message_archive', to='medicalapp.conversation')),
+            ],
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:13
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_bookings(apps, schema_editor):
+    """
+    Clear the duplicates the new constraints forbid: of several live
+    bookings for one doctor and time the first one made stands and the
+    rest are cancelled (kept for the record), and of several availability
+    rows for one slot the oldest is kept, marked booked if any copy was.
+    """
+    Appointment = apps.get_model('medicalapp', 'Appointment')
+    DoctorAvailability = apps.get_model('medicalapp', 'DoctorAvailability')
+
+    live = Appointment.objects.exclude(status='cancelled')
+    duplicated = live.values('doctor_id', 'appointment_date', 'appointment_time').annotate(
+        keep=Min('id'), copies=Count('id')
+    ).filter(copies__gt=1).order_by()
+    for group in duplicated:
+        live.filter(
+            doctor_id=group['doctor_id'], appointment_date=group['appointment_date'],
+            appointment_time=group['appointment_time'],
+        ).exclude(id=group['keep']).update(status='cancelled')
+
+    duplicated = DoctorAvailability.objects.values('doctor_id', 'date', 'start_time').annotate(
+        keep=Min('id'), copies=Count('id')
+    ).filter(copies__gt=1).order_by()
+    for group in duplicated:
+        copies = DoctorAvailability.objects.filter(
+            doctor_id=group['doctor_id'], date=group['date'], start_time=group['start_time']
+        )
+        if copies.filter(is_available=False).exists():
+            copies.filter(id=group['keep']).update(is_available=False)
+        copies.exclude(id=group['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicalapp', '0007_message_search_vector'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_bookings, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='appointment',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'cancelled'), _negated=True), fields=('doctor', 'appointment_date', 'appointment_time'), name='unique_active_doctor_booking'),
+        ),
+        migrations.AddConstraint(
+            model_name='doctoravailability',
+            constraint=models.UniqueConstraint(fields=('doctor', 'date', 'start_time'), name='unique_doctor_slot'),
+        ),
+    ]
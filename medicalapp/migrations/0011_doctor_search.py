@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:58
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+def populate_spoken_languages(apps, schema_editor):
+    Doctor = apps.get_model('medicalapp', 'Doctor')
+    Language = apps.get_model('medicalapp', 'Language')
+    Through = Doctor.spoken_languages.through
+
+    parsed = {
+        doctor_id: {part.strip().lower() for part in (languages or "").split(',') if part.strip()}
+        for doctor_id, languages in Doctor.objects.values_list('id', 'languages')
+    }
+    names = set().union(*parsed.values()) if parsed else set()
+    Language.objects.bulk_create([Language(name=name) for name in sorted(names)], ignore_conflicts=True)
+    language_ids = dict(Language.objects.values_list('name', 'id'))
+    Through.objects.bulk_create([
+        Through(doctor_id=doctor_id, language_id=language_ids[name])
+        for doctor_id, doctor_names in parsed.items()
+        for name in doctor_names
+    ], batch_size=2000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicalapp', '0010_sync_timestamps'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.CreateModel(
+            name='Language',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Lower-case language name', max_length=50, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='spoken_languages',
+            field=models.ManyToManyField(blank=True, editable=False, related_name='doctors', to='medicalapp.language'),
+        ),
+        migrations.AddIndex(
+            model_name='doctor',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='doctor_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunPython(populate_spoken_languages, migrations.RunPython.noop),
+    ]
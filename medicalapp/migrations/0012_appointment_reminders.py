@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicalapp', '0011_doctor_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lead_minutes', models.PositiveIntegerField()),
+                ('scheduled_for', models.DateTimeField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed'), ('skipped', 'Skipped')], default='pending', max_length=20)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['appointment_date', 'appointment_time'], name='appointment_start_idx'),
+        ),
+        migrations.AddField(
+            model_name='appointmentreminder',
+            name='appointment',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='medicalapp.appointment'),
+        ),
+        migrations.AddIndex(
+            model_name='appointmentreminder',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['scheduled_for'], name='reminder_pending_due_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='appointmentreminder',
+            constraint=models.UniqueConstraint(fields=('appointment', 'lead_minutes'), name='unique_appointment_reminder'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicalapp', '0012_appointment_reminders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorRecommendation',
+            fields=[
+                ('doctor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recommendation', serialize=False, to='medicalapp.doctor')),
+                ('next_free_at', models.DateTimeField(blank=True, null=True)),
+                ('free_slots_week', models.PositiveIntegerField(default=0)),
+                ('upcoming_appointments', models.PositiveIntegerField(default=0)),
+                ('score', models.FloatField(default=0)),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+        ),
+    ]
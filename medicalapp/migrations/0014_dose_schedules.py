@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:41
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_schedules(apps, schema_editor):
+    """Give every existing medication a daily schedule at its current next_dose"""
+    Medication = apps.get_model('medicalapp', 'Medication')
+    DoseSchedule = apps.get_model('medicalapp', 'DoseSchedule')
+    DoseTime = apps.get_model('medicalapp', 'DoseTime')
+
+    medications = list(Medication.objects.values_list('id', 'next_dose', 'created_at'))
+    schedules = DoseSchedule.objects.bulk_create([
+        DoseSchedule(medication_id=medication_id, interval_days=1, start_date=created_at.date())
+        for medication_id, _next_dose, created_at in medications
+    ], batch_size=1000)
+    DoseTime.objects.bulk_create([
+        DoseTime(schedule_id=schedule.id, time_of_day=next_dose)
+        for schedule, (_id, next_dose, _created) in zip(schedules, medications)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicalapp', '0013_doctor_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoseSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('interval_days', models.PositiveSmallIntegerField(default=1, help_text='1 = daily, 2 = every other day, ...')),
+                ('start_date', models.DateField(default=django.utils.timezone.localdate)),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('medication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedules', to='medicalapp.medication')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DoseTime',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time_of_day', models.TimeField()),
+                ('schedule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='times', to='medicalapp.doseschedule')),
+            ],
+            options={
+                'ordering': ['time_of_day'],
+                'indexes': [models.Index(fields=['time_of_day'], name='dose_time_of_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('schedule', 'time_of_day'), name='unique_schedule_dose_time')],
+            },
+        ),
+        migrations.RunPython(backfill_schedules, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicalapp', '0014_dose_schedules'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdherenceDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('taken', models.PositiveIntegerField(default=0)),
+                ('late', models.PositiveIntegerField(default=0)),
+                ('missed', models.PositiveIntegerField(default=0)),
+                ('medication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='adherence_days', to='medicalapp.medication')),
+            ],
+            options={
+                'ordering': ['medication', 'day'],
+                'constraints': [models.UniqueConstraint(fields=('medication', 'day'), name='unique_adherence_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:48
+
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations, models
+
+# Same rules as medicalapp.refills.parse_remaining at the time of writing
+REMAINING_PATTERN = re.compile(
+    r'^\s*(?:(?P<grouped>\d{1,3}(?:,\d{3})+(?!\d)(?:\.\d+)?)|(?P<plain>\d+(?:[.,]\d+)?))\s*(?P<unit>.*?)\s*$'
+)
+MAX_QUANTITY = Decimal(10) ** 7
+
+
+def parse_quantity(text):
+    match = REMAINING_PATTERN.match(text or '')
+    if not match:
+        return None, ''
+    if match.group('grouped'):
+        number = match.group('grouped').replace(',', '')
+    else:
+        number = match.group('plain').replace(',', '.')
+    try:
+        quantity = Decimal(number).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None, ''
+    if quantity >= MAX_QUANTITY:
+        return None, ''
+    return quantity, match.group('unit')[:30]
+
+
+def parse_remaining(apps, schema_editor):
+    Medication = apps.get_model('medicalapp', 'Medication')
+    parsed = []
+    for medication in Medication.objects.only('id', 'remaining').iterator(chunk_size=2000):
+        quantity, unit = parse_quantity(medication.remaining)
+        if quantity is not None:
+            medication.remaining_quantity = quantity
+            medication.remaining_unit = unit
+            parsed.append(medication)
+    Medication.objects.bulk_update(parsed, ['remaining_quantity', 'remaining_unit'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicalapp', '0015_adherence_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medication',
+            name='dose_amount',
+            field=models.DecimalField(decimal_places=2, default=1, help_text='Units of remaining_unit taken per dose', max_digits=7),
+        ),
+        migrations.AddField(
+            model_name='medication',
+            name='remaining_quantity',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='medication',
+            name='remaining_unit',
+            field=models.CharField(blank=True, editable=False, max_length=30),
+        ),
+        migrations.RunPython(parse_remaining, migrations.RunPython.noop),
+    ]
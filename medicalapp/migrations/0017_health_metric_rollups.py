@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicalapp', '0016_remaining_quantity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HealthMetricRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('systolic_bp', 'Systolic blood pressure'), ('diastolic_bp', 'Diastolic blood pressure'), ('heart_rate', 'Heart rate'), ('blood_glucose', 'Blood glucose'), ('oxygen_saturation', 'Oxygen saturation'), ('weight', 'Weight'), ('daily_steps', 'Daily steps'), ('sleep_hours', 'Sleep hours')], max_length=20)),
+                ('resolution', models.CharField(choices=[('day', 'Day'), ('week', 'Week')], max_length=4)),
+                ('period_start', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.FloatField(default=0)),
+                ('minimum', models.FloatField(null=True)),
+                ('maximum', models.FloatField(null=True)),
+                ('last', models.FloatField(null=True)),
+                ('last_at', models.DateTimeField(null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='health_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'metric', 'resolution', 'period_start'), name='unique_health_rollup')],
+            },
+        ),
+    ]
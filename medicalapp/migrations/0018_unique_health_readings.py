@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:58
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def drop_duplicate_readings(apps, schema_editor):
+    """Keep the newest row of each (user, timestamp) so the unique constraint can be added"""
+    HealthMetrics = apps.get_model('medicalapp', 'HealthMetrics')
+    duplicates = HealthMetrics.objects.values('user_id', 'timestamp').annotate(
+        rows=Count('id'), keep=Max('id')
+    ).filter(rows__gt=1).order_by()
+    for group in duplicates.iterator():
+        HealthMetrics.objects.filter(
+            user_id=group['user_id'], timestamp=group['timestamp']
+        ).exclude(id=group['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicalapp', '0017_health_metric_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='healthmetrics',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(drop_duplicate_readings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='healthmetrics',
+            constraint=models.UniqueConstraint(fields=('user', 'timestamp'), name='unique_health_reading'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicalapp', '0018_unique_health_readings'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HealthBaseline',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.JSONField(default=dict)),
+                ('last_at', models.DateTimeField(null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='health_baseline', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HealthAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('systolic_bp', 'Systolic blood pressure'), ('diastolic_bp', 'Diastolic blood pressure'), ('heart_rate', 'Heart rate'), ('blood_glucose', 'Blood glucose'), ('oxygen_saturation', 'Oxygen saturation'), ('weight', 'Weight'), ('daily_steps', 'Daily steps'), ('sleep_hours', 'Sleep hours')], max_length=20)),
+                ('value', models.FloatField()),
+                ('reading_at', models.DateTimeField()),
+                ('kind', models.CharField(choices=[('limit', 'Outside safe limits'), ('deviation', 'Unusual for this user')], max_length=10)),
+                ('severity', models.CharField(choices=[('warning', 'Warning'), ('critical', 'Critical')], max_length=10)),
+                ('expected', models.FloatField(help_text='Baseline mean when the reading arrived', null=True)),
+                ('z_score', models.FloatField(null=True)),
+                ('message', models.CharField(max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('acknowledged_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='health_alerts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-reading_at'],
+                'indexes': [models.Index(fields=['user', '-reading_at'], name='health_alert_user_recent')],
+            },
+        ),
+    ]
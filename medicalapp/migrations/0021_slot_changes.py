@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:23
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicalapp', '0020_cache_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doctor_id', models.BigIntegerField()),
+                ('date', models.DateField()),
+                ('created_at', models.DateTimeField(db_default=django.db.models.functions.datetime.Now())),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='slot_change_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:32
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import F, Q
+
+
+def remove_invalid_templates(apps, schema_editor):
+    """Templates with no slot length or no working time never produced a slot; drop them before the checks"""
+    AvailabilityTemplate = apps.get_model('medicalapp', 'AvailabilityTemplate')
+    AvailabilityTemplate.objects.filter(Q(slot_minutes__lt=1) | Q(end_time__lte=F('start_time'))).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicalapp', '0022_user_scoped_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_invalid_templates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='availabilitytemplate',
+            name='slot_minutes',
+            field=models.PositiveSmallIntegerField(default=30, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddConstraint(
+            model_name='availabilitytemplate',
+            constraint=models.CheckConstraint(condition=models.Q(('slot_minutes__gte', 1)), name='template_slot_minutes_positive'),
+        ),
+        migrations.AddConstraint(
+            model_name='availabilitytemplate',
+            constraint=models.CheckConstraint(condition=models.Q(('end_time__gt', models.F('start_time'))), name='template_ends_after_start'),
+        ),
+    ]
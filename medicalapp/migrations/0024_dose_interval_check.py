@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:34
+
+import django.core.validators
+from django.db import migrations, models
+
+
+def fix_zero_intervals(apps, schema_editor):
+    """An interval of 0 can't be expanded; treat those schedules as daily"""
+    DoseSchedule = apps.get_model('medicalapp', 'DoseSchedule')
+    DoseSchedule.objects.filter(interval_days__lt=1).update(interval_days=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicalapp', '0023_availability_template_checks'),
+    ]
+
+    operations = [
+        migrations.RunPython(fix_zero_intervals, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='doseschedule',
+            name='interval_days',
+            field=models.PositiveSmallIntegerField(default=1, help_text='1 = daily, 2 = every other day, ...', validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddConstraint(
+            model_name='doseschedule',
+            constraint=models.CheckConstraint(condition=models.Q(('interval_days__gte', 1)), name='dose_interval_days_positive'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicalapp', '0025_primary_pins'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatSession',
+            fields=[
+                ('token', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('state', models.JSONField(default=dict)),
+                ('expires_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires_at'], name='chat_session_expires_idx')],
+            },
+        ),
+    ]
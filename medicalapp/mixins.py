@@ -0,0 +1,145 @@
+# medicalapp/mixins.py
+import hashlib
+
+from django.db.models import Count, Max
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from .caching import current_version
+from .exports import FORMATS, parquet_available, stream_export
+
+class RelatedQuerysetMixin:
+    """
+    Let a viewset declare the related paths its serializer reads so every
+    queryset it serves is loaded with select_related/prefetch_related
+    instead of one query per row.
+
+    Declare on the viewset:
+        select_related_fields   - forward FK / one-to-one paths
+        prefetch_related_fields - reverse FK / many-to-many paths
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    def optimize_queryset(self, queryset):
+        """Apply the declared related paths to any queryset of this viewset's model"""
+        if self.select_related_fields:
+            queryset = queryset.select_related(*self.select_related_fields)
+        if self.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*self.prefetch_related_fields)
+        return queryset
+
+    def filter_queryset(self, queryset):
+        # list/retrieve/update all go through filter_queryset, including
+        # viewsets that override get_queryset without calling super()
+        return self.optimize_queryset(super().filter_queryset(queryset))
+
+
+class ConditionalListMixin:
+    """
+    Give list endpoints ETag/Last-Modified validators so clients holding a
+    current copy get 304 Not Modified without the list being serialized.
+
+    Declare on the viewset one or both of:
+        version_key    - caching.current_version key bumped on every write
+                         to the tables the list is built from
+        modified_field - auto_now field; validators come from one aggregate
+                         (latest value and row count) over the list queryset
+
+    With modified_field set, `?since=<ISO datetime>` switches the list to
+    delta mode: only rows changed after `since`, plus the ids of every row
+    still present so clients can drop deleted ones. Clients pass back the
+    returned `server_time` as the next `since`.
+    """
+    version_key = None
+    modified_field = None
+
+    def list_validators(self, queryset):
+        """Return (etag, last_modified datetime or None) for this list"""
+        parts = []
+        last_modified = None
+        if self.version_key:
+            parts.append(current_version(self.version_key))
+        if self.modified_field:
+            summary = queryset.order_by().aggregate(last=Max(self.modified_field), count=Count('pk'))
+            last_modified = summary['last']
+            parts += [summary['count'], last_modified.timestamp() if last_modified else 0]
+        # Filters, search terms and `since` all change the body, so they're part of the tag
+        parts.append(self.request.get_full_path())
+        digest = hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+        return quote_etag(digest), last_modified
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        etag, last_modified = self.list_validators(queryset)
+        last_modified = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            if self.modified_field and 'since' in request.query_params:
+                response = self.delta(queryset, request.query_params['since'])
+            else:
+                response = super().list(request, *args, **kwargs)
+        if 200 <= response.status_code < 300 or response.status_code == 304:
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def delta(self, queryset, since):
+        since_value = parse_datetime(since)
+        if since_value is None:
+            return Response({'error': 'since must be an ISO 8601 datetime'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if timezone.is_naive(since_value):
+            since_value = timezone.make_aware(since_value)
+
+        # Taken before querying so rows saved while we read show up next time
+        server_time = timezone.now()
+        changed = queryset.filter(**{f'{self.modified_field}__gt': since_value})
+        return Response({
+            'since': since,
+            'server_time': server_time.isoformat(),
+            'results': self.get_serializer(changed, many=True).data,
+            'ids': list(queryset.order_by().values_list('pk', flat=True)),
+        })
+
+
+class ExportMixin:
+    """
+    Add an `export` action streaming the viewset's table as NDJSON, CSV or
+    Parquet (`?output=ndjson|csv|parquet`; DRF reserves `?format=`).
+
+    Declare on the viewset:
+        export_dataset - exports.DATASETS key
+
+    Exports need a signed-in user and cover that user's rows; staff get
+    every row. Rows are streamed in chunks, so the response starts at once
+    and memory stays flat however large the export.
+    """
+    export_dataset = None
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def export(self, request):
+        output_format = request.query_params.get('output', 'ndjson')
+        if output_format not in FORMATS:
+            return Response({'error': f"output must be one of {', '.join(FORMATS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if output_format == 'parquet' and not parquet_available():
+            return Response({'error': 'Parquet export is not available on this server'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        user = None if request.user.is_staff else request.user
+        content_type, extension = FORMATS[output_format]
+        response = StreamingHttpResponse(
+            stream_export(self.export_dataset, output_format, user=user), content_type=content_type
+        )
+        response['Content-Disposition'] = f'attachment; filename="{self.export_dataset}.{extension}"'
+        return response
@@ -1,11 +1,50 @@
+from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models.functions import Now
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.utils import timezone
 
+class CacheVersion(models.Model):
+    """A version counter shared by every process (see caching.current_version)"""
+    key = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.key} = {self.version}"
+
+
+class ChatSession(models.Model):
+    """Appointment chatbot state for one conversation token (see chat_sessions.py)"""
+    token = models.CharField(max_length=32, primary_key=True)
+    state = models.JSONField(default=dict)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.token} until {self.expires_at}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], name='chat_session_expires_idx'),
+        ]
+
+
+class PrimaryPin(models.Model):
+    """Until when a user's reads go to the primary after a write (see backend.db_routing)"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    pinned_until = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.user_id} until {self.pinned_until}"
+
+
 class Conversation(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     start_time = models.DateTimeField(default=timezone.now)
     last_interaction = models.DateTimeField(auto_now=True)
+    is_archived = models.BooleanField(default=False, help_text="Messages live in MessageArchive")
 
     def __str__(self):
         return f"Conversation for {self.user.username} at {self.start_time}"
@@ -20,10 +59,21 @@ class Message(models.Model):
     content = models.TextField()
     sender = models.CharField(max_length=10, choices=SENDER_CHOICES)
     timestamp = models.DateTimeField(default=timezone.now)
+    # Maintained by Postgres on every insert/update, used by conversation search
+    search_vector = models.GeneratedField(
+        expression=SearchVector('content', config='english'),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
     
     def __str__(self):
         return f"{self.sender}: {self.content[:50]}"
 
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='message_search_vector_gin'),
+        ]
+
 class MedicalImage(models.Model):
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='medical_images/')
@@ -32,6 +82,25 @@ class MedicalImage(models.Model):
 
     def __str__(self):
         return f"Image for conversation {self.conversation.id}"
+
+
+class MessageArchive(models.Model):
+    """Cold storage for the messages of an inactive conversation, compressed into one blob"""
+    CODEC_CHOICES = [
+        ('zstd', 'Zstandard'),
+        ('zlib', 'zlib'),
+    ]
+
+    conversation = models.OneToOneField(Conversation, on_delete=models.CASCADE, related_name='message_archive')
+    payload = models.BinaryField()
+    codec = models.CharField(max_length=10, choices=CODEC_CHOICES, default='zstd')
+    message_count = models.PositiveIntegerField(default=0)
+    preview = models.CharField(max_length=50, blank=True)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Archive of conversation {self.conversation_id} ({self.message_count} messages)"
     
 
 # Add to medicalapp/models.py
@@ -48,9 +117,20 @@ class Medication(models.Model):
     next_dose = models.TimeField(help_text="Time for the next dose")
     refill_date = models.DateField()
     remaining = models.CharField(max_length=50)  # '15 tablets' format
+    # `remaining` parsed ("15 tablets" -> 15, "tablets"); kept in sync on save
+    remaining_quantity = models.DecimalField(max_digits=9, decimal_places=2, null=True, blank=True, editable=False)
+    remaining_unit = models.CharField(max_length=30, blank=True, editable=False)
+    dose_amount = models.DecimalField(max_digits=7, decimal_places=2, default=1,
+                                      help_text="Units of remaining_unit taken per dose")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='upcoming')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Delta sync: a user's medications changed since a timestamp
+            models.Index(fields=['user', 'updated_at'], name='medication_user_updated_idx'),
+        ]
     
 def __str__(self):
     if self.user:
@@ -68,6 +148,70 @@ class MedicationLog(models.Model):
         return f"{self.medication.name} - {self.taken_at.strftime('%Y-%m-%d %H:%M')}"
 
 
+class DoseSchedule(models.Model):
+    """
+    When a medication is taken: at each of its DoseTimes on every
+    `interval_days`-th day from start_date through end_date (open-ended if
+    blank). Dose instances are expanded on demand, never stored.
+    """
+    medication = models.ForeignKey(Medication, on_delete=models.CASCADE, related_name='schedules')
+    interval_days = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1)],
+                                                     help_text="1 = daily, 2 = every other day, ...")
+    start_date = models.DateField(default=timezone.localdate)
+    end_date = models.DateField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+
+    def __str__(self):
+        return f"{self.medication.name} every {self.interval_days} day(s) from {self.start_date}"
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(condition=models.Q(interval_days__gte=1), name='dose_interval_days_positive'),
+        ]
+
+
+class DoseTime(models.Model):
+    """One time of day in a DoseSchedule"""
+    schedule = models.ForeignKey(DoseSchedule, on_delete=models.CASCADE, related_name='times')
+    time_of_day = models.TimeField()
+
+    def __str__(self):
+        return f"{self.schedule.medication.name} at {self.time_of_day:%H:%M}"
+
+    class Meta:
+        ordering = ['time_of_day']
+        constraints = [
+            models.UniqueConstraint(fields=['schedule', 'time_of_day'], name='unique_schedule_dose_time'),
+        ]
+        indexes = [
+            # "Doses due in the next N minutes" is a range scan on time of day
+            models.Index(fields=['time_of_day'], name='dose_time_of_day_idx'),
+        ]
+
+
+
+class AdherenceDay(models.Model):
+    """
+    Daily rollup of a medication's dose logs, kept up to date as logs are
+    written so adherence over any recent window is a sum over a few rows.
+    `late` counts taken doses logged well after they were due and is
+    included in `taken`.
+    """
+    medication = models.ForeignKey(Medication, on_delete=models.CASCADE, related_name='adherence_days')
+    day = models.DateField()
+    taken = models.PositiveIntegerField(default=0)
+    late = models.PositiveIntegerField(default=0)
+    missed = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.medication.name} on {self.day}: {self.taken} taken, {self.missed} missed"
+
+    class Meta:
+        ordering = ['medication', 'day']
+        constraints = [
+            models.UniqueConstraint(fields=['medication', 'day'], name='unique_adherence_day'),
+        ]
+
 # appointment
 class MedicalSpecialty(models.Model):
     """Medical specialties like Cardiology, Orthopedics, etc."""
@@ -81,6 +225,14 @@ class MedicalSpecialty(models.Model):
         verbose_name_plural = "Medical Specialties"
 
 
+class Language(models.Model):
+    """A language doctors consult in, normalized from Doctor.languages"""
+    name = models.CharField(max_length=50, unique=True, help_text="Lower-case language name")
+
+    def __str__(self):
+        return self.name.title()
+
+
 class Doctor(models.Model):
     """Doctor model with specialization and availability"""
     name = models.CharField(max_length=100)
@@ -88,13 +240,37 @@ class Doctor(models.Model):
     bio = models.TextField(blank=True)
     is_active = models.BooleanField(default=True)
     languages = models.CharField(max_length=200, blank=True, help_text="Comma-separated languages")
+    # Kept in sync with `languages` on save so language filters can use an index
+    spoken_languages = models.ManyToManyField(Language, related_name='doctors', blank=True, editable=False)
     # Optional: Add doctor's photo
     photo = models.ImageField(upload_to='doctor_photos/', blank=True, null=True)
     
     def __str__(self):
         return f"Dr. {self.name} ({self.specialty})"
+
+    class Meta:
+        indexes = [
+            # Fuzzy, typo-tolerant name search (pg_trgm similarity operators)
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='doctor_name_trgm'),
+        ]
     
     
+class DoctorRecommendation(models.Model):
+    """
+    Precomputed ranking inputs for one active doctor, rebuilt periodically by
+    `manage.py refresh_recommendations` so ranking never joins per request.
+    """
+    doctor = models.OneToOneField(Doctor, on_delete=models.CASCADE, primary_key=True, related_name='recommendation')
+    next_free_at = models.DateTimeField(null=True, blank=True)
+    free_slots_week = models.PositiveIntegerField(default=0)
+    upcoming_appointments = models.PositiveIntegerField(default=0)
+    score = models.FloatField(default=0)
+    refreshed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Recommendation for {self.doctor_id} (score {self.score:.2f})"
+
+
 class DoctorAvailability(models.Model):
     """Doctor's available time slots"""
     doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='available_slots')
@@ -102,12 +278,88 @@ class DoctorAvailability(models.Model):
     start_time = models.TimeField()
     end_time = models.TimeField()
     is_available = models.BooleanField(default=True)
+    # Created from an AvailabilityTemplate; only these rows are removed when templates change
+    generated = models.BooleanField(default=False)
     
     def __str__(self):
         return f"{self.doctor} - {self.date} {self.start_time}-{self.end_time}"
     
     class Meta:
         verbose_name_plural = "Doctor Availabilities"
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'date', 'start_time'], name='unique_doctor_slot'),
+        ]
+
+
+class SlotChange(models.Model):
+    """
+    A doctor-day whose free slots changed through a single booking or
+    availability write. Every process's SlotIndex re-reads just these days
+    instead of rebuilding (see slots.py).
+    """
+    # Plain ids: rows must survive the doctor being deleted until they're pruned
+    doctor_id = models.BigIntegerField()
+    date = models.DateField()
+    # Database time, so every process compares against the same clock
+    created_at = models.DateTimeField(db_default=Now())
+
+    def __str__(self):
+        return f"Slots changed for doctor {self.doctor_id} on {self.date}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='slot_change_created_idx'),
+        ]
+
+
+class AvailabilityTemplate(models.Model):
+    """Weekly recurring working hours, expanded into DoctorAvailability slots"""
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='availability_templates')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_minutes = models.PositiveSmallIntegerField(default=30, validators=[MinValueValidator(1)])
+    valid_from = models.DateField(null=True, blank=True)
+    valid_until = models.DateField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+
+    def __str__(self):
+        return f"{self.doctor} - {self.get_weekday_display()} {self.start_time}-{self.end_time}"
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(condition=models.Q(slot_minutes__gte=1), name='template_slot_minutes_positive'),
+            models.CheckConstraint(condition=models.Q(end_time__gt=models.F('start_time')),
+                                   name='template_ends_after_start'),
+        ]
+
+    def clean(self):
+        if self.start_time and self.end_time and self.end_time <= self.start_time:
+            raise ValidationError({'end_time': "End time must be after the start time."})
+
+
+class AvailabilityException(models.Model):
+    """Holiday or leave that blocks template slots; no doctor means it applies to every doctor"""
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='availability_exceptions',
+                               null=True, blank=True)
+    date = models.DateField()
+    start_time = models.TimeField(null=True, blank=True, help_text="Leave empty to block the whole day")
+    end_time = models.TimeField(null=True, blank=True)
+    reason = models.CharField(max_length=200, blank=True)
+
+    def __str__(self):
+        who = self.doctor if self.doctor else "All doctors"
+        return f"{who} - {self.date} {self.reason}"
 
 
 class AppointmentCategory(models.Model):
@@ -166,10 +418,62 @@ class Appointment(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='scheduled')
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Client-supplied key so retried booking requests return the original appointment
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
     
     def __str__(self):
         return f"{self.patient_name} with {self.doctor} on {self.appointment_date} at {self.appointment_time}"
 
+    class Meta:
+        constraints = [
+            # A doctor can't have two live bookings at the same time; cancelled ones don't count
+            models.UniqueConstraint(
+                fields=['doctor', 'appointment_date', 'appointment_time'],
+                condition=~models.Q(status='cancelled'),
+                name='unique_active_doctor_booking',
+            ),
+            # Keys are per user, so one client's key can never return another patient's booking
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='unique_user_idempotency_key'),
+        ]
+        indexes = [
+            models.Index(fields=['updated_at'], name='appointment_updated_idx'),
+            # Reminder scans walk upcoming appointments in start-time order
+            models.Index(fields=['appointment_date', 'appointment_time'], name='appointment_start_idx'),
+        ]
+
+
+class AppointmentReminder(models.Model):
+    """One reminder for one appointment, sent `lead_minutes` before it starts"""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+        ('skipped', 'Skipped'),
+    )
+
+    appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name='reminders')
+    lead_minutes = models.PositiveIntegerField()
+    scheduled_for = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Reminder for appointment {self.appointment_id} ({self.lead_minutes} min, {self.status})"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['appointment', 'lead_minutes'], name='unique_appointment_reminder'),
+        ]
+        indexes = [
+            # The dispatcher only ever reads due pending reminders
+            models.Index(fields=['scheduled_for'], condition=models.Q(status='pending'),
+                         name='reminder_pending_due_idx'),
+        ]
+
 
 
 from django.db import models
@@ -179,7 +483,8 @@ User = get_user_model()
 
 class HealthMetrics(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='health_metrics')
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # A default rather than auto_now_add so bulk ingestion can keep device timestamps
+    timestamp = models.DateTimeField(default=timezone.now)
     last_updated = models.DateTimeField(auto_now=True)
     
     # Vital Signs
@@ -264,4 +569,105 @@ class HealthMetrics(models.Model):
 
         total_score = sum(scores.values())
         self.health_score = min(100, max(0, round(total_score)))
-        return self.health_score
\ No newline at end of file
+        return self.health_score
+
+    class Meta:
+        constraints = [
+            # One reading per user per instant; re-uploaded wearable batches are deduplicated on it
+            models.UniqueConstraint(fields=['user', 'timestamp'], name='unique_health_reading'),
+        ]
+
+
+class HealthMetricRollup(models.Model):
+    """
+    Materialized min/max/mean/last of one metric for one user over a day or
+    a week (weeks start on Monday), so trend charts read one row per period
+    instead of every reading.
+    """
+    METRIC_CHOICES = [
+        ('systolic_bp', 'Systolic blood pressure'),
+        ('diastolic_bp', 'Diastolic blood pressure'),
+        ('heart_rate', 'Heart rate'),
+        ('blood_glucose', 'Blood glucose'),
+        ('oxygen_saturation', 'Oxygen saturation'),
+        ('weight', 'Weight'),
+        ('daily_steps', 'Daily steps'),
+        ('sleep_hours', 'Sleep hours'),
+    ]
+    RESOLUTION_CHOICES = [
+        ('day', 'Day'),
+        ('week', 'Week'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='health_rollups')
+    metric = models.CharField(max_length=20, choices=METRIC_CHOICES)
+    resolution = models.CharField(max_length=4, choices=RESOLUTION_CHOICES)
+    period_start = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+    total = models.FloatField(default=0)
+    minimum = models.FloatField(null=True)
+    maximum = models.FloatField(null=True)
+    last = models.FloatField(null=True)
+    last_at = models.DateTimeField(null=True)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def __str__(self):
+        return f"{self.metric} for {self.user} ({self.resolution} of {self.period_start})"
+
+    class Meta:
+        constraints = [
+            # Also the index trend queries scan: one user's metric at one resolution over a date range
+            models.UniqueConstraint(
+                fields=['user', 'metric', 'resolution', 'period_start'], name='unique_health_rollup'
+            ),
+        ]
+
+class HealthBaseline(models.Model):
+    """
+    A user's running baseline for each metric: exponentially weighted mean
+    and variance, updated in O(1) per new reading (see anomalies.py).
+    `state` maps metric -> [mean, variance, readings seen].
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='health_baseline')
+    state = models.JSONField(default=dict)
+    last_at = models.DateTimeField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Health baseline for {self.user}"
+
+
+class HealthAlert(models.Model):
+    """A reading outside safe limits or far from the user's own baseline"""
+    KIND_CHOICES = [
+        ('limit', 'Outside safe limits'),
+        ('deviation', 'Unusual for this user'),
+    ]
+    SEVERITY_CHOICES = [
+        ('warning', 'Warning'),
+        ('critical', 'Critical'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='health_alerts')
+    metric = models.CharField(max_length=20, choices=HealthMetricRollup.METRIC_CHOICES)
+    value = models.FloatField()
+    reading_at = models.DateTimeField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    severity = models.CharField(max_length=10, choices=SEVERITY_CHOICES)
+    expected = models.FloatField(null=True, help_text="Baseline mean when the reading arrived")
+    z_score = models.FloatField(null=True)
+    message = models.CharField(max_length=200)
+    created_at = models.DateTimeField(auto_now_add=True)
+    acknowledged_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.severity} {self.metric} alert for {self.user}"
+
+    class Meta:
+        ordering = ['-reading_at']
+        indexes = [
+            models.Index(fields=['user', '-reading_at'], name='health_alert_user_recent'),
+        ]
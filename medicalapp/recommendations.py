@@ -0,0 +1,166 @@
+# medicalapp/recommendations.py
+"""
+Doctor recommendations for the appointment chatbot and API.
+
+`refresh_recommendations()` (run periodically by
+`manage.py refresh_recommendations`) computes each active doctor's next
+free slot, free slots this week and booked appointment load in three
+grouped queries and upserts them, with a base score, into
+DoctorRecommendation. Requests only rank an already-known list of doctors
+against an in-process copy of that table, adding a bonus for doctors who
+speak the patient's language, so ranking costs no queries once loaded.
+"""
+import threading
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .availability import free_slots
+from .caching import current_version, bump_version
+from .models import Appointment, Doctor, DoctorRecommendation
+from .slots import parse_languages
+
+VERSION_KEY = 'doctor_recommendations_version'
+
+NEXT_SLOT_HORIZON_DAYS = 60
+LOAD_WINDOW_DAYS = 14
+# Score = SLOT_WEIGHT * soonness + LOAD_WEIGHT * lightness (+ LANGUAGE_WEIGHT per request)
+SLOT_WEIGHT = 0.6
+LOAD_WEIGHT = 0.25
+LANGUAGE_WEIGHT = 0.5
+# Appointments in the load window at which a doctor's lightness halves
+LOAD_HALF = 10
+
+# Chatbot language codes -> names used in Doctor.languages
+LANGUAGE_NAMES = {
+    'en': 'english', 'hi': 'hindi', 'es': 'spanish', 'fr': 'french',
+    'de': 'german', 'zh': 'chinese', 'ru': 'russian', 'pt': 'portuguese',
+}
+
+
+def language_name(language):
+    """'hi' or 'Hindi' -> 'hindi'; None for no preference"""
+    if not language:
+        return None
+    language = language.strip().lower()
+    return LANGUAGE_NAMES.get(language, language)
+
+
+def base_score(next_free_at, upcoming_appointments, now):
+    soonness = 0.0
+    if next_free_at is not None:
+        days_away = max((next_free_at - now).total_seconds(), 0) / 86400
+        soonness = 1 / (1 + days_away)
+    lightness = 1 / (1 + upcoming_appointments / LOAD_HALF)
+    return SLOT_WEIGHT * soonness + LOAD_WEIGHT * lightness
+
+
+def refresh_recommendations(now=None):
+    """Recompute every active doctor's recommendation row; returns how many were written"""
+    now = now or timezone.localtime()
+    today = now.date()
+
+    slots = free_slots(today, today + timedelta(days=NEXT_SLOT_HORIZON_DAYS), now)
+    next_free = {
+        doctor_id: timezone.make_aware(datetime.combine(day, start_time))
+        for doctor_id, day, start_time in slots.order_by(
+            'doctor_id', 'date', 'start_time'
+        ).distinct('doctor_id').values_list('doctor_id', 'date', 'start_time')
+    }
+    free_week = dict(
+        slots.filter(date__lt=today + timedelta(days=7)).values('doctor_id').annotate(
+            free=Count('id')
+        ).order_by().values_list('doctor_id', 'free')
+    )
+    load = dict(
+        Appointment.objects.filter(
+            appointment_date__gte=today, appointment_date__lt=today + timedelta(days=LOAD_WINDOW_DAYS)
+        ).exclude(status='cancelled').values('doctor_id').annotate(
+            booked=Count('id')
+        ).order_by().values_list('doctor_id', 'booked')
+    )
+
+    rows = []
+    for doctor_id in Doctor.objects.filter(is_active=True).values_list('id', flat=True).iterator():
+        rows.append(DoctorRecommendation(
+            doctor_id=doctor_id,
+            next_free_at=next_free.get(doctor_id),
+            free_slots_week=free_week.get(doctor_id, 0),
+            upcoming_appointments=load.get(doctor_id, 0),
+            score=base_score(next_free.get(doctor_id), load.get(doctor_id, 0), now),
+            refreshed_at=now,
+        ))
+
+    with transaction.atomic():
+        DoctorRecommendation.objects.bulk_create(
+            rows, batch_size=1000, update_conflicts=True, unique_fields=['doctor'],
+            update_fields=['next_free_at', 'free_slots_week', 'upcoming_appointments', 'score', 'refreshed_at'],
+        )
+        DoctorRecommendation.objects.exclude(doctor__is_active=True).delete()
+        transaction.on_commit(lambda: bump_version(VERSION_KEY))
+    return len(rows)
+
+
+class RecommendationTable:
+    def __init__(self, version):
+        self.version = version
+        self.rows = {
+            doctor_id: {'score': score, 'next_free_at': next_free_at}
+            for doctor_id, score, next_free_at in DoctorRecommendation.objects.values_list(
+                'doctor_id', 'score', 'next_free_at'
+            ).iterator(chunk_size=5000)
+        }
+
+    def score(self, doctor_id, languages, language=None):
+        """Precomputed score plus the language bonus for this request"""
+        row = self.rows.get(doctor_id)
+        score = row['score'] if row else 0.0
+        if language and language in parse_languages(languages):
+            score += LANGUAGE_WEIGHT
+        return score
+
+    def next_free_at(self, doctor_id):
+        row = self.rows.get(doctor_id)
+        return row['next_free_at'] if row else None
+
+
+_table = None
+_lock = threading.Lock()
+
+
+def get_recommendation_table():
+    """Return the in-process table, reloading it after a refresh"""
+    global _table
+    version = current_version(VERSION_KEY)
+    table = _table
+    if table is not None and table.version == version:
+        return table
+    with _lock:
+        if _table is None or _table.version != version:
+            _table = RecommendationTable(version)
+        return _table
+
+
+def rank_doctors(doctors, language=None, id_of=lambda d: d['id'], languages_of=lambda d: d['languages']):
+    """Order doctors (taxonomy dicts by default) best recommendation first, ties by id"""
+    table = get_recommendation_table()
+    wanted = language_name(language)
+    return sorted(
+        doctors,
+        key=lambda d: (-table.score(id_of(d), languages_of(d), wanted), id_of(d))
+    )
+
+
+def recommended_doctor_options(taxonomy, subcategory, language=None):
+    """Chatbot doctor options for a subcategory, best first"""
+    table = get_recommendation_table()
+    options = []
+    for doctor in rank_doctors(taxonomy.doctors_for_subcategory(subcategory), language):
+        next_free_at = table.next_free_at(doctor['id'])
+        options.append({
+            'id': doctor['id'], 'name': doctor['name'], 'specialty': doctor['specialty'],
+            'next_available': timezone.localtime(next_free_at).isoformat() if next_free_at else None,
+        })
+    return options
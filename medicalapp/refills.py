@@ -0,0 +1,140 @@
+# medicalapp/refills.py
+"""
+Remaining supply and refill forecasts.
+
+`Medication.remaining` stays the free-text field clients edit ("15
+tablets"); it is parsed into remaining_quantity/remaining_unit whenever a
+medication is saved. Logged doses use consume_doses(), which decrements
+both in SQL, so concurrent logs can't lose an update and the text never
+drifts from the number.
+
+forecast_refills() projects every medication's run-out date at once: the
+schedules give each medication's doses per day, and the division of
+supply by daily use happens over NumPy arrays rather than per row.
+"""
+import re
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+
+import numpy as np
+from django.db.models import Count, DecimalField, F, Func, Q, Value
+from django.db.models.functions import Concat, Greatest, Trim
+from django.utils import timezone
+
+from .models import DoseTime, Medication
+
+# "1,000" (a comma before exactly three digits) groups thousands; "2,5" is a decimal comma
+REMAINING_PATTERN = re.compile(
+    r'^\s*(?:(?P<grouped>\d{1,3}(?:,\d{3})+(?!\d)(?:\.\d+)?)|(?P<plain>\d+(?:[.,]\d+)?))\s*(?P<unit>.*?)\s*$'
+)
+# Medication.remaining_quantity is DecimalField(max_digits=9, decimal_places=2)
+QUANTITY_STEP = Decimal('0.01')
+MAX_QUANTITY = Decimal(10) ** 7
+
+
+def parse_remaining(text):
+    """'15 tablets' -> (Decimal('15'), 'tablets'); (None, '') without a leading number that fits the column"""
+    match = REMAINING_PATTERN.match(text or '')
+    if not match:
+        return None, ''
+    if match.group('grouped'):
+        number = match.group('grouped').replace(',', '')
+    else:
+        number = match.group('plain').replace(',', '.')
+    try:
+        quantity = Decimal(number).quantize(QUANTITY_STEP)
+    except InvalidOperation:
+        return None, ''
+    if quantity >= MAX_QUANTITY:
+        return None, ''
+    return quantity, match.group('unit')[:30]
+
+
+def sync_remaining(medication):
+    """Set the structured fields from medication.remaining"""
+    medication.remaining_quantity, medication.remaining_unit = parse_remaining(medication.remaining)
+
+
+class TrimScale(Func):
+    """Postgres trim_scale(): 14.00 -> 14, 2.50 -> 2.5"""
+    function = 'TRIM_SCALE'
+    output_field = DecimalField()
+
+
+def consume_doses(dose_counts, now=None):
+    """
+    Take `dose_counts` ({medication_id: doses taken}) off the remaining
+    supply, never below zero. One UPDATE per distinct dose count (almost
+    always one), evaluated in the database.
+    """
+    now = now or timezone.now()
+    by_count = {}
+    for medication_id, doses in dose_counts.items():
+        if doses:
+            by_count.setdefault(doses, []).append(medication_id)
+    for doses, medication_ids in by_count.items():
+        left = Greatest(F('remaining_quantity') - F('dose_amount') * doses, Value(Decimal(0)))
+        Medication.objects.filter(id__in=medication_ids, remaining_quantity__isnull=False).update(
+            remaining_quantity=left,
+            remaining=Trim(Concat(TrimScale(left), Value(' '), F('remaining_unit'))),
+            updated_at=now,
+        )
+
+
+def daily_dose_rates(medication_ids, today=None):
+    """NumPy array of doses per day for each of `medication_ids`, from their active schedules"""
+    today = today or timezone.localdate()
+    ids = np.asarray(medication_ids, dtype=np.int64)
+    rates = np.zeros(len(ids))
+    if not len(ids):
+        return rates
+    rows = DoseTime.objects.filter(
+        schedule__medication_id__in=medication_ids,
+        schedule__is_active=True,
+    ).filter(
+        Q(schedule__end_date__isnull=True) | Q(schedule__end_date__gte=today)
+    ).values('schedule__medication_id', 'schedule__interval_days').annotate(
+        times=Count('id')
+    ).order_by().values_list('schedule__medication_id', 'schedule__interval_days', 'times')
+    rows = np.array(list(rows), dtype=np.float64).reshape(-1, 3)
+    if len(rows):
+        order = np.argsort(ids)
+        positions = order[np.searchsorted(ids, rows[:, 0].astype(np.int64), sorter=order)]
+        np.add.at(rates, positions, rows[:, 2] / rows[:, 1])
+    return rates
+
+
+def forecast_refills(medications, today=None):
+    """
+    {medication_id: {'name', 'remaining', 'unit', 'doses_per_day', 'days_left', 'run_out_date'}}
+    for a Medication queryset. days_left and run_out_date are None when the
+    supply is unknown or nothing is scheduled.
+    """
+    today = today or timezone.localdate()
+    rows = list(medications.order_by().values_list(
+        'id', 'name', 'remaining_quantity', 'remaining_unit', 'dose_amount'
+    ))
+    if not rows:
+        return {}
+    ids, names, quantities, units, amounts = zip(*rows)
+    remaining = np.array([np.nan if quantity is None else float(quantity) for quantity in quantities])
+    doses_per_day = daily_dose_rates(ids, today)
+    usage = doses_per_day * np.array(amounts, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_left = np.where(usage > 0, np.floor(remaining / usage), np.nan)
+    # Past date.max numpy's dates no longer convert to datetime.date
+    days_left = np.minimum(days_left, (date.max - today).days)
+    known = ~np.isnan(days_left)
+    run_out = np.datetime64(today, 'D') + np.where(known, days_left, 0).astype('timedelta64[D]')
+
+    return {
+        medication_id: {
+            'name': names[i],
+            'remaining': None if np.isnan(remaining[i]) else float(remaining[i]),
+            'unit': units[i],
+            'doses_per_day': round(float(doses_per_day[i]), 3),
+            'days_left': int(days_left[i]) if known[i] else None,
+            'run_out_date': run_out[i].item() if known[i] else None,
+        }
+        for i, medication_id in enumerate(ids)
+    }
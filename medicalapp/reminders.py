@@ -0,0 +1,214 @@
+# medicalapp/reminders.py
+"""
+Batch appointment reminders.
+
+Scheduling and sending are separate passes so neither touches appointments
+one at a time:
+
+* schedule_reminders() walks the appointments starting within each lead
+  time (an index range scan on date/time) and bulk-inserts one pending
+  AppointmentReminder per appointment and lead. The unique constraint makes
+  re-runs and concurrent schedulers harmless.
+* dispatch_due() claims due pending reminders in batches with
+  SELECT ... FOR UPDATE SKIP LOCKED, hands each batch to the configured
+  transport in one call and records the outcomes with one UPDATE each.
+  Failed sends are retried later with a delay until MAX_ATTEMPTS.
+
+Transports are plain classes with send_batch(messages); the console and
+file transports stand in for a real SMS/email gateway during development.
+"""
+import json
+import sys
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core import mail
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Appointment, AppointmentReminder
+
+BATCH_SIZE = 1000
+MAX_ATTEMPTS = 3
+RETRY_DELAY = timedelta(minutes=5)
+
+
+def reminder_leads():
+    """Minutes before an appointment at which reminders go out"""
+    return getattr(settings, 'APPOINTMENT_REMINDER_LEADS', [24 * 60, 2 * 60])
+
+
+def appointment_start(appointment_date, appointment_time):
+    return timezone.make_aware(datetime.combine(appointment_date, appointment_time))
+
+
+def starting_between(start, end):
+    """Q for appointments whose (date, time) lies in (start, end], usable by the start index"""
+    start, end = timezone.localtime(start), timezone.localtime(end)
+    if start.date() == end.date():
+        return Q(appointment_date=start.date(),
+                 appointment_time__gt=start.time(), appointment_time__lte=end.time())
+    return (
+        Q(appointment_date=start.date(), appointment_time__gt=start.time())
+        | Q(appointment_date__gt=start.date(), appointment_date__lt=end.date())
+        | Q(appointment_date=end.date(), appointment_time__lte=end.time())
+    )
+
+
+def schedule_reminders(now=None, batch_size=BATCH_SIZE):
+    """Create pending reminders for appointments entering a lead window; returns how many"""
+    now = now or timezone.now()
+    created = 0
+    leads = sorted(reminder_leads())
+    for shorter, lead in zip([0] + leads, leads):
+        # An appointment already inside a shorter lead only gets that reminder,
+        # so late bookings aren't sent the day-before and two-hour ones together
+        already = AppointmentReminder.objects.filter(appointment_id=OuterRef('pk'), lead_minutes=lead)
+        upcoming = Appointment.objects.filter(
+            starting_between(now + timedelta(minutes=shorter), now + timedelta(minutes=lead))
+        ).exclude(status='cancelled').exclude(Exists(already)).values_list(
+            'id', 'appointment_date', 'appointment_time'
+        )
+
+        batch = []
+        for appointment_id, day, start_time in upcoming.iterator(chunk_size=batch_size):
+            batch.append(AppointmentReminder(
+                appointment_id=appointment_id, lead_minutes=lead,
+                scheduled_for=appointment_start(day, start_time) - timedelta(minutes=lead),
+            ))
+            if len(batch) >= batch_size:
+                created += len(AppointmentReminder.objects.bulk_create(batch, ignore_conflicts=True))
+                batch = []
+        if batch:
+            created += len(AppointmentReminder.objects.bulk_create(batch, ignore_conflicts=True))
+    return created
+
+
+def build_message(reminder):
+    appointment = reminder.appointment
+    when = f"{appointment.appointment_date:%A, %B %d, %Y} at {appointment.appointment_time:%I:%M %p}"
+    return {
+        'reminder_id': reminder.id,
+        'email': appointment.patient_email,
+        'phone': appointment.patient_phone,
+        'subject': "Appointment reminder",
+        'body': f"Hi {appointment.patient_name}, this is a reminder of your appointment "
+                f"with Dr. {appointment.doctor.name} on {when}.",
+    }
+
+
+def dispatch_due(transport, now=None, batch_size=BATCH_SIZE):
+    """Send every due pending reminder through `transport`; returns counts by outcome"""
+    now = now or timezone.now()
+    totals = Counter()
+    while True:
+        with transaction.atomic():
+            batch = list(
+                AppointmentReminder.objects.select_for_update(skip_locked=True, of=('self',))
+                .filter(status='pending', scheduled_for__lte=now)
+                .select_related('appointment__doctor')
+                .order_by('scheduled_for')[:batch_size]
+            )
+            if not batch:
+                break
+
+            outgoing = []
+            skipped = []
+            for reminder in batch:
+                appointment = reminder.appointment
+                start = appointment_start(appointment.appointment_date, appointment.appointment_time)
+                if appointment.status == 'cancelled' or start <= now:
+                    skipped.append(reminder.id)
+                else:
+                    outgoing.append(reminder)
+
+            errors = transport.send_batch([build_message(r) for r in outgoing]) if outgoing else []
+            sent = []
+            failed = []
+            for reminder, error in zip(outgoing, errors):
+                if error is None:
+                    sent.append(reminder.id)
+                    continue
+                reminder.attempts += 1
+                reminder.last_error = str(error)
+                if reminder.attempts >= MAX_ATTEMPTS:
+                    reminder.status = 'failed'
+                else:
+                    reminder.scheduled_for = now + RETRY_DELAY
+                failed.append(reminder)
+
+            # Outcomes are mostly uniform, so one UPDATE per outcome rather
+            # than a per-row CASE over the whole batch
+            AppointmentReminder.objects.filter(id__in=sent).update(
+                status='sent', sent_at=now, attempts=F('attempts') + 1
+            )
+            AppointmentReminder.objects.filter(id__in=skipped).update(status='skipped')
+            AppointmentReminder.objects.bulk_update(failed, ['status', 'attempts', 'last_error', 'scheduled_for'])
+            totals.update(sent=len(sent), skipped=len(skipped))
+            totals.update(reminder.status for reminder in failed)
+        if len(batch) < batch_size:
+            break
+    return totals
+
+
+class ReminderTransport:
+    """
+    Delivery backend. send_batch(messages) receives a list of message dicts
+    (reminder_id, email, phone, subject, body) and returns one entry per
+    message: None when delivered, otherwise the error.
+    """
+
+    def send_batch(self, messages):
+        raise NotImplementedError
+
+
+class ConsoleTransport(ReminderTransport):
+    """Print reminders instead of sending them"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def send_batch(self, messages):
+        for message in messages:
+            self.stream.write(f"[reminder {message['reminder_id']}] to {message['email']}: {message['body']}\n")
+        self.stream.flush()
+        return [None] * len(messages)
+
+
+class FileTransport(ReminderTransport):
+    """Append reminders as JSON lines to APPOINTMENT_REMINDER_FILE"""
+
+    def __init__(self, path=None):
+        self.path = path or getattr(settings, 'APPOINTMENT_REMINDER_FILE', 'appointment_reminders.ndjson')
+
+    def send_batch(self, messages):
+        with open(self.path, 'a', encoding='utf-8') as handle:
+            handle.writelines(json.dumps(message) + "\n" for message in messages)
+        return [None] * len(messages)
+
+
+class EmailTransport(ReminderTransport):
+    """Send reminders through Django's email backend over a single connection"""
+
+    def send_batch(self, messages):
+        errors = []
+        with mail.get_connection() as connection:
+            for message in messages:
+                email = mail.EmailMessage(
+                    message['subject'], message['body'], to=[message['email']], connection=connection
+                )
+                try:
+                    email.send()
+                    errors.append(None)
+                except Exception as e:
+                    errors.append(e)
+        return errors
+
+
+def get_transport(path=None):
+    """Instantiate the transport class named by `path` or APPOINTMENT_REMINDER_TRANSPORT"""
+    path = path or getattr(settings, 'APPOINTMENT_REMINDER_TRANSPORT', 'medicalapp.reminders.ConsoleTransport')
+    return import_string(path)()
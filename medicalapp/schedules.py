@@ -0,0 +1,154 @@
+# medicalapp/schedules.py
+"""
+Expansion of weekly AvailabilityTemplates into concrete DoctorAvailability
+slots over a rolling horizon.
+
+Runs are idempotent: desired slots are diffed against the rows already in
+the horizon, so only missing slots are inserted (bulk_create), changed end
+times are updated (one UPDATE per end time) and generated slots that no template wants
+any more are deleted. Manually entered and booked slots are never touched.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import AvailabilityException, AvailabilityTemplate, DoctorAvailability
+from .slots import invalidate_slot_index, prune_slot_changes
+
+DOCTOR_CHUNK_SIZE = 50
+BATCH_SIZE = 2000
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def template_slots(template, day):
+    """(start_time, end_time) pairs for one template on one day"""
+    start = datetime.combine(day, template.start_time)
+    end = datetime.combine(day, template.end_time)
+    if template.slot_minutes < 1 or end <= start:
+        return
+    step = timedelta(minutes=template.slot_minutes)
+    while start + step <= end:
+        yield start.time(), (start + step).time()
+        start += step
+
+
+def _blocked(exceptions, start_time, end_time):
+    """True if any exception (None = whole day, or (start, end) minutes) overlaps the slot"""
+    for blocked in exceptions:
+        if blocked is None:
+            return True
+        if _minutes(start_time) < blocked[1] and blocked[0] < _minutes(end_time):
+            return True
+    return False
+
+
+def desired_slots(doctor_ids, start_date, end_date):
+    """{(doctor_id, date, start_time): end_time} for every template slot not blocked by an exception"""
+    templates = defaultdict(list)
+    for template in AvailabilityTemplate.objects.filter(doctor_id__in=doctor_ids, is_active=True):
+        templates[template.doctor_id].append(template)
+
+    exceptions = defaultdict(list)
+    for doctor_id, day, start, end in AvailabilityException.objects.filter(
+        date__gte=start_date, date__lt=end_date
+    ).filter(
+        Q(doctor_id__in=doctor_ids) | Q(doctor__isnull=True)
+    ).values_list('doctor_id', 'date', 'start_time', 'end_time'):
+        blocked = (_minutes(start), _minutes(end)) if start and end else None
+        exceptions[(doctor_id, day)].append(blocked)
+
+    desired = {}
+    day = start_date
+    while day < end_date:
+        weekday = day.weekday()
+        holiday = exceptions.get((None, day), [])
+        for doctor_id, doctor_templates in templates.items():
+            blocked = holiday + exceptions.get((doctor_id, day), [])
+            for template in doctor_templates:
+                if template.weekday != weekday:
+                    continue
+                if (template.valid_from and day < template.valid_from) or \
+                        (template.valid_until and day > template.valid_until):
+                    continue
+                for start_time, end_time in template_slots(template, day):
+                    if not _blocked(blocked, start_time, end_time):
+                        desired[(doctor_id, day, start_time)] = end_time
+        day += timedelta(days=1)
+    return desired
+
+
+@transaction.atomic
+def sync_doctors(doctor_ids, start_date, end_date):
+    desired = desired_slots(doctor_ids, start_date, end_date)
+
+    # Plain tuples rather than model instances: a year of slots is millions of rows
+    existing = {}
+    for row_id, doctor_id, day, start_time, end_time, is_available, generated in DoctorAvailability.objects.filter(
+        doctor_id__in=doctor_ids, date__gte=start_date, date__lt=end_date
+    ).values_list('id', 'doctor_id', 'date', 'start_time', 'end_time', 'is_available', 'generated'):
+        # Only free generated rows may be changed; everything else just occupies its key
+        existing[(doctor_id, day, start_time)] = (row_id, end_time) if generated and is_available else None
+
+    to_create = []
+    to_update = defaultdict(list)  # new end_time -> row ids
+    for key, end_time in desired.items():
+        if key not in existing:
+            doctor_id, day, start_time = key
+            to_create.append(DoctorAvailability(
+                doctor_id=doctor_id, date=day, start_time=start_time,
+                end_time=end_time, is_available=True, generated=True
+            ))
+            continue
+        row = existing[key]
+        if row is not None and row[1] != end_time:
+            to_update[end_time].append(row[0])
+
+    stale = [
+        row[0] for key, row in existing.items()
+        if row is not None and key not in desired
+    ]
+
+    DoctorAvailability.objects.bulk_create(to_create, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    # The rows were read without a lock: re-check is_available in the writes themselves,
+    # so a slot booked since then is left alone. One UPDATE per end time (there are few)
+    updated = deleted = 0
+    for end_time, ids in to_update.items():
+        for i in range(0, len(ids), BATCH_SIZE):
+            updated += DoctorAvailability.objects.filter(
+                id__in=ids[i:i + BATCH_SIZE], is_available=True
+            ).update(end_time=end_time)
+    for i in range(0, len(stale), BATCH_SIZE):
+        deleted += DoctorAvailability.objects.filter(id__in=stale[i:i + BATCH_SIZE], is_available=True).delete()[0]
+    return len(to_create), updated, deleted
+
+
+def sync_availability(start_date, days):
+    """
+    Bring generated availability for [start_date, start_date + days) in line
+    with the templates. Returns (created, updated, deleted).
+    """
+    end_date = start_date + timedelta(days=days)
+    doctor_ids = set(
+        AvailabilityTemplate.objects.values_list('doctor_id', flat=True)
+    ) | set(
+        DoctorAvailability.objects.filter(
+            generated=True, date__gte=start_date, date__lt=end_date
+        ).values_list('doctor_id', flat=True).distinct()
+    )
+    doctor_ids = sorted(doctor_ids)
+
+    totals = [0, 0, 0]
+    for i in range(0, len(doctor_ids), DOCTOR_CHUNK_SIZE):
+        counts = sync_doctors(doctor_ids[i:i + DOCTOR_CHUNK_SIZE], start_date, end_date)
+        totals = [total + count for total, count in zip(totals, counts)]
+
+    if any(totals):
+        # Bulk writes skip model signals, so refresh the slot index explicitly
+        transaction.on_commit(invalidate_slot_index)
+    prune_slot_changes()
+    return tuple(totals)
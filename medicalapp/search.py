@@ -0,0 +1,79 @@
+# medicalapp/search.py
+from django.contrib.postgres.search import (
+    SearchHeadline, SearchQuery, SearchRank, TrigramWordSimilarity
+)
+from django.db.models import Case, F, FloatField, Q, Value, When
+
+from .models import Doctor, Language, MedicalSpecialty, Message
+from .slots import parse_languages
+
+# Rank bonus for doctors whose specialty matches the query, so "cardio"
+# lists cardiologists alongside doctors whose name looks like "cardio"
+SPECIALTY_MATCH_BOOST = 0.5
+
+
+def search_messages(user, query_text):
+    """
+    Ranked full-text search over a user's messages using the GIN-indexed
+    search_vector column. Archived conversations are not searched until
+    they are reopened.
+    """
+    query = SearchQuery(query_text, config='english', search_type='websearch')
+    return Message.objects.filter(
+        conversation__user=user,
+        search_vector=query
+    ).annotate(
+        rank=SearchRank(F('search_vector'), query),
+        snippet=SearchHeadline(
+            'content', query, config='english',
+            start_sel='<mark>', stop_sel='</mark>', max_words=25, min_words=10
+        )
+    ).order_by('-rank', '-timestamp')
+
+
+def search_doctors(queryset, query_text):
+    """
+    Fuzzy, ranked doctor search. Names match with the `name %> query`
+    word-similarity operator, which the trigram GIN index answers directly
+    (partial and slightly misspelled names match); specialty names are
+    resolved to ids first so both branches of the OR stay indexed. Results
+    are ordered by best match. Filter on the operator, never on the
+    similarity score: a score comparison can't use the index.
+    """
+    query_text = query_text.strip()
+    specialty_ids = list(
+        MedicalSpecialty.objects.filter(name__icontains=query_text).values_list('id', flat=True)
+    )
+    return queryset.filter(
+        Q(name__trigram_word_similar=query_text) | Q(specialty_id__in=specialty_ids)
+    ).annotate(
+        rank=TrigramWordSimilarity(query_text, 'name') + Case(
+            When(specialty_id__in=specialty_ids, then=Value(SPECIALTY_MATCH_BOOST)),
+            default=Value(0.0), output_field=FloatField()
+        )
+    ).order_by('-rank', 'name')
+
+
+def filter_doctors_by_language(queryset, languages):
+    """Doctors who speak any of `languages` ("hindi" or "hindi,tamil")"""
+    names = parse_languages(languages)
+    if not names:
+        return queryset
+    # Resolve ids first: with literal language ids the planner can use the
+    # per-language row counts and pick between this and the name index
+    language_ids = list(Language.objects.filter(name__in=names).values_list('id', flat=True))
+    through = Doctor.spoken_languages.through
+    return queryset.filter(
+        id__in=through.objects.filter(language_id__in=language_ids).values('doctor_id')
+    )
+
+
+def sync_doctor_languages(doctor):
+    """Mirror the free-text Doctor.languages into the indexed spoken_languages relation"""
+    names = parse_languages(doctor.languages)
+    existing = dict(Language.objects.filter(name__in=names).values_list('name', 'id'))
+    missing = names - existing.keys()
+    if missing:
+        Language.objects.bulk_create([Language(name=name) for name in missing], ignore_conflicts=True)
+        existing = dict(Language.objects.filter(name__in=names).values_list('name', 'id'))
+    doctor.spoken_languages.set(existing.values())
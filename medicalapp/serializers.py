@@ -1,16 +1,74 @@
 # medicalapp/serializers.py
 from rest_framework import serializers
-from .models import Medication, MedicationLog, Conversation, Message, MedicalImage
+from .models import Medication, MedicationLog, DoseSchedule, DoseTime, Conversation, Message, MedicalImage
 from .models import (
     MedicalSpecialty, Doctor, DoctorAvailability,
-    AppointmentCategory, AppointmentSubcategory, LocationOption, Appointment,HealthMetrics
+    AppointmentCategory, AppointmentSubcategory, LocationOption, Appointment,HealthMetrics, HealthAlert
 )
 
 
+class DoseTimesField(serializers.ListField):
+    """A schedule's times of day as ["08:00", "20:00"]"""
+    child = serializers.TimeField()
+
+    def to_representation(self, data):
+        return [dose_time.time_of_day.strftime('%H:%M') for dose_time in data.all()]
+
+
+class DoseScheduleSerializer(serializers.ModelSerializer):
+    times = DoseTimesField(allow_empty=False)
+
+    class Meta:
+        model = DoseSchedule
+        fields = ['id', 'medication', 'interval_days', 'start_date', 'end_date', 'is_active', 'times']
+
+    def validate_interval_days(self, value):
+        if value < 1:
+            raise serializers.ValidationError("interval_days must be at least 1")
+        return value
+
+    def validate_medication(self, medication):
+        request = self.context.get('request')
+        if request and request.user.is_authenticated and medication.user_id != request.user.id:
+            raise serializers.ValidationError("Medication not found")
+        return medication
+
+    def validate(self, attrs):
+        start = attrs.get('start_date', getattr(self.instance, 'start_date', None))
+        end = attrs.get('end_date', getattr(self.instance, 'end_date', None))
+        if start and end and end < start:
+            raise serializers.ValidationError("end_date can't be before start_date")
+        return attrs
+
+    def _set_times(self, schedule, times):
+        schedule.times.all().delete()
+        DoseTime.objects.bulk_create([
+            DoseTime(schedule=schedule, time_of_day=time_of_day) for time_of_day in sorted(set(times))
+        ])
+
+    def create(self, validated_data):
+        times = validated_data.pop('times')
+        schedule = super().create(validated_data)
+        self._set_times(schedule, times)
+        return schedule
+
+    def update(self, instance, validated_data):
+        times = validated_data.pop('times', None)
+        schedule = super().update(instance, validated_data)
+        if times is not None:
+            self._set_times(schedule, times)
+        return schedule
+
+
 class MedicationSerializer(serializers.ModelSerializer):
+    schedules = DoseScheduleSerializer(many=True, read_only=True)
+
     class Meta:
         model = Medication
-        fields = ['id', 'name', 'instructions', 'next_dose', 'refill_date', 'remaining', 'status', 'created_at', 'updated_at']
+        fields = [
+            'id', 'name', 'instructions', 'next_dose', 'refill_date', 'remaining', 'remaining_quantity',
+            'remaining_unit', 'dose_amount', 'status', 'schedules', 'created_at', 'updated_at'
+        ]
         read_only_fields = ['created_at', 'updated_at']
 
 class MedicationLogSerializer(serializers.ModelSerializer):
@@ -18,6 +76,13 @@ class MedicationLogSerializer(serializers.ModelSerializer):
         model = MedicationLog
         fields = ['id', 'medication', 'taken_at', 'status', 'notes']
 
+class DoseLogEntrySerializer(serializers.Serializer):
+    """One entry of a batch dose log"""
+    medication_id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=['taken', 'missed'])
+    taken_at = serializers.DateTimeField(required=False)
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+
 # Adding serializers for existing models for completeness
 class MessageSerializer(serializers.ModelSerializer):
     class Meta:
@@ -88,10 +153,16 @@ class AppointmentSerializer(serializers.ModelSerializer):
             'id', 'user', 'doctor', 'doctor_name', 'appointment_date', 'appointment_time',
             'category', 'category_name', 'subcategory', 'subcategory_name',
             'location', 'location_name', 'patient_name', 'patient_phone',
-            'patient_email', 'status', 'notes', 'created_at'
+            'patient_email', 'status', 'notes', 'created_at', 'updated_at'
         ]
 
 
+class HealthAlertSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = HealthAlert
+        exclude = ('user',)
+
+
 class HealthMetricsSerializer(serializers.ModelSerializer):
     class Meta:
         model = HealthMetrics
@@ -0,0 +1,82 @@
+# medicalapp/series.py
+"""
+Downsampled HealthMetrics series for charts.
+
+A chart a few hundred pixels wide can't show more than a few hundred
+points, but a wearable logs a heart rate every minute. metric_series()
+reads only (epoch, value) for one metric over a time range, a range scan
+of the (user, timestamp) unique index, and reduces it with
+Largest-Triangle-Three-Buckets: the first and last points are kept, and
+from each bucket in between the point forming the largest triangle with
+the point kept before it and the average of the next bucket. Unlike
+averaging, that keeps spikes and dips, which are what a chart of vitals
+is read for.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.db.models import FloatField, Func
+
+from .health_rollups import METRICS
+from .models import HealthMetrics
+
+SERIES_METRICS = METRICS + ['bmi', 'health_score']
+DEFAULT_POINTS = 300
+MAX_POINTS = 1000
+MAX_SERIES_DAYS = 366
+
+
+class Epoch(Func):
+    """Postgres EXTRACT(EPOCH FROM timestamptz): seconds since 1970 UTC, with the fraction"""
+    template = 'EXTRACT(EPOCH FROM %(expressions)s)::double precision'
+    output_field = FloatField()
+
+    @property
+    def convert_value(self):
+        # The cast already yields floats; skip Django's per-row float() converter
+        return self._convert_value_noop
+
+
+def lttb(x, y, threshold):
+    """Indices of the `threshold` points of (x, y) that LTTB keeps; every index if there are no more than that"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # threshold - 2 buckets over the points between the first and the last;
+    # the last bucket's "next bucket" is the final point on its own
+    edges = np.append(np.linspace(1, n - 1, threshold - 1).astype(np.int64), n)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_x = x[end:edges[i + 2]].mean()
+        next_y = y[end:edges[i + 2]].mean()
+        areas = np.abs(
+            (x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a])
+        )
+        a = start + int(areas.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def metric_series(user, metric, start, end, points=DEFAULT_POINTS):
+    """
+    {'count': readings in range, 'points': [[ISO timestamp, value], ...]}
+    for `metric` between `start` and `end`, at most `points` points.
+    """
+    rows = HealthMetrics.objects.filter(
+        user=user, timestamp__gte=start, timestamp__lte=end, **{f'{metric}__isnull': False}
+    ).order_by('timestamp').annotate(epoch=Epoch('timestamp')).values_list('epoch', metric)
+
+    data = np.array(list(rows), dtype=np.float64).reshape(-1, 2)
+    x, y = data[:, 0], data[:, 1]
+    keep = lttb(x, y, points)
+    return {
+        'count': len(x),
+        'points': [
+            [datetime.fromtimestamp(x[i], tz=dt_timezone.utc).isoformat(), y[i].item()]
+            for i in keep
+        ],
+    }
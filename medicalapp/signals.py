@@ -0,0 +1,99 @@
+# medicalapp/signals.py
+from django.db import transaction
+from django.db.models.signals import pre_save, post_init, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .adherence import record_doses
+from .caching import invalidate_medication_stats
+from .dosing import create_default_schedule
+from .refills import consume_doses, sync_remaining
+from .models import (
+    Medication, MedicationLog, DoseSchedule, MedicalSpecialty, Doctor, DoctorAvailability, AppointmentCategory,
+    AppointmentSubcategory, LocationOption, Appointment
+)
+from .search import sync_doctor_languages
+from .slots import record_slot_changes
+from .taxonomy import invalidate_taxonomy
+
+
+@receiver(pre_save, sender=Medication)
+def medication_remaining_parsed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        sync_remaining(instance)
+
+
+@receiver([post_save, post_delete], sender=Medication)
+def medication_changed(sender, instance, **kwargs):
+    """Drop cached stats whenever a medication is created, updated or deleted"""
+    invalidate_medication_stats(instance.user_id)
+
+
+@receiver(post_save, sender=Medication)
+def medication_created(sender, instance, created, raw=False, **kwargs):
+    # Medications start with a daily schedule at next_dose; clients can edit it
+    if created and not raw:
+        create_default_schedule(instance)
+
+
+@receiver(post_save, sender=MedicationLog)
+def dose_logged(sender, instance, created, raw=False, **kwargs):
+    # Keep the adherence rollups and remaining supply current; bulk writers
+    # do both themselves
+    if created and not raw:
+        record_doses([instance])
+        if instance.status == 'taken':
+            consume_doses({instance.medication_id: 1})
+            invalidate_medication_stats(instance.medication.user_id)
+
+
+TAXONOMY_MODELS = [MedicalSpecialty, Doctor, AppointmentCategory, AppointmentSubcategory, LocationOption]
+TAXONOMY_THROUGH_MODELS = [AppointmentCategory.specialties.through, AppointmentSubcategory.specialties.through]
+
+
+def taxonomy_changed(sender, **kwargs):
+    # Wait for commit so no process rebuilds its snapshot from uncommitted data
+    transaction.on_commit(invalidate_taxonomy)
+
+
+for model in TAXONOMY_MODELS:
+    post_save.connect(taxonomy_changed, sender=model, dispatch_uid=f'taxonomy_save_{model.__name__}')
+    post_delete.connect(taxonomy_changed, sender=model, dispatch_uid=f'taxonomy_delete_{model.__name__}')
+
+for through in TAXONOMY_THROUGH_MODELS:
+    m2m_changed.connect(taxonomy_changed, sender=through, dispatch_uid=f'taxonomy_m2m_{through.__name__}')
+
+
+def slot_day(instance):
+    """(doctor_id, date) a slot or booking occupies; read from __dict__ so deferred fields aren't loaded"""
+    date_field = 'appointment_date' if isinstance(instance, Appointment) else 'date'
+    return instance.__dict__.get('doctor_id'), instance.__dict__.get(date_field)
+
+
+@receiver(post_init, sender=DoctorAvailability)
+@receiver(post_init, sender=Appointment)
+def slot_loaded(sender, instance, **kwargs):
+    # Remembered so a write that moves a slot or booking refreshes the day it left too
+    instance._loaded_slot_day = slot_day(instance)
+
+
+@receiver([post_save, post_delete], sender=DoctorAvailability)
+@receiver([post_save, post_delete], sender=Appointment)
+def slots_changed(sender, instance, **kwargs):
+    days = {slot_day(instance), getattr(instance, '_loaded_slot_day', (None, None))}
+    days = {day for day in days if None not in day}
+    instance._loaded_slot_day = slot_day(instance)
+    # After commit, so no process re-reads the day before the write is visible
+    transaction.on_commit(lambda: record_slot_changes(days))
+
+
+@receiver(post_save, sender=Doctor)
+def doctor_languages_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'languages' in update_fields:
+        sync_doctor_languages(instance)
+
+
+@receiver([post_save, post_delete], sender=DoseSchedule)
+def schedule_changed(sender, instance, **kwargs):
+    # Schedules are nested in the medication list, so its ETag/delta must see the change
+    Medication.objects.filter(id=instance.medication_id).update(updated_at=timezone.now())
@@ -0,0 +1,246 @@
+# medicalapp/slots.py
+"""
+In-process index of free appointment slots.
+
+For every doctor and day in the horizon the index holds a 1440-bit integer
+with bit N set when a free DoctorAvailability slot starts N minutes after
+midnight. Booked (non-cancelled) appointments clear the slot they fall in.
+Finding the earliest slots across many doctors is then a walk over a few
+integers per day instead of a query per doctor and date.
+
+Single bookings, cancellations and availability edits are logged as
+SlotChange rows (doctor, day) by the signals; each process re-reads only
+those doctor-days on its next request. The whole index is rebuilt (two
+queries) only when the shared version counter changes, which bulk writers
+such as sync_availability bump, or when the day rolls over.
+"""
+import heapq
+import threading
+from datetime import time, timedelta
+
+from django.db.models import Max, Q
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from .caching import current_version, bump_version
+from .models import Appointment, DoctorAvailability, SlotChange
+
+VERSION_KEY = 'slot_index_version'
+HORIZON_DAYS = 60
+# A change logged this long ago can no longer be overtaken by one with a
+# lower id that hadn't committed yet, so the index stops re-checking it
+SETTLE_SECONDS = 5
+SLOT_CHANGE_RETENTION = timedelta(days=2)
+
+
+def minute_of(value):
+    return value.hour * 60 + value.minute
+
+
+def time_of(minute):
+    return time(minute // 60, minute % 60)
+
+
+def iter_bits(bitmap):
+    """Yield the set bit positions of `bitmap` in ascending order"""
+    while bitmap:
+        lowest = bitmap & -bitmap
+        yield lowest.bit_length() - 1
+        bitmap ^= lowest
+
+
+def parse_languages(languages):
+    """Normalize Doctor.languages ("English, Hindi") to {'english', 'hindi'}"""
+    return {part.strip().lower() for part in (languages or "").split(',') if part.strip()}
+
+
+class SlotIndex:
+    def __init__(self, version, start_date, horizon_days=HORIZON_DAYS):
+        self.version = version
+        self.start_date = start_date
+        self.end_date = start_date + timedelta(days=horizon_days)
+        # doctor_id -> {date: bitmap of free slot start minutes}
+        self.free = {}
+        # (doctor_id, date) -> {start_minute: end_minute}
+        self.slot_end = {}
+        # Changes up to change_id are in the rows read below; later ones are
+        # applied by apply_changes(), which remembers them in `applied` until they settle
+        self.change_id = SlotChange.objects.aggregate(last=Max('id'))['last'] or 0
+        self.applied = set()
+
+        self._load(
+            DoctorAvailability.objects.filter(
+                date__gte=self.start_date, date__lt=self.end_date, is_available=True
+            ).values_list('doctor_id', 'date', 'start_time', 'end_time').iterator(chunk_size=5000),
+            Appointment.objects.filter(
+                appointment_date__gte=self.start_date, appointment_date__lt=self.end_date
+            ).exclude(status='cancelled').values_list(
+                'doctor_id', 'appointment_date', 'appointment_time'
+            ).iterator(chunk_size=5000),
+        )
+
+    def _load(self, slots, bookings):
+        for doctor_id, day, start, end in slots:
+            start_minute = minute_of(start)
+            days = self.free.setdefault(doctor_id, {})
+            days[day] = days.get(day, 0) | (1 << start_minute)
+            self.slot_end.setdefault((doctor_id, day), {})[start_minute] = minute_of(end)
+        for doctor_id, day, booked_time in bookings:
+            self._mark_booked(doctor_id, day, minute_of(booked_time))
+
+    def _mark_booked(self, doctor_id, day, minute):
+        bitmap = self.free.get(doctor_id, {}).get(day)
+        if not bitmap:
+            return
+        ends = self.slot_end[(doctor_id, day)]
+        for start_minute in iter_bits(bitmap):
+            if start_minute > minute:
+                break
+            if start_minute == minute or minute < ends[start_minute]:
+                self.free[doctor_id][day] = bitmap & ~(1 << start_minute)
+                return
+
+    def reload_days(self, days):
+        """Re-read the free slots of `days`, a set of (doctor_id, date)"""
+        days = {(doctor_id, day) for doctor_id, day in days if self.start_date <= day < self.end_date}
+        if not days:
+            return
+        doctor_ids = {doctor_id for doctor_id, _day in days}
+        dates = {day for _doctor_id, day in days}
+        slots = [
+            row for row in DoctorAvailability.objects.filter(
+                doctor_id__in=doctor_ids, date__in=dates, is_available=True
+            ).values_list('doctor_id', 'date', 'start_time', 'end_time')
+            if (row[0], row[1]) in days
+        ]
+        bookings = [
+            row for row in Appointment.objects.filter(
+                doctor_id__in=doctor_ids, appointment_date__in=dates
+            ).exclude(status='cancelled').values_list('doctor_id', 'appointment_date', 'appointment_time')
+            if (row[0], row[1]) in days
+        ]
+        for doctor_id, day in days:
+            self.free.get(doctor_id, {}).pop(day, None)
+            self.slot_end.pop((doctor_id, day), None)
+        self._load(slots, bookings)
+
+    def apply_changes(self):
+        """Fold in the doctor-days logged in SlotChange since this index last looked"""
+        changes = list(SlotChange.objects.filter(id__gt=self.change_id).annotate(
+            settled=Q(created_at__lte=Now() - timedelta(seconds=SETTLE_SECONDS))
+        ).values_list('id', 'doctor_id', 'date', 'settled'))
+        self.reload_days({(doctor_id, day) for id, doctor_id, day, _settled in changes if id not in self.applied})
+        self.applied.update(id for id, _doctor_id, _day, _settled in changes)
+        settled = [id for id, _doctor_id, _day, is_settled in changes if is_settled]
+        if settled:
+            self.change_id = max(settled)
+            self.applied = {id for id in self.applied if id > self.change_id}
+
+    def day_bitmap(self, doctor_id, day):
+        return self.free.get(doctor_id, {}).get(day, 0)
+
+    @staticmethod
+    def floor_mask(day, now):
+        """Mask of the minutes still bookable on `day`: today only offers slots that haven't started"""
+        return ~((1 << (minute_of(now) + 1)) - 1) if day == now.date() else -1
+
+    def available_dates(self, doctor_id, days, now=None):
+        """Dates within the next `days` days on which the doctor has a free slot"""
+        now = now or timezone.localtime()
+        day = max(now.date(), self.start_date)
+        last_day = min(self.end_date, now.date() + timedelta(days=days))
+        dates = []
+        while day < last_day:
+            if self.day_bitmap(doctor_id, day) & self.floor_mask(day, now):
+                dates.append(day)
+            day += timedelta(days=1)
+        return dates
+
+    def earliest(self, doctor_ids, count, now=None, days=None):
+        """
+        The `count` earliest free slots across `doctor_ids`, as dicts with
+        doctor_id, date, start_time and end_time, ordered by time then doctor.
+        """
+        now = now or timezone.localtime()
+        last_day = self.end_date if days is None else min(self.end_date, now.date() + timedelta(days=days))
+        results = []
+        day = max(now.date(), self.start_date)
+        while day < last_day and len(results) < count:
+            floor_mask = self.floor_mask(day, now)
+            candidates = []
+            for doctor_id in doctor_ids:
+                bitmap = self.day_bitmap(doctor_id, day) & floor_mask
+                for n, minute in enumerate(iter_bits(bitmap)):
+                    if n >= count - len(results):
+                        break
+                    candidates.append((minute, doctor_id))
+            for minute, doctor_id in heapq.nsmallest(count - len(results), candidates):
+                results.append({
+                    'doctor_id': doctor_id,
+                    'date': day,
+                    'start_time': time_of(minute),
+                    'end_time': time_of(self.slot_end[(doctor_id, day)][minute]),
+                })
+            day += timedelta(days=1)
+        return results
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_slot_index():
+    """Return the current index with recent changes applied, rebuilding it after bulk writes or at day rollover"""
+    global _index
+    version = current_version(VERSION_KEY)
+    today = timezone.localdate()
+    with _lock:
+        if _index is None or _index.version != version or _index.start_date != today:
+            _index = SlotIndex(version, today)
+        else:
+            _index.apply_changes()
+        return _index
+
+
+def slot_state():
+    """Changes whenever any free slot does: the bulk version plus the newest logged change"""
+    last_change = SlotChange.objects.aggregate(last=Max('id'))['last'] or 0
+    return f"{current_version(VERSION_KEY)}.{last_change}"
+
+
+def record_slot_changes(days):
+    """Log single-row writes to `days`, a set of (doctor_id, date), for every process's index"""
+    SlotChange.objects.bulk_create([SlotChange(doctor_id=doctor_id, date=day) for doctor_id, day in days])
+
+
+def prune_slot_changes():
+    """Drop logged changes older than any index that could still need them (indexes rebuild daily)"""
+    return SlotChange.objects.filter(
+        created_at__lt=Now() - SLOT_CHANGE_RETENTION
+    ).exclude(id=SlotChange.objects.aggregate(last=Max('id'))['last']).delete()[0]
+
+
+def invalidate_slot_index():
+    """For bulk writes: every process rebuilds its whole index on next use"""
+    global _index
+    bump_version(VERSION_KEY)
+    _index = None
+
+
+def earliest_slots(taxonomy, subcategory, count=5, language=None, days=None):
+    """
+    Earliest free slots for a subcategory across every matching active
+    doctor, optionally limited to doctors who speak `language`.
+    """
+    doctors = taxonomy.doctors_for_subcategory(subcategory)
+    if language:
+        wanted = language.strip().lower()
+        doctors = [d for d in doctors if wanted in parse_languages(d['languages'])]
+    by_id = {d['id']: d for d in doctors}
+
+    slots = get_slot_index().earliest(list(by_id), count, days=days)
+    for slot in slots:
+        doctor = by_id[slot['doctor_id']]
+        slot['doctor_name'] = doctor['name']
+        slot['specialty'] = doctor['specialty']
+    return slots
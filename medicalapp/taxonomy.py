@@ -0,0 +1,140 @@
+# medicalapp/taxonomy.py
+"""
+In-process snapshot of the appointment taxonomy used by the appointment chatbot:
+categories, subcategories, locations, specialties and the
+subcategory -> specialty -> active doctor mapping.
+
+The snapshot is rebuilt lazily whenever the shared version counter (a
+CacheVersion row, read with caching.current_version) changes. Admin edits
+bump that counter through signals (see signals.py), so every process picks
+up changes on its next request, while most chatbot steps only read the
+counter instead of the taxonomy tables.
+"""
+import threading
+
+from .caching import current_version, bump_version
+from .models import (
+    MedicalSpecialty, Doctor, AppointmentCategory,
+    AppointmentSubcategory, LocationOption
+)
+
+VERSION_KEY = 'appointment_taxonomy_version'
+
+
+class TaxonomySnapshot:
+    def __init__(self, version):
+        self.version = version
+
+        self.specialties = dict(MedicalSpecialty.objects.order_by('id').values_list('id', 'name'))
+
+        self.categories = {}
+        for category_id, name in AppointmentCategory.objects.order_by('id').values_list('id', 'name'):
+            self.categories[category_id] = {'id': category_id, 'name': name, 'subcategory_ids': []}
+
+        self.subcategories = {}
+        for sub_id, name, category_id in AppointmentSubcategory.objects.order_by('id').values_list(
+            'id', 'name', 'category_id'
+        ):
+            self.subcategories[sub_id] = {
+                'id': sub_id, 'name': name, 'category_id': category_id,
+                'location_ids': [], 'specialty_ids': [],
+            }
+            self.categories[category_id]['subcategory_ids'].append(sub_id)
+
+        through = AppointmentSubcategory.specialties.through.objects
+        for sub_id, specialty_id in through.order_by('medicalspecialty_id').values_list(
+            'appointmentsubcategory_id', 'medicalspecialty_id'
+        ):
+            self.subcategories[sub_id]['specialty_ids'].append(specialty_id)
+
+        self.locations = {}
+        for location_id, name, sub_id in LocationOption.objects.order_by('id').values_list(
+            'id', 'name', 'subcategory_id'
+        ):
+            self.locations[location_id] = {'id': location_id, 'name': name, 'subcategory_id': sub_id}
+            self.subcategories[sub_id]['location_ids'].append(location_id)
+
+        self.doctors = {}
+        self.active_doctors_by_specialty = {}
+        for doctor_id, name, specialty_id, languages, is_active in Doctor.objects.order_by('id').values_list(
+            'id', 'name', 'specialty_id', 'languages', 'is_active'
+        ):
+            self.doctors[doctor_id] = {
+                'id': doctor_id, 'name': name, 'specialty_id': specialty_id,
+                'specialty': self.specialties.get(specialty_id, ""),
+                'languages': languages, 'is_active': is_active,
+            }
+            if is_active:
+                self.active_doctors_by_specialty.setdefault(specialty_id, []).append(doctor_id)
+
+    @staticmethod
+    def _lookup(table, key):
+        """Look up by id as sent by the client (int or numeric string); None if unknown"""
+        try:
+            return table.get(int(key))
+        except (TypeError, ValueError):
+            return None
+
+    def category(self, category_id):
+        return self._lookup(self.categories, category_id)
+
+    def subcategory(self, subcategory_id):
+        return self._lookup(self.subcategories, subcategory_id)
+
+    def location(self, location_id):
+        return self._lookup(self.locations, location_id)
+
+    def doctor(self, doctor_id):
+        return self._lookup(self.doctors, doctor_id)
+
+    def category_options(self):
+        return [{'id': c['id'], 'name': c['name']} for c in self.categories.values()]
+
+    def subcategory_options(self, category):
+        return [
+            {'id': sub_id, 'name': self.subcategories[sub_id]['name']}
+            for sub_id in category['subcategory_ids']
+        ]
+
+    def location_options(self, subcategory):
+        return [
+            {'id': location_id, 'name': self.locations[location_id]['name']}
+            for location_id in subcategory['location_ids']
+        ]
+
+    def primary_specialty_name(self, subcategory):
+        """Name of the subcategory's first specialty (lowest id), or "" if it has none"""
+        if not subcategory['specialty_ids']:
+            return ""
+        return self.specialties[subcategory['specialty_ids'][0]]
+
+    def doctors_for_subcategory(self, subcategory):
+        """Active doctors whose specialty matches the subcategory, ordered by id"""
+        doctor_ids = set()
+        for specialty_id in subcategory['specialty_ids']:
+            doctor_ids.update(self.active_doctors_by_specialty.get(specialty_id, ()))
+        return [self.doctors[doctor_id] for doctor_id in sorted(doctor_ids)]
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def get_taxonomy():
+    """Return the current snapshot, rebuilding it if the taxonomy changed since it was built"""
+    global _snapshot
+    version = current_version(VERSION_KEY)
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    with _lock:
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = TaxonomySnapshot(version)
+        return _snapshot
+
+
+def invalidate_taxonomy():
+    """Bump the shared version so every process rebuilds its snapshot on next use"""
+    global _snapshot
+    bump_version(VERSION_KEY)
+    _snapshot = None
@@ -1,3 +1,1380 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import random
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from backend.db_routing import ReplicaRouter, ReplicaRoutingMiddleware, STICKY_COOKIE, replica_reads
+
+from .archive import archive_inactive_conversations, restore_conversation
+from .adherence import adherence_report, rebuild_adherence
+from .booking import book_appointment
+from .anomalies import observe_readings, rebuild_baselines
+from .dosing import doses_due, todays_doses
+from .exports import parquet_available, stream_export
+from .health_rollups import add_readings, rebuild_health_rollups
+from .health_scores import SCORE_FIELDS, compute_bmi, health_scores, rescore_health_metrics, to_columns
+from .refills import forecast_refills, parse_remaining
+from .series import lttb
+from .recommendations import refresh_recommendations
+from .search import search_doctors
+from .reminders import dispatch_due, schedule_reminders
+from .schedules import sync_availability, template_slots
+from .slots import get_slot_index
+from .taxonomy import VERSION_KEY as TAXONOMY_VERSION_KEY, get_taxonomy
+from .models import (
+    Conversation, Message, MessageArchive, Medication, MedicationLog,
+    MedicalSpecialty, Doctor, DoctorAvailability, AppointmentCategory, AppointmentSubcategory, LocationOption, Appointment,
+    HealthMetrics, AvailabilityTemplate, AvailabilityException, AppointmentReminder,
+    DoctorRecommendation, DoseSchedule, DoseTime, AdherenceDay, HealthMetricRollup,
+    HealthAlert, HealthBaseline, CacheVersion, ChatSession
+)
+from .urls import router
+
+
+def seed_catalog(user, count):
+    """Create `count` rows of every model the API serves, each with its relations"""
+    today = timezone.now().date()
+    for i in range(count):
+        specialty = MedicalSpecialty.objects.create(name=f"Specialty {i}")
+        doctor = Doctor.objects.create(name=f"Doctor {i}", specialty=specialty, languages="English")
+        DoctorAvailability.objects.create(
+            doctor=doctor, date=today + timedelta(days=1),
+            start_time=time(9, 0), end_time=time(9, 30)
+        )
+        category = AppointmentCategory.objects.create(name=f"Category {i}")
+        category.specialties.add(specialty)
+        subcategory = AppointmentSubcategory.objects.create(category=category, name=f"Subcategory {i}")
+        subcategory.specialties.add(specialty)
+        location = LocationOption.objects.create(subcategory=subcategory, name=f"Location {i}")
+        LocationOption.objects.create(subcategory=subcategory, name=f"Location {i}b")
+        Appointment.objects.create(
+            user=user, doctor=doctor, appointment_date=today + timedelta(days=1),
+            appointment_time=time(9, 0), category=category, subcategory=subcategory,
+            location=location, patient_name="Patient", patient_phone="555",
+            patient_email="patient@example.com"
+        )
+        medication = Medication.objects.create(
+            user=user, name=f"Medication {i}", instructions="Once daily",
+            next_dose=time(8, 0), refill_date=today, remaining="10 tablets"
+        )
+        MedicationLog.objects.create(medication=medication, status='taken')
+        HealthMetrics.objects.create(user=user, heart_rate=70)
+
+
+def data_queries(context):
+    """Captured queries other than version lookups (current_version, the slot change log) and chat sessions"""
+    return [
+        q for q in context.captured_queries
+        if not any(table in q['sql'] for table in
+                   ('medicalapp_cacheversion', 'medicalapp_slotchange', 'medicalapp_chatsession'))
+    ]
+
+
+def add_free_slots(hour):
+    """Give every doctor a free slot tomorrow at `hour`; seed_catalog's own slot is already booked"""
+    day = timezone.now().date() + timedelta(days=1)
+    for doctor in Doctor.objects.all():
+        DoctorAvailability.objects.create(doctor=doctor, date=day, start_time=time(hour, 0), end_time=time(hour, 30))
+
+
+class QueryBudgetTestMixin:
+    """
+    Fails any endpoint whose query count depends on how many rows it returns.
+
+    Each URL is requested once against a small catalog and again after the
+    catalog has grown; the two query counts must be identical.
+    """
+    small_size = 1
+    large_size = 5
+
+    def get_budget_urls(self):
+        """Every list route on the router plus any extra URLs the test adds"""
+        urls = [
+            reverse(f'medicalapp:{basename}-list')
+            for _prefix, _viewset, basename in router.registry
+        ]
+        return urls + list(self.get_extra_budget_urls())
+
+    def get_extra_budget_urls(self):
+        return []
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(context.captured_queries)
+
+    def assertQueryCountsConstant(self, grow):
+        urls = self.get_budget_urls()
+        # Warm in-process tables first; only per-request queries are compared
+        for url in urls:
+            self.client.get(url)
+        before = {url: self.count_queries(url) for url in urls}
+        grow()
+        after = {url: self.count_queries(url) for url in urls}
+        for url in urls:
+            self.assertEqual(
+                before[url], after[url],
+                f"{url} ran {before[url]} queries for a small result and {after[url]} for a larger one"
+            )
+
+
+class ApiQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="budget", password="secret")
+        seed_catalog(self.user, self.small_size)
+
+    def get_extra_budget_urls(self):
+        doctor = Doctor.objects.first()
+        category = AppointmentCategory.objects.first()
+        subcategory = AppointmentSubcategory.objects.first()
+        return [
+            reverse('medicalapp:doctor-availability', args=[doctor.pk]),
+            reverse('medicalapp:appointmentcategory-subcategories', args=[category.pk]),
+            reverse('medicalapp:appointmentsubcategory-doctors', args=[subcategory.pk]),
+            reverse('medicalapp:appointment-user-appointments'),
+            reverse('medicalapp:medication-today'),
+            reverse('medicalapp:medication-adherence'),
+        ]
+
+    def test_list_endpoints_have_constant_query_count(self):
+        self.assertQueryCountsConstant(
+            lambda: seed_catalog(self.user, self.large_size - self.small_size)
+        )
+
+
+class ConditionalRequestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="etag", password="secret")
+        self.client.force_authenticate(self.user)
+        seed_catalog(self.user, 2)
+
+    def test_unchanged_lists_answer_not_modified(self):
+        for name in ['medicalspecialty', 'doctor', 'appointmentcategory', 'medication']:
+            url = reverse(f'medicalapp:{name}-list')
+            etag = self.client.get(url)['ETag']
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(response.content, b'')
+
+    def test_writes_change_the_etag(self):
+        url = reverse('medicalapp:doctor-list')
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Doctor.objects.filter(name="Doctor 0").first().save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        url = reverse('medicalapp:medication-list')
+        etag = self.client.get(url)['ETag']
+        Medication.objects.filter(name="Medication 1").delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_since_returns_only_changes(self):
+        url = reverse('medicalapp:medication-list')
+        server_time = self.client.get(url, {'since': '2000-01-01T00:00:00Z'}).json()['server_time']
+        medication = Medication.objects.get(name="Medication 0")
+        medication.status = 'taken'
+        medication.save()
+        Medication.objects.filter(name="Medication 1").delete()
+
+        delta = self.client.get(url, {'since': server_time}).json()
+        self.assertEqual([m['id'] for m in delta['results']], [medication.id])
+        self.assertEqual(delta['ids'], [medication.id])
+
+        appointment = Appointment.objects.first()
+        url = reverse('medicalapp:appointment-list')
+        server_time = self.client.get(url, {'since': server_time}).json()['server_time']
+        self.client.post(reverse('medicalapp:appointment-cancel', args=[appointment.id]))
+        delta = self.client.get(url, {'since': server_time}).json()
+        self.assertEqual([(a['id'], a['status']) for a in delta['results']], [(appointment.id, 'cancelled')])
+
+
+class MedicationStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="stats", password="secret")
+        self.client.force_authenticate(self.user)
+        seed_catalog(self.user, 3)
+        self.url = reverse('medicalapp:medication-stats')
+
+    def test_stats_use_one_query_then_cache(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(len(data_queries(context)), 1)
+        self.assertEqual(response.data['total'], 3)
+        self.assertEqual(response.data['upcoming'], 3)
+        self.assertEqual(response.data['refill_soon'], 3)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(self.url)
+        self.assertEqual(len(data_queries(context)), 0)
+
+    def test_mark_as_taken_invalidates_stats(self):
+        self.client.get(self.url)
+        medication = Medication.objects.first()
+        self.client.post(reverse('medicalapp:medication-mark-as-taken', args=[medication.pk]))
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['taken'], 1)
+        self.assertEqual(response.data['upcoming'], 2)
+
+    def test_writes_from_other_workers_invalidate_stats(self):
+        self.client.get(self.url)
+        # Another process changes a medication and bumps the shared version; this
+        # process's cache still holds the old entry under the old key
+        Medication.objects.filter(id=Medication.objects.first().id).update(status='taken')
+        CacheVersion.objects.filter(key=f"medication_stats_version:{self.user.id}").update(version=F('version') + 1)
+        self.assertEqual(self.client.get(self.url).data['taken'], 1)
+
+
+class DoseScheduleTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="doses", password="secret")
+        self.client.force_authenticate(self.user)
+        self.medication = Medication.objects.create(
+            user=self.user, name="Metformin", instructions="With food",
+            next_dose=time(8, 0), refill_date=timezone.localdate(), remaining="30 tablets"
+        )
+        self.medication.schedules.all().delete()
+
+    def schedule(self, medication, times, **fields):
+        schedule = DoseSchedule.objects.create(medication=medication, **fields)
+        DoseTime.objects.bulk_create(DoseTime(schedule=schedule, time_of_day=t) for t in times)
+        return schedule
+
+    def test_new_medications_get_a_daily_schedule(self):
+        medication = Medication.objects.create(
+            user=self.user, name="Aspirin", instructions="-", next_dose=time(21, 0),
+            refill_date=timezone.localdate(), remaining="10 tablets"
+        )
+        schedule = medication.schedules.get()
+        self.assertEqual((schedule.interval_days, [t.time_of_day for t in schedule.times.all()]),
+                         (1, [time(21, 0)]))
+
+    def test_api_creates_schedules_with_times(self):
+        response = self.client.post(reverse('medicalapp:dose-schedule-list'), {
+            'medication': self.medication.id, 'interval_days': 2, 'times': ['20:00', '08:00']
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['times'], ['08:00', '20:00'])
+        medication = self.client.get(reverse('medicalapp:medication-list')).json()[0]
+        self.assertEqual(medication['schedules'][0]['times'], ['08:00', '20:00'])
+
+    def test_interval_must_be_at_least_one_day(self):
+        response = self.client.post(reverse('medicalapp:dose-schedule-list'), {
+            'medication': self.medication.id, 'interval_days': 0, 'times': ['08:00']
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DoseSchedule.objects.create(medication=self.medication, interval_days=0)
+
+    def test_due_window_crosses_midnight_and_respects_intervals(self):
+        now = timezone.make_aware(datetime.combine(timezone.localdate(), time(23, 30)))
+        other = Medication.objects.create(
+            user=User.objects.create_user(username="other"), name="Statin", instructions="-",
+            next_dose=time(23, 45), refill_date=timezone.localdate(), remaining="5 tablets"
+        )
+        self.schedule(self.medication, [time(0, 15), time(12, 0)])
+        # Every other day starting today: tomorrow's 00:15 dose is skipped
+        self.schedule(self.medication, [time(0, 20)], interval_days=2, start_date=now.date())
+
+        doses = doses_due(now=now, minutes=60)
+        self.assertEqual(
+            [(d['medication'].name, timezone.localtime(d['due_at']).strftime('%d %H:%M')) for d in doses],
+            [("Statin", now.strftime('%d 23:45')), ("Metformin", (now + timedelta(days=1)).strftime('%d 00:15'))]
+        )
+        self.assertEqual([d['medication'] for d in doses_due(now=now, minutes=60, users=[other.user])], [other])
+
+    def test_todays_doses_track_taken_and_missed(self):
+        self.schedule(self.medication, [time(8, 0), time(14, 0), time(20, 0)])
+        now = timezone.make_aware(datetime.combine(timezone.localdate(), time(16, 0)))
+        MedicationLog.objects.create(medication=self.medication, status='taken', taken_at=now.replace(hour=8, minute=5))
+        medications = list(Medication.objects.filter(id=self.medication.id).prefetch_related('schedules__times'))
+        statuses = [dose['status'] for dose in todays_doses(medications, now=now)[self.medication.id]]
+        self.assertEqual(statuses, ['taken', 'missed', 'upcoming'])
+
+        today = self.client.get(reverse('medicalapp:medication-today')).json()
+        self.assertEqual([len(m['doses']) for m in today], [3])
+
+
+class AdherenceRollupTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="adherence", password="secret")
+        self.client.force_authenticate(self.user)
+        self.today = timezone.localdate()
+        self.medication = Medication.objects.create(
+            user=self.user, name="Lisinopril", instructions="-", next_dose=time(8, 0),
+            refill_date=self.today, remaining="30 tablets"
+        )
+        self.medication.schedules.update(start_date=self.today - timedelta(days=9))
+
+    def at(self, days_ago, hour, minute=0):
+        return timezone.make_aware(datetime.combine(self.today - timedelta(days=days_ago), time(hour, minute)))
+
+    def test_logs_update_daily_rollups(self):
+        MedicationLog.objects.create(medication=self.medication, status='taken', taken_at=self.at(3, 8, 5))
+        MedicationLog.objects.create(medication=self.medication, status='taken', taken_at=self.at(2, 9, 30))
+        MedicationLog.objects.create(medication=self.medication, status='missed', taken_at=self.at(2, 23))
+        self.client.force_login(self.user)
+        response = self.client.put(reverse('medicalapp:medication_api'), {
+            'id': self.medication.id, 'status': 'missed'
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(
+            list(self.medication.adherence_days.values_list('day', 'taken', 'late', 'missed')),
+            [(self.today - timedelta(days=3), 1, 0, 0), (self.today - timedelta(days=2), 1, 1, 1),
+             (self.today, 0, 0, 1)]
+        )
+
+    def test_report_windows(self):
+        for days_ago in range(1, 9):
+            MedicationLog.objects.create(medication=self.medication, status='taken', taken_at=self.at(days_ago, 8, 10))
+        medications = list(Medication.objects.filter(user=self.user).prefetch_related('schedules__times'))
+
+        with self.assertNumQueries(1):
+            report = adherence_report(medications, now=self.at(0, 12))
+        # Doses were due on each of the last 10 days including today; 8 were taken
+        self.assertEqual(report['windows'][7], {'scheduled': 7, 'taken': 6, 'late': 0, 'missed': 1, 'adherence': 0.857})
+        self.assertEqual(report['windows'][30]['scheduled'], 10)
+        self.assertEqual(report['windows'][90]['missed'], 2)
+        self.assertEqual(report['medications'][0]['windows'][30]['taken'], 8)
+
+        response = self.client.get(reverse('medicalapp:medication-adherence'))
+        self.assertEqual(response.json()['medications'][0]['windows']['30']['taken'], 8)
+
+    def test_rebuild_matches_incremental_rollups(self):
+        MedicationLog.objects.create(medication=self.medication, status='taken', taken_at=self.at(1, 10))
+        MedicationLog.objects.create(medication=self.medication, status='missed', taken_at=self.at(1, 20))
+        before = list(AdherenceDay.objects.values_list('day', 'taken', 'late', 'missed'))
+        self.assertEqual(rebuild_adherence(Medication.objects.all()), 2)
+        self.assertEqual(list(AdherenceDay.objects.values_list('day', 'taken', 'late', 'missed')), before)
+
+
+class BatchDoseLogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="regimen", password="secret")
+        self.client.force_authenticate(self.user)
+        self.medications = [
+            Medication.objects.create(
+                user=self.user, name=name, instructions="-", next_dose=time(8, 0),
+                refill_date=timezone.localdate(), remaining="30 tablets"
+            )
+            for name in ["Metformin", "Lisinopril", "Atorvastatin"]
+        ]
+        self.url = reverse('medicalapp:medication-log-doses')
+
+    def test_logs_a_regimen_in_constant_queries(self):
+        self.client.get(reverse('medicalapp:medication-stats'))
+        doses = [{'medication_id': m.id, 'status': 'taken'} for m in self.medications]
+        doses.append({'medication_id': self.medications[2].id, 'status': 'missed',
+                      'taken_at': (timezone.now() - timedelta(hours=3)).isoformat()})
+        before = Medication.objects.get(id=self.medications[0].id).updated_at
+
+        # Ownership, statuses, logs, schedules for lateness, rollups, supply, stats version; savepoints included
+        with self.assertNumQueries(14), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {'doses': doses}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['logged'], 4)
+        self.assertEqual(MedicationLog.objects.filter(status='taken').count(), 3)
+        self.assertEqual(set(Medication.objects.values_list('status', flat=True)), {'taken'})
+        self.assertGreater(Medication.objects.get(id=self.medications[0].id).updated_at, before)
+        self.assertEqual(self.client.get(reverse('medicalapp:medication-stats')).json()['taken'], 3)
+        self.assertEqual(AdherenceDay.objects.get(medication=self.medications[2]).missed, 1)
+
+    def test_rejects_other_users_medications(self):
+        other = Medication.objects.create(
+            user=User.objects.create_user(username="someone"), name="Other", instructions="-",
+            next_dose=time(8, 0), refill_date=timezone.localdate(), remaining="1 tablet"
+        )
+        response = self.client.post(self.url, {'doses': [
+            {'medication_id': self.medications[0].id, 'status': 'taken'},
+            {'medication_id': other.id, 'status': 'taken'},
+        ]}, format='json')
+        self.assertEqual((response.status_code, response.json()['medication_ids']), (404, [other.id]))
+        self.assertFalse(MedicationLog.objects.exists())
+
+        response = self.client.post(self.url, {'doses': [{'medication_id': other.id, 'status': 'later'}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class RefillForecastTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="refills", password="secret")
+        self.client.force_authenticate(self.user)
+        self.today = timezone.localdate()
+
+    def medication(self, name, remaining, **fields):
+        return Medication.objects.create(
+            user=self.user, name=name, instructions="-", next_dose=time(8, 0),
+            refill_date=self.today, remaining=remaining, **fields
+        )
+
+    def test_remaining_is_parsed_and_consumed_by_logged_doses(self):
+        medication = self.medication("Metformin", "30 tablets", dose_amount=2)
+        self.assertEqual((medication.remaining_quantity, medication.remaining_unit), (30, "tablets"))
+        self.assertEqual(self.medication("Syrup", "2,5 ml").remaining_quantity, Decimal("2.5"))
+        self.assertEqual(parse_remaining("1,000 tablets"), (Decimal("1000"), "tablets"))
+        self.assertEqual(parse_remaining("1,250.5 ml"), (Decimal("1250.5"), "ml"))
+        self.assertEqual(self.medication("Bulk", "12345678 tablets").remaining_quantity, None)
+        self.assertEqual(parse_remaining("1" + "0" * 40 + " tablets"), (None, ''))
+
+        response = self.client.post(reverse('medicalapp:medication-mark-as-taken', args=[medication.pk]))
+        self.assertEqual(response.json()['medication']['remaining'], "28 tablets")
+        self.client.post(reverse('medicalapp:medication-log-doses'), {'doses': [
+            {'medication_id': medication.id, 'status': 'taken'},
+            {'medication_id': medication.id, 'status': 'taken'},
+            {'medication_id': medication.id, 'status': 'missed'},
+        ]}, format='json')
+        medication.refresh_from_db()
+        self.assertEqual((medication.remaining, medication.remaining_quantity), ("24 tablets", 24))
+
+    def test_forecast_from_schedules(self):
+        twice_daily = self.medication("Metformin", "30 tablets")
+        DoseTime.objects.create(schedule=twice_daily.schedules.get(), time_of_day=time(20, 0))
+        alternate_days = self.medication("Vitamin D", "10 drops", dose_amount=Decimal("0.5"))
+        alternate_days.schedules.update(interval_days=2)
+        self.medication("Ibuprofen", "as needed")
+
+        with self.assertNumQueries(2):
+            forecasts = forecast_refills(Medication.objects.filter(user=self.user), today=self.today)
+        self.assertEqual(forecasts[twice_daily.id]['doses_per_day'], 2)
+        self.assertEqual(forecasts[twice_daily.id]['run_out_date'], self.today + timedelta(days=15))
+        self.assertEqual(forecasts[alternate_days.id]['days_left'], 40)
+
+        response = self.client.get(reverse('medicalapp:medication-refills')).json()
+        self.assertEqual([(f['name'], f['days_left']) for f in response],
+                         [("Metformin", 15), ("Vitamin D", 40), ("Ibuprofen", None)])
+
+    def test_supplies_lasting_past_year_9999_stop_at_date_max(self):
+        medication = self.medication("Bulk", "9999999 tablets")
+        self.assertEqual(forecast_refills(Medication.objects.all(), today=self.today)[medication.id]['run_out_date'],
+                         date.max)
+        response = self.client.get(reverse('medicalapp:medication-refills'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['run_out_date'], date.max.isoformat())
+
+
+class HealthTrendTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="vitals", password="secret")
+        self.client.force_authenticate(self.user)
+        self.url = reverse('medicalapp:health-metrics-trends')
+
+    def heart_rate_points(self, **params):
+        return self.client.get(self.url, {'metrics': 'heart_rate', **params}).json()['metrics']['heart_rate']
+
+    def test_rollups_follow_creates_edits_and_deletes(self):
+        list_url = reverse('medicalapp:health-metrics-list')
+        first = self.client.post(list_url, {'heart_rate': 70, 'weight': 80}, format='json').json()
+        second = self.client.post(list_url, {'heart_rate': 90}, format='json').json()
+        point = self.heart_rate_points(resolution='day')[-1]
+        self.assertEqual((point['min'], point['max'], point['mean'], point['last'], point['count']), (70, 90, 80, 90, 2))
+
+        self.client.patch(reverse('medicalapp:health-metrics-detail', args=[first['id']]), {'heart_rate': 100}, format='json')
+        self.client.delete(reverse('medicalapp:health-metrics-detail', args=[second['id']]))
+        for resolution in ['day', 'week']:
+            point = self.heart_rate_points(resolution=resolution)[-1]
+            self.assertEqual((point['min'], point['max'], point['count']), (100, 100, 1))
+
+    def test_incremental_rollups_match_a_rebuild(self):
+        now = timezone.now()
+        readings = []
+        for i, (days_ago, heart_rate, steps) in enumerate(
+            [(20, 60, 4000), (9, 72, None), (9, 64, 12000), (1, 88, 8000), (0, 75, 9000)]
+        ):
+            readings.append(HealthMetrics.objects.create(
+                user=self.user, heart_rate=heart_rate, daily_steps=steps,
+                timestamp=now - timedelta(days=days_ago, minutes=i)
+            ))
+        add_readings(readings[:2])
+        add_readings(readings[2:])
+        fields = ('metric', 'resolution', 'period_start', 'count', 'total', 'minimum', 'maximum', 'last')
+        incremental = sorted(HealthMetricRollup.objects.values_list(*fields))
+
+        self.assertEqual(rebuild_health_rollups(HealthMetrics.objects.filter(user=self.user)), 5)
+        self.assertEqual(sorted(HealthMetricRollup.objects.values_list(*fields)), incremental)
+
+        response = self.client.get(self.url, {'days': 90, 'metrics': 'heart_rate,daily_steps'}).json()
+        self.assertEqual(response['resolution'], 'week')
+        self.assertEqual(sum(point['count'] for point in response['metrics']['heart_rate']), 5)
+        self.assertEqual(len(self.heart_rate_points(days=2, resolution='day')), 2)
+        self.assertEqual(self.client.get(self.url, {'metrics': 'mood'}).status_code, 400)
+
+
+class HealthScoreEngineTests(TestCase):
+    def random_readings(self, count):
+        rng = random.Random(7)
+
+        def maybe(value):
+            # Missing and zero values exercise the per-row method's truthiness checks
+            return rng.choice([None, 0, value, value, value, value])
+
+        boundaries = {
+            'systolic_bp': [120, 121, 130, 131, 140, 141], 'diastolic_bp': [80, 81, 85, 86, 90, 91],
+            'blood_glucose': [100, 101, 125, 126], 'daily_steps': [7999, 8000, 9999, 10000],
+            'heart_rate': [59, 60, 80, 81], 'oxygen_saturation': [94, 95], 'sleep_hours': [6.9, 7, 9, 9.1],
+        }
+        readings = []
+        for _ in range(count):
+            reading = HealthMetrics(
+                systolic_bp=maybe(rng.choice(boundaries['systolic_bp'] + [rng.randint(90, 180)])),
+                diastolic_bp=maybe(rng.choice(boundaries['diastolic_bp'] + [rng.randint(50, 120)])),
+                blood_glucose=maybe(rng.choice(boundaries['blood_glucose'] + [rng.randint(60, 250)])),
+                daily_steps=maybe(rng.choice(boundaries['daily_steps'] + [rng.randint(0, 25000)])),
+                heart_rate=maybe(rng.choice(boundaries['heart_rate'] + [rng.randint(40, 130)])),
+                oxygen_saturation=maybe(rng.choice(boundaries['oxygen_saturation'] + [rng.randint(85, 100)])),
+                sleep_hours=maybe(rng.choice(boundaries['sleep_hours'] + [round(rng.uniform(3, 12), 2)])),
+                weight=maybe(round(rng.uniform(35, 160), 1)),
+                height=maybe(round(rng.uniform(130, 210), 1)),
+            )
+            reading.bmi = rng.choice([None, 18.4, 18.5, 24.9, 25.0, 29.9, 30.0, round(rng.uniform(12, 45), 1)])
+            readings.append(reading)
+        return readings
+
+    def test_vectorized_scores_match_the_per_row_method(self):
+        readings = self.random_readings(20000)
+        columns = to_columns([[getattr(r, f) for f in SCORE_FIELDS] for r in readings], SCORE_FIELDS)
+        expected = [reading.calculate_health_score() for reading in readings]
+        self.assertEqual(health_scores(columns).tolist(), expected)
+
+        # Ties in the second decimal, where np.round (half to even) and round() disagree
+        for weight, height in [(84.2, 200), (41.4, 200), (43.8, 200)]:
+            readings.append(HealthMetrics(weight=weight, height=height))
+        columns = to_columns([[getattr(r, f) for f in SCORE_FIELDS] for r in readings], SCORE_FIELDS)
+        bmi = compute_bmi(columns['weight'], columns['height'])
+        self.assertEqual(bmi[-3:].tolist(), [21.1, 10.3, 10.9])
+        for reading, value in zip(readings, bmi):
+            reading.bmi = None
+            if reading.height and reading.weight:
+                reading.bmi = round(reading.weight / ((reading.height / 100) ** 2), 1)
+            self.assertEqual(None if np.isnan(value) else float(value), reading.bmi)
+
+    def test_rescore_writes_back_changed_scores(self):
+        user = User.objects.create_user(username="rescore")
+        readings = self.random_readings(50)
+        for reading in readings:
+            reading.user = user
+            reading.health_score = 0
+        HealthMetrics.objects.bulk_create(readings)
+        expected = {r.id: r.calculate_health_score() for r in HealthMetrics.objects.filter(user=user)}
+
+        self.assertEqual(rescore_health_metrics(HealthMetrics.objects.all(), chunk_size=16),
+                         (50, sum(score != 0 for score in expected.values())))
+        self.assertEqual(dict(HealthMetrics.objects.values_list('id', 'health_score')), expected)
+        self.assertEqual(rescore_health_metrics(HealthMetrics.objects.all()), (50, 0))
+
+
+class WearableIngestionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="wearable", password="secret")
+        self.client.force_authenticate(self.user)
+        self.url = reverse('medicalapp:health-metrics-ingest')
+        self.start = timezone.now().replace(microsecond=0) - timedelta(hours=5)
+
+    def reading(self, minutes, **values):
+        return {'timestamp': (self.start + timedelta(minutes=minutes)).isoformat(), **values}
+
+    def test_json_batches_are_scored_and_deduplicated(self):
+        readings = [
+            self.reading(0, heart_rate=70, weight=70, height=175, systolic_bp=118, diastolic_bp=78),
+            self.reading(1, heart_rate=95, daily_steps=12000),
+            self.reading(1, heart_rate=75, daily_steps=12000),
+            self.reading(2, heart_rate="fast"),
+            {'heart_rate': 60},
+        ]
+        result = self.client.post(self.url, {'readings': readings}, format='json').json()
+        self.assertEqual((result['received'], result['created'], result['duplicates']), (5, 2, 1))
+        self.assertEqual([r['index'] for r in result['rejected']], [3, 4])
+
+        for stored in HealthMetrics.objects.filter(user=self.user):
+            expected_bmi = stored.bmi
+            stored.save()
+            self.assertEqual(stored.bmi, expected_bmi)
+            self.assertEqual(stored.health_score, stored.calculate_health_score())
+        self.assertEqual(HealthMetrics.objects.get(timestamp=self.start + timedelta(minutes=1)).heart_rate, 75)
+        self.assertEqual(HealthMetricRollup.objects.get(metric='heart_rate', resolution='week').count, 2)
+
+        again = self.client.post(self.url, readings[:3], format='json').json()
+        self.assertEqual((again['created'], again['duplicates']), (0, 3))
+        self.assertEqual(HealthMetricRollup.objects.get(metric='heart_rate', resolution='week').count, 2)
+
+    def test_ndjson_batches(self):
+        body = "\n".join(json.dumps(self.reading(i, heart_rate=60 + i)) for i in range(50)) + "\n"
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+        self.assertEqual((response.status_code, response.json()['created']), (201, 50))
+
+        response = self.client.post(self.url, "{not json", content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+
+    def test_overflowing_numbers_are_rejected_rows(self):
+        body = '[%s, %s]' % (json.dumps(self.reading(0, heart_rate=70)),
+                             json.dumps(self.reading(1))[:-1] + ', "heart_rate": 1e400}')
+        response = self.client.post(self.url, body, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['rejected'], [{'index': 1, 'error': "heart_rate must be a finite number"}])
+
+    def test_single_readings_take_the_ingestion_lock(self):
+        with CaptureQueriesContext(connection) as context:
+            self.client.post(reverse('medicalapp:health-metrics-list'), {'heart_rate': 70}, format='json')
+        self.assertTrue(any('pg_advisory_xact_lock' in query['sql'] for query in context.captured_queries))
+        # Not a row lock on the user, which would hold up every insert referencing them
+        self.assertFalse(any('FOR UPDATE' in query['sql'] and '"auth_user"' in query['sql']
+                             for query in context.captured_queries))
+
+
+class HealthAlertTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="monitored", password="secret")
+        self.client.force_authenticate(self.user)
+        self.start = timezone.now().replace(microsecond=0) - timedelta(days=1)
+        self.ingest([{'heart_rate': 60 + i % 5, 'oxygen_saturation': 98} for i in range(20)])
+
+    def ingest(self, values, offset=0):
+        readings = [
+            {'timestamp': (self.start + timedelta(minutes=offset + i)).isoformat(), **reading}
+            for i, reading in enumerate(values)
+        ]
+        return self.client.post(reverse('medicalapp:health-metrics-ingest'), readings, format='json').json()
+
+    def test_limits_and_deviations_are_flagged(self):
+        self.assertFalse(HealthAlert.objects.exists())
+        result = self.ingest([{'heart_rate': 105}, {'heart_rate': 62, 'oxygen_saturation': 88}], offset=100)
+        self.assertEqual(result['alerts'], 2)
+
+        alerts = self.client.get(reverse('medicalapp:health-metrics-alerts')).json()
+        self.assertEqual(
+            [(a['metric'], a['kind'], a['severity']) for a in alerts],
+            [('oxygen_saturation', 'limit', 'critical'), ('heart_rate', 'deviation', 'warning')],
+        )
+        self.assertAlmostEqual(alerts[1]['expected'], 62, delta=1)
+        self.assertGreater(alerts[1]['z_score'], 3.5)
+
+        response = self.client.post(reverse('medicalapp:health-metrics-alerts'), {'ids': [alerts[0]['id']]},
+                                    format='json')
+        self.assertEqual(response.json(), {'acknowledged': 1})
+        active = self.client.get(reverse('medicalapp:health-metrics-alerts'), {'active': 'true'}).json()
+        self.assertEqual([a['metric'] for a in active], ['heart_rate'])
+
+    def test_placeholder_reading_is_not_observed(self):
+        newcomer = User.objects.create_user(username="newcomer")
+        self.client.force_authenticate(newcomer)
+        self.assertEqual(self.client.get(reverse('medicalapp:health-metrics-latest')).json()['heart_rate'], 72)
+        self.assertFalse(HealthBaseline.objects.filter(user=newcomer).exists())
+
+    def test_updates_are_constant_time_and_match_a_replay(self):
+        reading = HealthMetrics.objects.create(user=self.user, heart_rate=63)
+        with CaptureQueriesContext(connection) as queries:
+            observe_readings([reading])
+        self.assertLessEqual(len(queries), 5)
+
+        incremental = HealthBaseline.objects.get(user=self.user).state
+        rebuild_baselines(HealthMetrics.objects.filter(user=self.user))
+        replayed = HealthBaseline.objects.get(user=self.user).state
+        for metric in ('heart_rate', 'oxygen_saturation'):
+            self.assertEqual(replayed[metric][2], incremental[metric][2])
+            self.assertAlmostEqual(replayed[metric][0], incremental[metric][0])
+            self.assertAlmostEqual(replayed[metric][1], incremental[metric][1])
+
+
+class MetricSeriesTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="charts", password="secret")
+        self.client.force_authenticate(self.user)
+        self.start = timezone.now().replace(microsecond=0) - timedelta(days=2)
+        HealthMetrics.objects.bulk_create([
+            HealthMetrics(user=self.user, timestamp=self.start + timedelta(minutes=i),
+                          heart_rate=180 if i == 257 else 60 + i % 10)
+            for i in range(500)
+        ])
+        self.url = reverse('medicalapp:health-metrics-series')
+
+    def test_lttb_keeps_ends_and_spikes(self):
+        x = np.arange(1000, dtype=np.float64)
+        y = np.sin(x / 50)
+        y[613] = 10
+        keep = lttb(x, y, 40)
+        self.assertEqual(len(keep), 40)
+        self.assertEqual((keep[0], keep[-1]), (0, 999))
+        self.assertIn(613, keep)
+        self.assertTrue(np.all(np.diff(keep) > 0))
+        self.assertEqual(list(lttb(x[:10], y[:10], 40)), list(range(10)))
+
+    def test_series_is_capped_at_points(self):
+        response = self.client.get(self.url, {
+            'metric': 'heart_rate', 'points': 50,
+            'start': self.start.isoformat(), 'end': (self.start + timedelta(days=1)).isoformat(),
+        }).json()
+        self.assertEqual((response['count'], len(response['points'])), (500, 50))
+        self.assertEqual(response['points'][0], [self.start.isoformat(), 60.0])
+        self.assertIn(180.0, [value for _timestamp, value in response['points']])
+
+        self.assertEqual(self.client.get(self.url, {'metric': 'mood'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'metric': 'heart_rate', 'points': 5000}).status_code, 400)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="exporter", password="secret")
+        other = User.objects.create_user(username="someone-else", password="secret")
+        self.client.force_authenticate(self.user)
+        start = timezone.now().replace(microsecond=0) - timedelta(days=1)
+        HealthMetrics.objects.bulk_create(
+            [HealthMetrics(user=self.user, timestamp=start + timedelta(minutes=i), heart_rate=60 + i, weight=70.5)
+             for i in range(25)]
+            + [HealthMetrics(user=other, timestamp=start, heart_rate=99)]
+        )
+        self.url = reverse('medicalapp:health-metrics-export')
+
+    def content(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_ndjson_and_csv_cover_only_own_rows(self):
+        rows = [json.loads(line) for line in self.content(self.client.get(self.url)).decode().splitlines()]
+        self.assertEqual([row['heart_rate'] for row in rows], list(range(60, 85)))
+        self.assertEqual(rows[0]['weight'], 70.5)
+
+        response = self.client.get(self.url, {'output': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        table = list(csv.DictReader(io.StringIO(self.content(response).decode())))
+        self.assertEqual((len(table), table[-1]['heart_rate']), (25, '84'))
+
+        self.assertEqual(self.client.get(self.url, {'output': 'xml'}).status_code, 400)
+        self.client.force_authenticate(None)
+        self.assertIn(self.client.get(self.url).status_code, (401, 403))
+
+    def test_chunked_reads_use_one_cursor(self):
+        with CaptureQueriesContext(connection) as queries:
+            chunks = list(stream_export('health-metrics', 'ndjson', user=self.user, chunk_size=4))
+        self.assertEqual(len(chunks), 7)
+        self.assertEqual(len(queries), 1)
+
+    def test_parquet_round_trip(self):
+        if not parquet_available():
+            self.skipTest("pyarrow is not installed")
+        import pyarrow.parquet
+        body = self.content(self.client.get(self.url, {'output': 'parquet'}))
+        table = pyarrow.parquet.read_table(io.BytesIO(body))
+        self.assertEqual(table.num_rows, 25)
+        self.assertEqual(table.column('heart_rate').to_pylist()[-1], 84)
+        self.assertEqual(str(table.schema.field('timestamp').type), 'timestamp[us, tz=UTC]')
+
+
+class MessageArchiveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="archive", password="secret")
+        self.conversation = Conversation.objects.create(user=self.user)
+        old = timezone.now() - timedelta(days=120)
+        for i, sender in enumerate(['user', 'ai', 'user']):
+            Message.objects.create(
+                conversation=self.conversation, sender=sender,
+                content=f"message {i}", timestamp=old + timedelta(minutes=i)
+            )
+
+    def test_archive_and_read_through(self):
+        self.assertEqual(archive_inactive_conversations(90), (1, 3))
+        self.conversation.refresh_from_db()
+        self.assertTrue(self.conversation.is_archived)
+        self.assertFalse(Message.objects.filter(conversation=self.conversation).exists())
+        self.assertEqual(self.conversation.message_archive.preview, "message 0")
+
+        self.assertEqual(restore_conversation(self.conversation), 3)
+        contents = list(self.conversation.messages.order_by('timestamp').values_list('content', flat=True))
+        self.assertEqual(contents, ["message 0", "message 1", "message 2"])
+        self.assertFalse(MessageArchive.objects.exists())
+
+    def test_recent_conversations_stay_hot(self):
+        self.assertEqual(archive_inactive_conversations(365), (0, 0))
+
+
+class ConversationSearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="search", password="secret")
+        conversation = Conversation.objects.create(user=self.user)
+        Message.objects.create(conversation=conversation, sender='user', content="My knee hurts when running")
+        Message.objects.create(conversation=conversation, sender='ai', content="Knee pain can come from overuse")
+        Message.objects.create(conversation=conversation, sender='user', content="I also have a headache")
+
+    def test_ranked_highlighted_results(self):
+        response = self.client.get(reverse('medicalapp:search_conversations'), {'q': 'knee pain'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['count'], 1)
+        self.assertIn('<mark>Knee</mark>', data['results'][0]['snippet'])
+
+        response = self.client.get(reverse('medicalapp:search_conversations'), {'q': 'knee', 'page_size': 1})
+        data = response.json()
+        self.assertEqual((data['count'], data['num_pages'], len(data['results'])), (2, 2, 1))
+
+
+@override_settings(DATABASES={**settings.DATABASES, 'replica': settings.DATABASES['default']})
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def route_reads(self, request):
+        """Run the middleware and report where a read inside the view would go"""
+        routed = {}
+
+        def view(request):
+            routed['db'] = self.router.db_for_read(Doctor)
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(view)(request)
+        return routed['db'], response
+
+    def test_reads_after_a_write_stay_on_primary(self):
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Doctor), 'replica')
+            self.assertEqual(self.router.db_for_write(Doctor), 'default')
+            self.assertEqual(self.router.db_for_read(Doctor), 'default')
+        self.assertEqual(self.router.db_for_read(Doctor), 'default')
+
+    def test_get_reads_replica_until_client_writes(self):
+        db, _ = self.route_reads(self.factory.get('/api/doctors/'))
+        self.assertEqual(db, 'replica')
+
+        db, response = self.route_reads(self.factory.post('/api/appointments/'))
+        self.assertEqual(db, 'default')
+        cookie = response.cookies[STICKY_COOKIE].value
+
+        request = self.factory.get('/api/appointments/')
+        request.COOKIES[STICKY_COOKIE] = cookie
+        db, _ = self.route_reads(request)
+        self.assertEqual(db, 'default')
+
+
+@override_settings(DATABASES={**settings.DATABASES, 'replica': settings.DATABASES['default']})
+class ReplicaPinningTests(TestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(username="pinned")
+        self.token = Token.objects.create(user=self.user)
+
+    def request(self, method, token, status=200):
+        """Run the middleware for a token-authenticated request; (read alias inside the view, response)"""
+        routed = {}
+
+        def view(request):
+            routed['db'] = self.router.db_for_read(Doctor)
+            request.user = token.user  # as DRF's TokenAuthentication does
+            return HttpResponse(status=status)
+
+        request = getattr(self.factory, method)('/api/health-metrics/', HTTP_AUTHORIZATION=f"Token {token.key}")
+        response = ReplicaRoutingMiddleware(view)(request)
+        return routed['db'], response
+
+    def test_token_clients_without_cookies_read_their_writes(self):
+        self.assertEqual(self.request('get', self.token)[0], 'replica')
+        self.request('post', self.token, status=201)
+        self.assertEqual(self.request('get', self.token)[0], 'default')
+
+        other = Token.objects.create(user=User.objects.create_user(username="unpinned"))
+        self.assertEqual(self.request('get', other)[0], 'replica')
+
+    def test_failed_writes_do_not_pin(self):
+        _db, response = self.request('post', self.token, status=400)
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+        self.assertEqual(self.request('get', self.token)[0], 'replica')
+
+
+class TaxonomySnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="taxonomy", password="secret")
+        seed_catalog(self.user, 2)
+        add_free_slots(10)
+        self.url = reverse('medicalapp:appointment-chatbot')
+        self.subcategory = AppointmentSubcategory.objects.first()
+
+    def step(self, **payload):
+        return self.client.post(self.url, payload, content_type='application/json').json()
+
+    def test_taxonomy_steps_run_without_queries(self):
+        # Warm the taxonomy snapshot and the recommendation table
+        self.step(step='initial')
+        self.step(step='location_choice', selection_id='no', selected_subcategory_id=self.subcategory.id)
+        with CaptureQueriesContext(connection) as context:
+            self.step(step='initial')
+            self.step(step='category_selected', selection_id=self.subcategory.category_id)
+            self.step(step='subcategory_selected', selection_id=self.subcategory.id)
+            response = self.step(step='location_choice', selection_id='no',
+                                 selected_subcategory_id=self.subcategory.id)
+        self.assertEqual(len(data_queries(context)), 0)
+        self.assertEqual([d['name'] for d in response['options']], ["Doctor 0"])
+
+    def test_admin_changes_rebuild_snapshot(self):
+        self.step(step='initial')
+        with self.captureOnCommitCallbacks(execute=True):
+            specialty = MedicalSpecialty.objects.create(name="Extra")
+            Doctor.objects.create(name="New Doctor", specialty=specialty)
+            self.subcategory.specialties.add(specialty)
+        response = self.step(step='location_choice', selection_id='no',
+                             selected_subcategory_id=self.subcategory.id)
+        self.assertEqual([d['name'] for d in response['options']], ["Doctor 0", "New Doctor"])
+
+    def test_bumps_from_other_workers_are_seen(self):
+        snapshot = get_taxonomy()
+        # Another worker's bump touches only the shared row, never this process's cache
+        CacheVersion.objects.filter(key=TAXONOMY_VERSION_KEY).update(version=F('version') + 1)
+        self.assertIsNot(get_taxonomy(), snapshot)
+
+    def test_contact_submitted_books_appointment(self):
+        doctor = Doctor.objects.get(name="Doctor 0")
+        slot = doctor.available_slots.get(start_time=time(10, 0))
+        response = self.step(
+            step='contact_submitted', selected_doctor_id=doctor.id,
+            selected_date=slot.date.isoformat(), selected_time='10:00',
+            selected_subcategory_id=self.subcategory.id,
+            patient_name="Pat", patient_phone="555", patient_email="pat@example.com"
+        )
+        appointment = Appointment.objects.get(id=response['appointment_id'])
+        self.assertEqual((appointment.doctor, appointment.subcategory), (doctor, self.subcategory))
+        self.assertIn("Specialty 0", response['message'])
+
+    def test_session_token_replaces_echoed_selections(self):
+        doctor = Doctor.objects.get(name="Doctor 0")
+        slot = doctor.available_slots.get(start_time=time(10, 0))
+        token = self.step(step='initial')['session_token']
+
+        response = self.step(step='category_selected', session_token=token,
+                             selection_id=self.subcategory.category_id)
+        response = self.step(step='subcategory_selected', session_token=token,
+                             selection_id=self.subcategory.id)
+        if response['next_step'] == 'location_choice':
+            response = self.step(step='location_choice', session_token=token, selection_id='no')
+        self.step(step='doctor_selected', session_token=token, selection_id=doctor.id)
+        response = self.step(step='date_selected', session_token=token, selection_id=slot.date.isoformat())
+        self.assertEqual([o['id'] for o in response['options']], ['09:00', '10:00'])
+
+        rejected = self.client.post(self.url, {'step': 'time_selected', 'session_token': token,
+                                               'selection_id': '11:00'}, content_type='application/json')
+        self.assertEqual(rejected.status_code, 400)
+        self.step(step='time_selected', session_token=token, selection_id='10:00')
+
+        response = self.step(step='contact_submitted', session_token=token, patient_name="Pat",
+                             patient_phone="555", patient_email="pat@example.com")
+        self.assertEqual(response['session_token'], token)
+        appointment = Appointment.objects.get(id=response['appointment_id'])
+        self.assertEqual(
+            (appointment.doctor, appointment.subcategory, appointment.appointment_time.hour),
+            (doctor, self.subcategory, 10)
+        )
+
+    def test_sessions_are_shared_between_workers(self):
+        token = self.step(step='category_selected', selection_id=self.subcategory.category_id)['session_token']
+        # Nothing process-local: another worker (here, an emptied cache) continues the conversation
+        cache.clear()
+        response = self.step(step='subcategory_selected', session_token=token, selection_id=self.subcategory.id)
+        self.assertEqual(response['session_token'], token)
+        self.assertEqual(ChatSession.objects.get(token=token).state['selected_category_id'],
+                         self.subcategory.category_id)
+
+
+class DoctorSearchTests(TestCase):
+    def setUp(self):
+        cardiology = MedicalSpecialty.objects.create(name="Cardiology")
+        dermatology = MedicalSpecialty.objects.create(name="Dermatology")
+        Doctor.objects.create(name="Priya Sharma", specialty=dermatology, languages="English, Hindi")
+        Doctor.objects.create(name="Ravi Shankar", specialty=cardiology, languages="Tamil")
+        Doctor.objects.create(name="Anna Smith", specialty=dermatology, languages="english")
+        self.url = reverse('medicalapp:doctor-list')
+
+    def names(self, **params):
+        return [d['name'] for d in self.client.get(self.url, params).json()]
+
+    def test_partial_names_match_best_first(self):
+        self.assertEqual(self.names(search="Sharm")[0], "Priya Sharma")
+        self.assertEqual(self.names(search="cardio"), ["Ravi Shankar"])
+
+    def test_name_search_can_use_the_trigram_index(self):
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Three rows would always be scanned; check the index is usable at all
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            plan = search_doctors(Doctor.objects.all(), "Sharm").explain()
+        self.assertIn("doctor_name_trgm", plan)
+
+    def test_language_filter_uses_normalized_languages(self):
+        self.assertEqual(sorted(self.names(language="English")), ["Anna Smith", "Priya Sharma"])
+        self.assertEqual(sorted(self.names(language="tamil,hindi")), ["Priya Sharma", "Ravi Shankar"])
+
+        doctor = Doctor.objects.get(name="Anna Smith")
+        doctor.languages = "Tamil"
+        doctor.save()
+        self.assertEqual(sorted(self.names(language="tamil")), ["Anna Smith", "Ravi Shankar"])
+        languages = self.client.get(reverse('medicalapp:doctor-languages')).json()
+        self.assertIn({'name': 'english', 'doctor_count': 1}, languages)
+
+
+class AvailabilityCalendarTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="calendar", password="secret")
+        seed_catalog(self.user, 2)
+        add_free_slots(10)
+        self.doctors = list(Doctor.objects.order_by('id'))
+        self.day = timezone.localdate() + timedelta(days=1)
+        self.url = reverse('medicalapp:doctor-calendar')
+        self.params = {'doctors': ','.join(str(d.id) for d in self.doctors), 'month': self.day.strftime('%Y-%m')}
+
+    def test_counts_come_from_one_query_then_cache(self):
+        with CaptureQueriesContext(connection) as context:
+            calendar = self.client.get(self.url, self.params).json()
+            self.client.get(self.url, self.params)
+        self.assertEqual(len(data_queries(context)), 1)
+        self.assertEqual(calendar['totals'], {self.day.isoformat(): 2})
+        self.assertEqual(calendar['doctors'][str(self.doctors[0].id)], {self.day.isoformat(): 1})
+
+    def test_bookings_invalidate_the_calendar(self):
+        self.client.get(self.url, self.params)
+        with self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.create(
+                user=self.user, doctor=self.doctors[0], appointment_date=self.day,
+                appointment_time=time(10, 15), patient_name="Pat", patient_phone="555",
+                patient_email="pat@example.com"
+            )
+        calendar = self.client.get(self.url, self.params).json()
+        self.assertEqual(calendar['doctors'][str(self.doctors[0].id)], {})
+        self.assertEqual(calendar['totals'], {self.day.isoformat(): 1})
+
+    def test_rejects_bad_parameters(self):
+        self.assertEqual(self.client.get(self.url, {'month': '2026-13', 'doctors': '1'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'doctors': ''}).status_code, 400)
+        availability = reverse('medicalapp:doctor-availability', args=[self.doctors[0].id])
+        self.assertEqual(self.client.get(availability, {'days': 'many'}).status_code, 400)
+
+
+class RecordingTransport:
+    def __init__(self, fail_ids=()):
+        self.sent = []
+        self.fail_ids = set(fail_ids)
+
+    def send_batch(self, messages):
+        self.sent.extend(messages)
+        return ["gateway down" if m['reminder_id'] in self.fail_ids else None for m in messages]
+
+
+@override_settings(APPOINTMENT_REMINDER_LEADS=[24 * 60, 2 * 60])
+class AppointmentReminderTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="reminders", password="secret")
+        specialty = MedicalSpecialty.objects.create(name="General")
+        self.doctor = Doctor.objects.create(name="Rao", specialty=specialty)
+        self.now = timezone.now()
+
+    def book(self, hours, status='scheduled'):
+        start = timezone.localtime(self.now + timedelta(hours=hours))
+        return Appointment.objects.create(
+            user=self.user, doctor=self.doctor, appointment_date=start.date(),
+            appointment_time=start.time().replace(second=0, microsecond=0), status=status,
+            patient_name="Pat", patient_phone="555", patient_email="pat@example.com"
+        )
+
+    def test_each_appointment_gets_the_tightest_lead_once(self):
+        soon, later, far = self.book(1), self.book(5), self.book(30)
+        self.book(3, status='cancelled')
+        self.assertEqual(schedule_reminders(now=self.now), 2)
+        self.assertEqual(schedule_reminders(now=self.now), 0)
+        self.assertEqual(
+            sorted(AppointmentReminder.objects.values_list('appointment_id', 'lead_minutes')),
+            sorted([(soon.id, 120), (later.id, 24 * 60)])
+        )
+
+        transport = RecordingTransport()
+        with CaptureQueriesContext(connection) as context:
+            outcome = dispatch_due(transport, now=self.now)
+        # Both are already inside their lead, so both go out in one batch
+        self.assertEqual((outcome['sent'], len(transport.sent)), (2, 2))
+        self.assertLessEqual(len(context.captured_queries), 6)
+        self.assertIn("Dr. Rao", transport.sent[0]['body'])
+
+    def test_failed_sends_retry_then_give_up(self):
+        self.book(1)
+        schedule_reminders(now=self.now)
+        reminder = AppointmentReminder.objects.get()
+        transport = RecordingTransport(fail_ids=[reminder.id])
+
+        self.assertEqual(dispatch_due(transport, now=self.now)['pending'], 1)
+        self.assertEqual(dispatch_due(transport, now=self.now), {})
+        for minutes in (6, 12):
+            dispatch_due(transport, now=self.now + timedelta(minutes=minutes))
+        reminder.refresh_from_db()
+        self.assertEqual((reminder.status, reminder.attempts, reminder.last_error), ('failed', 3, "gateway down"))
+
+
+class DoctorRecommendationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="recommend", password="secret")
+        seed_catalog(self.user, 1)
+        add_free_slots(10)
+        self.subcategory = AppointmentSubcategory.objects.get()
+        specialty = self.subcategory.specialties.get()
+        self.busy = Doctor.objects.get()
+        self.free = Doctor.objects.create(name="Free Doctor", specialty=specialty, languages="Hindi")
+        self.idle = Doctor.objects.create(name="No Slots", specialty=specialty)
+        DoctorAvailability.objects.create(
+            doctor=self.free, date=timezone.localdate() + timedelta(days=1),
+            start_time=time(8, 0), end_time=time(8, 30)
+        )
+
+    def ranked_names(self, **params):
+        url = reverse('medicalapp:appointmentsubcategory-doctors', args=[self.subcategory.id])
+        return [d['name'] for d in self.client.get(url, params).json()]
+
+    def test_ranks_by_next_slot_load_and_language(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(refresh_recommendations(), 3)
+        self.assertEqual(self.ranked_names(), ["Free Doctor", "Doctor 0", "No Slots"])
+
+        recommendation = DoctorRecommendation.objects.get(doctor=self.busy)
+        self.assertEqual((recommendation.upcoming_appointments, recommendation.free_slots_week), (1, 1))
+        # Speaking the patient's language outweighs a slightly later slot
+        self.assertEqual(self.ranked_names(language='english')[0], "Doctor 0")
+
+    def test_chatbot_lists_recommended_doctors_first(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_recommendations()
+        response = self.client.post(reverse('medicalapp:appointment-chatbot'), {
+            'step': 'location_choice', 'selection_id': 'no', 'selected_subcategory_id': self.subcategory.id,
+            'language': 'hi'
+        }, content_type='application/json').json()
+        self.assertEqual([d['name'] for d in response['options']], ["Free Doctor", "Doctor 0", "No Slots"])
+        self.assertIsNotNone(response['options'][0]['next_available'])
+        self.assertIsNone(response['options'][2]['next_available'])
+
+
+class SlotReservationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="booking", password="secret")
+        seed_catalog(self.user, 1)
+        add_free_slots(10)
+        self.slot = DoctorAvailability.objects.get(start_time=time(10, 0))
+        self.url = reverse('medicalapp:appointment-chatbot')
+
+    def book(self, **extra):
+        payload = {
+            'step': 'contact_submitted', 'selected_doctor_id': self.slot.doctor_id,
+            'selected_date': self.slot.date.isoformat(), 'selected_time': '10:00',
+            'patient_name': "Pat", 'patient_phone': "555", 'patient_email': "pat@example.com",
+            **extra
+        }
+        return self.client.post(self.url, payload, content_type='application/json')
+
+    def test_slot_can_only_be_booked_once(self):
+        self.assertEqual(self.book().status_code, 200)
+        self.assertEqual(self.book().status_code, 409)
+        self.slot.refresh_from_db()
+        self.assertFalse(self.slot.is_available)
+
+    def test_retry_with_idempotency_key_returns_original_booking(self):
+        first = self.book(idempotency_key="retry-1").json()
+        second = self.book(idempotency_key="retry-1").json()
+        self.assertEqual(first['appointment_id'], second['appointment_id'])
+        self.assertEqual(Appointment.objects.filter(doctor_id=self.slot.doctor_id).count(), 2)
+
+    def test_cancel_releases_slot(self):
+        appointment_id = self.book().json()['appointment_id']
+        self.client.post(reverse('medicalapp:appointment-cancel', args=[appointment_id]))
+        self.assertEqual(self.book().status_code, 200)
+
+    def test_cancelling_twice_keeps_a_rebooked_slot(self):
+        cancel_url = reverse('medicalapp:appointment-cancel', args=[self.book().json()['appointment_id']])
+        self.client.post(cancel_url)
+        self.assertEqual(self.book().status_code, 200)
+        self.client.post(cancel_url)
+        self.slot.refresh_from_db()
+        self.assertFalse(self.slot.is_available)
+
+    def test_idempotency_keys_are_per_user(self):
+        details = {'patient_name': "Pat", 'patient_phone': "555", 'patient_email': "pat@example.com"}
+        first, _ = book_appointment(self.user, self.slot.doctor_id, self.slot.date, time(10, 0),
+                                    idempotency_key="shared", **details)
+        DoctorAvailability.objects.create(doctor_id=self.slot.doctor_id, date=self.slot.date,
+                                          start_time=time(11, 0), end_time=time(11, 30))
+        other = User.objects.create_user(username="other-patient", password="secret")
+        second, created = book_appointment(other, self.slot.doctor_id, self.slot.date, time(11, 0),
+                                           idempotency_key="shared", **details)
+        self.assertTrue(created)
+        self.assertEqual((second.user, second.appointment_time), (other, time(11, 0)))
+
+    def test_rest_writes_claim_move_and_free_slots(self):
+        self.client.force_login(self.user)
+        list_url = reverse('medicalapp:appointment-list')
+        appointment = Appointment.objects.get(appointment_time=time(9, 0))
+        payload = {
+            'user': self.user.id, 'doctor': self.slot.doctor_id, 'appointment_date': self.slot.date.isoformat(),
+            'appointment_time': '10:00', 'category': appointment.category_id,
+            'subcategory': appointment.subcategory_id, 'patient_name': "Pat", 'patient_phone': "555",
+            'patient_email': "pat@example.com",
+        }
+        response = self.client.post(list_url, payload, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        # No slot at 11:00, so nothing to claim
+        second = self.client.post(list_url, {**payload, 'appointment_time': '11:00'}, content_type='application/json')
+        self.assertEqual(second.status_code, 409, second.content)
+        self.slot.refresh_from_db()
+        self.assertFalse(self.slot.is_available)
+
+        # Moving the fixture's 9:00 booking into the freed 10:00 slot
+        detail_url = reverse('medicalapp:appointment-detail', args=[response.json()['id']])
+        self.client.delete(detail_url)
+        nine = DoctorAvailability.objects.get(doctor_id=self.slot.doctor_id, start_time=time(9, 0))
+        nine.is_available = False
+        nine.save()
+        response = self.client.patch(reverse('medicalapp:appointment-detail', args=[appointment.id]),
+                                     {'appointment_time': '10:00'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        nine.refresh_from_db()
+        self.slot.refresh_from_db()
+        self.assertEqual((nine.is_available, self.slot.is_available), (True, False))
+
+
+class EarliestSlotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="slots", password="secret")
+        specialty = MedicalSpecialty.objects.create(name="Orthopedics")
+        category = AppointmentCategory.objects.create(name="Bones")
+        self.subcategory = AppointmentSubcategory.objects.create(category=category, name="Knee pain")
+        self.subcategory.specialties.add(specialty)
+        self.english = Doctor.objects.create(name="English", specialty=specialty, languages="English")
+        self.hindi = Doctor.objects.create(name="Hindi", specialty=specialty, languages="English, Hindi")
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        for doctor, hours in [(self.english, [9, 11]), (self.hindi, [10, 12])]:
+            for hour in hours:
+                DoctorAvailability.objects.create(
+                    doctor=doctor, date=tomorrow, start_time=time(hour, 0), end_time=time(hour, 30)
+                )
+        # Booked at 09:10, inside the 09:00-09:30 slot
+        Appointment.objects.create(
+            user=self.user, doctor=self.english, appointment_date=tomorrow,
+            appointment_time=time(9, 10), patient_name="Pat", patient_phone="555",
+            patient_email="pat@example.com"
+        )
+        self.url = reverse('medicalapp:appointmentsubcategory-earliest-slots', args=[self.subcategory.pk])
+
+    def test_earliest_slots_across_doctors(self):
+        response = self.client.get(self.url, {'count': 3})
+        slots = [(s['doctor_name'], s['start_time']) for s in response.json()]
+        self.assertEqual(slots, [("Hindi", "10:00:00"), ("English", "11:00:00"), ("Hindi", "12:00:00")])
+
+    def test_language_filter(self):
+        response = self.client.get(self.url, {'count': 5, 'language': 'hindi'})
+        self.assertEqual({s['doctor_name'] for s in response.json()}, {"Hindi"})
+
+    def test_single_writes_update_the_index_in_place(self):
+        def earliest():
+            return [(s['doctor_name'], s['start_time']) for s in self.client.get(self.url, {'count': 3}).json()]
+
+        index = get_slot_index()
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = Appointment.objects.create(
+                user=self.user, doctor=self.hindi, appointment_date=tomorrow, appointment_time=time(10, 0),
+                patient_name="Sam", patient_phone="555", patient_email="sam@example.com"
+            )
+        self.assertEqual(earliest(), [("English", "11:00:00"), ("Hindi", "12:00:00")])
+
+        # Moving the booking frees the day it left
+        booking = Appointment.objects.get(pk=booking.pk)
+        booking.appointment_date = tomorrow + timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.save()
+        self.assertEqual(earliest()[0], ("Hindi", "10:00:00"))
+        self.assertIs(get_slot_index(), index)
+
+
+class AvailabilityTemplateTests(TestCase):
+    def setUp(self):
+        specialty = MedicalSpecialty.objects.create(name="General")
+        self.doctor = Doctor.objects.create(name="Weekly", specialty=specialty)
+        self.monday = timezone.localdate() + timedelta(days=7 - timezone.localdate().weekday())
+        self.template = AvailabilityTemplate.objects.create(
+            doctor=self.doctor, weekday=0, start_time=time(9, 0), end_time=time(11, 0), slot_minutes=30
+        )
+
+    def test_expansion_is_idempotent_and_honours_exceptions(self):
+        AvailabilityException.objects.create(date=self.monday + timedelta(days=7), reason="Holiday")
+        AvailabilityException.objects.create(
+            doctor=self.doctor, date=self.monday, start_time=time(10, 0), end_time=time(11, 0)
+        )
+        self.assertEqual(sync_availability(self.monday, 14), (2, 0, 0))
+        self.assertEqual(sync_availability(self.monday, 14), (0, 0, 0))
+        starts = list(self.doctor.available_slots.order_by('start_time').values_list('start_time', flat=True))
+        self.assertEqual(starts, [time(9, 0), time(9, 30)])
+
+    def test_template_changes_remove_only_free_generated_slots(self):
+        sync_availability(self.monday, 7)
+        booked = self.doctor.available_slots.get(start_time=time(9, 0))
+        booked.is_available = False
+        booked.save()
+        DoctorAvailability.objects.create(
+            doctor=self.doctor, date=self.monday, start_time=time(15, 0), end_time=time(15, 30)
+        )
+        self.template.delete()
+        self.assertEqual(sync_availability(self.monday, 7), (0, 0, 3))
+        remaining = set(self.doctor.available_slots.values_list('start_time', flat=True))
+        self.assertEqual(remaining, {time(9, 0), time(15, 0)})
+
+    def test_slots_booked_during_a_sync_are_kept(self):
+        sync_availability(self.monday, 7)
+        self.template.delete()
+        bulk_create = DoctorAvailability.objects.bulk_create
+
+        def book_meanwhile(*args, **kwargs):
+            # A booking commits after the sync has read the slots
+            DoctorAvailability.objects.filter(start_time=time(9, 0)).update(is_available=False)
+            return bulk_create(*args, **kwargs)
+
+        with mock.patch.object(DoctorAvailability.objects, 'bulk_create', book_meanwhile):
+            self.assertEqual(sync_availability(self.monday, 7), (0, 0, 3))
+        self.assertEqual(list(self.doctor.available_slots.values_list('start_time', flat=True)), [time(9, 0)])
+
+    def test_templates_need_a_slot_length_and_working_time(self):
+        self.template.slot_minutes = 0
+        with self.assertRaises(ValidationError):
+            self.template.full_clean()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.template.save()
+
+        invalid = AvailabilityTemplate(doctor=self.doctor, weekday=0, start_time=time(11, 0), end_time=time(9, 0))
+        with self.assertRaises(ValidationError):
+            invalid.full_clean()
+        invalid.slot_minutes = 0
+        self.assertEqual(list(template_slots(invalid, self.monday)), [])
@@ -11,6 +11,7 @@ from . import views
 router = DefaultRouter()
 router.register(r'medications', MedicationViewSet, basename='medication')
 router.register(r'medication-logs', MedicationLogViewSet, basename='medication-log')
+router.register(r'dose-schedules', views.DoseScheduleViewSet, basename='dose-schedule')
 router.register(r'medical-specialties', views.MedicalSpecialtyViewSet)
 router.register(r'doctors', views.DoctorViewSet)
 router.register(r'appointment-categories', views.AppointmentCategoryViewSet)
@@ -27,6 +28,7 @@ urlpatterns = [
     path('conversation/process/', views.process_conversation, name='process_conversation'),
     path('chatbot/query/', views.unified_chatbot_handler, name='unified_chatbot'),
     path('conversations/manage/', views.manage_conversations, name='manage_conversations'),
+    path('conversations/search/', views.search_conversations, name='search_conversations'),
     path('api/', include(router.urls)),
     path('api/medication-management/', views.medication_api, name='medication_api'),
     path('api/appointment-chatbot/', views.appointment_chatbot, name='appointment-chatbot'),
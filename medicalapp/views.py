@@ -1,6 +1,8 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from .models import Conversation, Message, MedicalImage
+from .archive import restore_conversation
+from .search import search_messages
 from ai_utils.speech_processor import SpeechProcessor
 from ai_utils.medical_image_analyzer import MedicalImageAnalyzer
 from django.http import JsonResponse
@@ -16,6 +18,7 @@ import json
 from ai_utils.ai_processor import AIPromptProcessor
 from ai_utils.speech_processor import SpeechProcessor
 from django.contrib.auth.models import User  # Add this import
+from django.core.paginator import Paginator
 
 # Helper function to get default user
 def get_default_user():
@@ -79,6 +82,7 @@ def start_conversation(request):
             if conversation_id:
                 try:
                     conversation = Conversation.objects.get(id=conversation_id)
+                    restore_conversation(conversation)
                 except Conversation.DoesNotExist:
                     conversation = Conversation.objects.create(user=default_user)
             else:
@@ -210,6 +214,7 @@ def process_voice_message(request):
         if conversation_id:
             try:
                 conversation = Conversation.objects.get(id=conversation_id)
+                restore_conversation(conversation)
                 previous_messages = conversation.messages.order_by('-timestamp')[:5]
                 
                 if previous_messages:
@@ -273,6 +278,7 @@ def upload_medical_image(request):
         if conversation_id:
             try:
                 conversation = Conversation.objects.get(id=conversation_id)
+                restore_conversation(conversation)
             except Conversation.DoesNotExist:
                 conversation = Conversation.objects.create(user=default_user)
         else:
@@ -365,6 +371,7 @@ def process_conversation(request):
         if conversation_id:
             try:
                 conversation = Conversation.objects.get(id=conversation_id)
+                restore_conversation(conversation)
                 # Get the last 5 messages
                 previous_messages = conversation.messages.order_by('-timestamp')[:5]
                 
@@ -440,6 +447,7 @@ def unified_chatbot_handler(request):
         if conversation_id:
             try:
                 conversation = Conversation.objects.get(id=conversation_id)
+                restore_conversation(conversation)
             except Conversation.DoesNotExist:
                 conversation = Conversation.objects.create(user=default_user)
         else:
@@ -545,20 +553,28 @@ def manage_conversations(request):
         # Get all conversations for default user
         conversations = Conversation.objects.filter(
             user=default_user
-        ).order_by('-last_interaction')
+        ).select_related('message_archive').defer('message_archive__payload').order_by('-last_interaction')
         
         result = []
         for conv in conversations:
-            # Get first message as preview
-            first_message = conv.messages.filter(sender='user').first()
-            message_preview = first_message.content[:50] if first_message else "No messages"
+            if conv.is_archived:
+                # Archived conversations keep their summary on the archive row
+                archive = getattr(conv, 'message_archive', None)
+                message_count = archive.message_count if archive else 0
+                message_preview = archive.preview if archive and archive.preview else "No messages"
+            else:
+                # Get first message as preview
+                first_message = conv.messages.filter(sender='user').first()
+                message_preview = first_message.content[:50] if first_message else "No messages"
+                message_count = conv.messages.count()
             
             result.append({
                 "id": conv.id,
                 "start_time": conv.start_time,
                 "last_interaction": conv.last_interaction,
-                "message_count": conv.messages.count(),
-                "preview": message_preview
+                "message_count": message_count,
+                "preview": message_preview,
+                "archived": conv.is_archived
             })
         
         return JsonResponse({"conversations": result})
@@ -586,22 +602,76 @@ def manage_conversations(request):
     return JsonResponse({"error": "Method not allowed"}, status=405)
 
 
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+
+@csrf_exempt
+def search_conversations(request):
+    """
+    Search the user's conversation history.
+
+    GET ?q=<terms>&page=<n>&page_size=<n>
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    query_text = request.GET.get("q", "").strip()
+    if not query_text:
+        return JsonResponse({"error": "Search query required"}, status=400)
+
+    try:
+        page_size = min(int(request.GET.get("page_size", SEARCH_PAGE_SIZE)), SEARCH_MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({"error": "Invalid page size"}, status=400)
+
+    default_user = get_default_user()
+    results = search_messages(default_user, query_text).values(
+        'id', 'conversation_id', 'sender', 'timestamp', 'rank', 'snippet'
+    )
+    page = Paginator(results, max(page_size, 1)).get_page(request.GET.get("page"))
+
+    return JsonResponse({
+        "query": query_text,
+        "count": page.paginator.count,
+        "page": page.number,
+        "num_pages": page.paginator.num_pages,
+        "results": list(page.object_list)
+    })
+
+
 
 
 # Add to medicalapp/views.py
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import Medication, MedicationLog
-from .serializers import MedicationSerializer, MedicationLogSerializer
+from .models import Medication, MedicationLog, DoseSchedule
+from .serializers import MedicationSerializer, MedicationLogSerializer, DoseScheduleSerializer, DoseLogEntrySerializer
+from .mixins import RelatedQuerysetMixin, ConditionalListMixin, ExportMixin
+from .filters import DoctorSearchFilter, DoctorLanguageFilter
+from .caching import cached_medication_stats
+from .taxonomy import get_taxonomy, VERSION_KEY as TAXONOMY_VERSION_KEY
+from .slots import earliest_slots, get_slot_index
+from .availability import month_calendar, month_range, MAX_CALENDAR_DOCTORS
+from .recommendations import rank_doctors, recommended_doctor_options
+from .adherence import adherence_report
+from .dose_logging import MAX_DOSE_ENTRIES, log_doses
+from .dosing import doses_due, todays_doses
+from .refills import forecast_refills
+from .booking import book_appointment, cancel_appointment, change_appointment, delete_appointment, SlotUnavailable
+from .chat_sessions import load_session, save_session, apply_session, remember_selections
 from django.contrib.auth.decorators import login_required
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.authentication import TokenAuthentication, SessionAuthentication
+from rest_framework.exceptions import APIException
 from datetime import datetime, date, timedelta
 
 # Medication viewset for RESTful API
-class MedicationViewSet(viewsets.ModelViewSet):
+class MedicationViewSet(ConditionalListMixin, RelatedQuerysetMixin, viewsets.ModelViewSet):
     serializer_class = MedicationSerializer
+    modified_field = 'updated_at'
+    prefetch_related_fields = ('schedules__times',)
     # authentication_classes = [TokenAuthentication, SessionAuthentication]
     # permission_classes = [IsAuthenticated]
     
@@ -632,6 +702,8 @@ class MedicationViewSet(viewsets.ModelViewSet):
             status='taken',
             notes=request.data.get('notes', '')
         )
+        # Logging the dose took it off the remaining supply
+        medication.refresh_from_db(fields=['remaining', 'remaining_quantity', 'updated_at'])
         
         return Response({
             'status': 'success',
@@ -639,47 +711,109 @@ class MedicationViewSet(viewsets.ModelViewSet):
             'medication': MedicationSerializer(medication).data
         })
     
+    @action(detail=False, methods=['post'])
+    def log_doses(self, request):
+        """
+        Log several doses in one request: {"doses": [{"medication_id", "status",
+        "taken_at" (optional), "notes" (optional)}, ...]}
+        """
+        entries = DoseLogEntrySerializer(data=request.data.get('doses'), many=True)
+        entries.is_valid(raise_exception=True)
+        if not entries.validated_data:
+            return Response({'error': 'doses must not be empty'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(entries.validated_data) > MAX_DOSE_ENTRIES:
+            return Response({'error': f'At most {MAX_DOSE_ENTRIES} doses per request'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        # One query both loads the medications and checks they belong to the user
+        ids = {entry['medication_id'] for entry in entries.validated_data}
+        medications = self.get_queryset().in_bulk(ids)
+        unknown = sorted(ids - medications.keys())
+        if unknown:
+            return Response({'error': 'Medication not found', 'medication_ids': unknown},
+                            status=status.HTTP_404_NOT_FOUND)
+        
+        logs = log_doses(medications, entries.validated_data)
+        return Response({
+            'logged': len(logs),
+            'medications': [
+                {'id': medication.id, 'status': medication.status}
+                for medication in sorted(medications.values(), key=lambda m: m.id)
+            ],
+        }, status=status.HTTP_201_CREATED)
+    
     @action(detail=False, methods=['get'])
     def today(self, request):
-        """Get all medications due today"""
-         # Get today's date
-        today = timezone.now().date()
+        """Medications with a dose scheduled today, each with today's doses and their status"""
+        medications = list(self.filter_queryset(self.get_queryset()))
+        doses = todays_doses(medications)
+        
+        # Medications stay listed after being taken so the day's checklist is complete
+        today_meds = [medication for medication in medications if medication.id in doses]
+        data = self.get_serializer(today_meds, many=True).data
+        for item in data:
+            item['doses'] = [
+                {'due_at': timezone.localtime(dose['due_at']).isoformat(), 'status': dose['status']}
+                for dose in doses[item['id']]
+            ]
+        return Response(data)
     
-         # Get all medications regardless of status (not just 'upcoming')
-         # This ensures medications remain visible after being marked as taken
-        today_meds = self.get_queryset()
+    @action(detail=False, methods=['get'])
+    def due(self, request):
+        """Doses due in the next ?minutes= minutes (default 60, at most a day)"""
+        try:
+            minutes = min(int(request.query_params.get('minutes', 60)), 24 * 60)
+        except ValueError:
+            return Response({'error': 'minutes must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        users = [request.user] if request.user.is_authenticated else None
+        return Response([
+            {
+                'due_at': timezone.localtime(dose['due_at']).isoformat(),
+                'medication_id': dose['medication'].id,
+                'medication': dose['medication'].name,
+                'schedule_id': dose['schedule_id'],
+            }
+            for dose in doses_due(minutes=minutes, users=users)
+        ])
     
-        # You can add additional filtering if needed, like:
-        # today_meds = today_meds.filter(next_dose_date=today)
-        # But for simplicity, we're showing all medications
-        
-        serializer = self.get_serializer(today_meds, many=True)
-        return Response(serializer.data)
+    @action(detail=False, methods=['get'])
+    def adherence(self, request):
+        """Adherence over the last 7, 30 and 90 days, overall and per medication, from the daily rollups"""
+        medications = list(self.filter_queryset(self.get_queryset()))
+        return Response(adherence_report(medications))
+    
+    @action(detail=False, methods=['get'])
+    def refills(self, request):
+        """Projected run-out date of each medication from its remaining supply and schedules, soonest first"""
+        forecasts = [
+            {'id': medication_id, **forecast}
+            for medication_id, forecast in forecast_refills(self.filter_queryset(self.get_queryset())).items()
+        ]
+        forecasts.sort(key=lambda f: (f['run_out_date'] is None, f['run_out_date'] or date.max, f['id']))
+        return Response(forecasts)
     
     @action(detail=False, methods=['get'])
     def stats(self, request):
-        """Get medication statistics"""
-        queryset = self.get_queryset()
-        total = queryset.count()
-        upcoming = queryset.filter(status='upcoming').count()
-        taken = queryset.filter(status='taken').count()
-        missed = queryset.filter(status='missed').count()
-        
-        # Calculate refill reminders
-        today = date.today()
-        refill_soon = queryset.filter(refill_date__lte=today + timedelta(days=7)).count()
-        
-        return Response({
-            'total': total,
-            'upcoming': upcoming,
-            'taken': taken,
-            'missed': missed,
-            'refill_soon': refill_soon
-        })
+        """Get medication statistics (one aggregate query, cached per user)"""
+        user_id = request.user.id if request.user.is_authenticated else None
+        stats = cached_medication_stats(user_id, self.get_queryset())
+        return Response(stats)
+
+# Dosing schedules for medications
+class DoseScheduleViewSet(RelatedQuerysetMixin, viewsets.ModelViewSet):
+    serializer_class = DoseScheduleSerializer
+    prefetch_related_fields = ('times',)
+    
+    def get_queryset(self):
+        schedules = DoseSchedule.objects.order_by('medication_id', 'id')
+        if self.request.user.is_authenticated:
+            return schedules.filter(medication__user=self.request.user)
+        return schedules
 
 # Medication logs viewset
-class MedicationLogViewSet(viewsets.ReadOnlyModelViewSet):
+class MedicationLogViewSet(ExportMixin, RelatedQuerysetMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = MedicationLogSerializer
+    export_dataset = 'medication-logs'
     # authentication_classes = [TokenAuthentication, SessionAuthentication]
     # permission_classes = [IsAuthenticated]
     
@@ -753,17 +887,18 @@ def medication_api(request):
                 medication.remaining = data["remaining"]
             if "status" in data:
                 medication.status = data["status"]
-                
-                # Create log entry if status changed to taken
-                if data["status"] == "taken":
-                    MedicationLog.objects.create(
-                        medication=medication,
-                        status="taken",
-                        notes=data.get("notes", "")
-                    )
             
             medication.save()
             
+            # Log doses marked taken or missed (after saving, since logging a
+            # dose updates the remaining supply in the database)
+            if data.get("status") in ("taken", "missed"):
+                MedicationLog.objects.create(
+                    medication=medication,
+                    status=data["status"],
+                    notes=data.get("notes", "")
+                )
+            
             return JsonResponse({"message": "Medication updated successfully"})
             
         except Medication.DoesNotExist:
@@ -803,7 +938,7 @@ from django.views.decorators.csrf import csrf_exempt
 from .models import (
     MedicalSpecialty, Doctor, DoctorAvailability,
     AppointmentCategory, AppointmentSubcategory, 
-    LocationOption, Appointment
+    LocationOption, Appointment, Language
 )
 from .serializers import (
     MedicalSpecialtySerializer, DoctorSerializer, DoctorAvailabilitySerializer,
@@ -813,7 +948,10 @@ from .serializers import (
 import json
 from datetime import datetime, timedelta
 from django.utils import timezone
-from django.db.models import Q
+from django.db.models import Count, Q
+
+# Upper bound for DoctorViewSet.availability's ?days=, which returns raw slot rows
+MAX_AVAILABILITY_DAYS = 31
 
 # Dictionary for multilingual support
 # Can be extended with more languages as needed
@@ -980,23 +1118,28 @@ def get_translation(key, language, *args):
     return translation
 
 
-class MedicalSpecialtyViewSet(viewsets.ReadOnlyModelViewSet):
+class MedicalSpecialtyViewSet(ConditionalListMixin, RelatedQuerysetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = MedicalSpecialty.objects.all()
     serializer_class = MedicalSpecialtySerializer
+    version_key = TAXONOMY_VERSION_KEY
 
 
-class DoctorViewSet(viewsets.ReadOnlyModelViewSet):
+class DoctorViewSet(ConditionalListMixin, RelatedQuerysetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Doctor.objects.filter(is_active=True)
     serializer_class = DoctorSerializer
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['name', 'specialty__name']
+    version_key = TAXONOMY_VERSION_KEY
+    select_related_fields = ('specialty',)
+    filter_backends = [DoctorSearchFilter, DoctorLanguageFilter]
     
     @action(detail=True, methods=['get'])
     def availability(self, request, pk=None):
         """Get doctor's available time slots"""
         doctor = self.get_object()
-        # Get date range (default: next 7 days)
-        days = int(request.query_params.get('days', 7))
+        # Get date range (default: next 7 days, at most a month)
+        try:
+            days = min(int(request.query_params.get('days', 7)), MAX_AVAILABILITY_DAYS)
+        except ValueError:
+            return Response({'error': 'days must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
         start_date = timezone.now().date()
         end_date = start_date + timedelta(days=days)
         
@@ -1006,28 +1149,59 @@ class DoctorViewSet(viewsets.ReadOnlyModelViewSet):
             date__gte=start_date,
             date__lte=end_date,
             is_available=True
-        ).order_by('date', 'start_time')
+        ).select_related('doctor').order_by('date', 'start_time')
         
         serializer = DoctorAvailabilitySerializer(availabilities, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def calendar(self, request):
+        """Free slot counts per day for one month: ?doctors=1,2,3&month=YYYY-MM"""
+        try:
+            doctor_ids = [int(i) for i in request.query_params.get('doctors', '').split(',') if i.strip()]
+            month = request.query_params.get('month') or timezone.localdate().strftime('%Y-%m')
+            year, month = (int(part) for part in month.split('-'))
+            month_range(year, month)
+        except ValueError:
+            return Response({'error': 'doctors must be comma-separated ids and month YYYY-MM'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not doctor_ids or len(doctor_ids) > MAX_CALENDAR_DOCTORS:
+            return Response({'error': f'Pass between 1 and {MAX_CALENDAR_DOCTORS} doctor ids'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        calendar = month_calendar(doctor_ids, year, month)
+        return Response({'month': f'{year}-{month:02d}', **calendar})
+
+    @action(detail=False, methods=['get'])
+    def languages(self, request):
+        """Languages with the number of active doctors speaking each, for the language filter"""
+        languages = Language.objects.filter(doctors__is_active=True).annotate(
+            doctor_count=Count('doctors')
+        ).order_by('name').values('name', 'doctor_count')
+        return Response(list(languages))
+
 
-class AppointmentCategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class AppointmentCategoryViewSet(ConditionalListMixin, RelatedQuerysetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = AppointmentCategory.objects.all()
     serializer_class = AppointmentCategorySerializer
+    version_key = TAXONOMY_VERSION_KEY
+    prefetch_related_fields = ('specialties', 'subcategories__locations', 'subcategories__specialties')
     
     @action(detail=True, methods=['get'])
     def subcategories(self, request, pk=None):
         """Get subcategories for a specific category"""
         category = self.get_object()
-        subcategories = category.subcategories.all()
+        subcategories = category.subcategories.prefetch_related(
+            *AppointmentSubcategoryViewSet.prefetch_related_fields
+        )
         serializer = AppointmentSubcategorySerializer(subcategories, many=True)
         return Response(serializer.data)
 
 
-class AppointmentSubcategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class AppointmentSubcategoryViewSet(RelatedQuerysetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = AppointmentSubcategory.objects.all()
     serializer_class = AppointmentSubcategorySerializer
+    prefetch_related_fields = ('locations', 'specialties')
     
     @action(detail=True, methods=['get'])
     def locations(self, request, pk=None):
@@ -1039,19 +1213,52 @@ class AppointmentSubcategoryViewSet(viewsets.ReadOnlyModelViewSet):
     
     @action(detail=True, methods=['get'])
     def doctors(self, request, pk=None):
-        """Get recommended doctors for this subcategory"""
+        """Get recommended doctors for this subcategory, best match first (?language= adds a bonus)"""
         subcategory = self.get_object()
         # Get doctors with matching specialties
         doctors = Doctor.objects.filter(
             specialty__in=subcategory.specialties.all(),
             is_active=True
-        ).distinct()
+        ).select_related(*DoctorViewSet.select_related_fields).distinct()
+        doctors = rank_doctors(
+            doctors, request.query_params.get('language'),
+            id_of=lambda d: d.id, languages_of=lambda d: d.languages
+        )
         serializer = DoctorSerializer(doctors, many=True)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get'])
+    def earliest_slots(self, request, pk=None):
+        """Earliest free slots across all doctors for this subcategory"""
+        subcategory = get_taxonomy().subcategory(pk)
+        if subcategory is None:
+            return Response({'error': 'Subcategory not found'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            count = min(int(request.query_params.get('count', 5)), 50)
+            days = int(request.query_params['days']) if 'days' in request.query_params else None
+        except ValueError:
+            return Response({'error': 'count and days must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        slots = earliest_slots(
+            get_taxonomy(), subcategory, count=count,
+            language=request.query_params.get('language'), days=days
+        )
+        return Response(slots)
 
-class AppointmentViewSet(viewsets.ModelViewSet):
+
+class SlotConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "This time slot is no longer available"
+    default_code = 'slot_unavailable'
+
+
+class AppointmentViewSet(ExportMixin, ConditionalListMixin, RelatedQuerysetMixin, viewsets.ModelViewSet):
     serializer_class = AppointmentSerializer
+    export_dataset = 'appointments'
+    # Rows carry doctor/category names, so taxonomy edits change the list too
+    version_key = TAXONOMY_VERSION_KEY
+    modified_field = 'updated_at'
+    select_related_fields = ('doctor', 'category', 'subcategory', 'location')
     
     def get_queryset(self):
         # For now, return all appointments
@@ -1064,7 +1271,26 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         user = self.request.user
         if not user or not user.is_authenticated:
             user = User.objects.first()  # Default user
-        serializer.save(user=user)
+        # Through the booking module, so the slot is claimed atomically like chatbot bookings
+        fields = dict(serializer.validated_data)
+        fields.pop('user', None)
+        doctor = fields.pop('doctor')
+        try:
+            serializer.instance, _created = book_appointment(
+                user, doctor.id, fields.pop('appointment_date'), fields.pop('appointment_time'), **fields
+            )
+        except SlotUnavailable as e:
+            raise SlotConflict(str(e))
+
+    def perform_update(self, serializer):
+        """Moving or cancelling an appointment moves or frees its slot"""
+        try:
+            serializer.instance = change_appointment(serializer.instance, **serializer.validated_data)
+        except SlotUnavailable as e:
+            raise SlotConflict(str(e))
+
+    def perform_destroy(self, instance):
+        delete_appointment(instance)
     
     @action(detail=False, methods=['get'])
     def user_appointments(self, request):
@@ -1075,7 +1301,9 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             from django.contrib.auth.models import User
             user = User.objects.first()
             
-        appointments = Appointment.objects.filter(user=user).order_by('-appointment_date')
+        appointments = self.optimize_queryset(
+            Appointment.objects.filter(user=user).order_by('-appointment_date')
+        )
         serializer = self.get_serializer(appointments, many=True)
         return Response(serializer.data)
     
@@ -1083,8 +1311,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
     def cancel(self, request, pk=None):
         """Cancel an appointment"""
         appointment = self.get_object()
-        appointment.status = 'cancelled'
-        appointment.save()
+        cancel_appointment(appointment)
         serializer = self.get_serializer(appointment)
         return Response(serializer.data)
 
@@ -1098,278 +1325,221 @@ def appointment_chatbot(request):
         step = data.get('step', 'initial')
         language = data.get('language', 'en')
         
-        # Get the default user for appointments
-        from django.contrib.auth.models import User
-        default_user = User.objects.first()
+        # Categories, subcategories, locations and doctor lists come from the
+        # in-memory taxonomy snapshot, so these steps don't query the database
+        taxonomy = get_taxonomy()
+        
+        # Selections already resolved in earlier steps live in a server-side
+        # session, so clients only need to send session_token and selection_id
+        session_token, session = load_session(data.get('session_token'), reset=(step == 'initial'))
+        apply_session(session, data)
+        
+        def respond(payload, status=200):
+            remember_selections(session, payload)
+            save_session(session_token, session)
+            payload['session_token'] = session_token
+            return JsonResponse(payload, status=status)
         
         # Handle different steps of the conversation
         if step == 'initial':
             # Return categories
-            categories = AppointmentCategory.objects.all()
-            categories_data = [{'id': c.id, 'name': c.name} for c in categories]
+            categories_data = taxonomy.category_options()
             
             # Get welcome message in the requested language
             message = get_translation('welcome', language)
             
-            return JsonResponse({
+            return respond({
                 'message': message,
                 'options': categories_data,
                 'next_step': 'category_selected'
             })
             
         elif step == 'category_selected':
-            category_id = data.get('selection_id')
-            try:
-                category = AppointmentCategory.objects.get(id=category_id)
-                subcategories = category.subcategories.all()
-                subcategories_data = [{'id': s.id, 'name': s.name} for s in subcategories]
+            category = taxonomy.category(data.get('selection_id'))
+            if category is None:
+                return respond({'error': 'Category not found'}, status=400)
+            
+            subcategories_data = taxonomy.subcategory_options(category)
+            
+            message = get_translation('select_subcategory', language, category['name'])
+            
+            return respond({
+                'message': message,
+                'options': subcategories_data,
+                'selected_category': category['name'],
+                'selected_category_id': category['id'],
+                'next_step': 'subcategory_selected'
+            })
                 
-                message = get_translation('select_subcategory', language, category.name)
+        elif step == 'subcategory_selected':
+            subcategory = taxonomy.subcategory(data.get('selection_id'))
+            if subcategory is None:
+                return respond({'error': 'Subcategory not found'}, status=400)
+            
+            # Check if this subcategory has locations
+            if subcategory['location_ids']:
+                message = get_translation('specific_location', language, subcategory['name'])
                 
-                return JsonResponse({
+                return respond({
                     'message': message,
-                    'options': subcategories_data,
-                    'selected_category': category.name,
-                    'selected_category_id': category.id,
-                    'next_step': 'subcategory_selected'
+                    'options': [
+                        {'id': 'yes', 'name': get_translation('yes', language)},
+                        {'id': 'no', 'name': get_translation('no', language)}
+                    ],
+                    'selected_subcategory': subcategory['name'],
+                    'selected_subcategory_id': subcategory['id'],
+                    'next_step': 'location_choice'
                 })
+            else:
+                # Skip location step and go to specialist recommendation
+                doctors_data = recommended_doctor_options(taxonomy, subcategory, language)
+                specialty_name = taxonomy.primary_specialty_name(subcategory)
                 
-            except AppointmentCategory.DoesNotExist:
-                return JsonResponse({'error': 'Category not found'}, status=400)
-                
-        elif step == 'subcategory_selected':
-            subcategory_id = data.get('selection_id')
-            try:
-                subcategory = AppointmentSubcategory.objects.get(id=subcategory_id)
-                # Check if this subcategory has locations
-                locations = subcategory.locations.all()
+                message = get_translation('recommend_doctor', language, specialty_name, subcategory['name'])
                 
-                if locations.exists():
-                    locations_data = [{'id': l.id, 'name': l.name} for l in locations]
-                    
-                    message = get_translation('specific_location', language, subcategory.name)
-                    
-                    return JsonResponse({
-                        'message': message,
-                        'options': [
-                            {'id': 'yes', 'name': get_translation('yes', language)},
-                            {'id': 'no', 'name': get_translation('no', language)}
-                        ],
-                        'selected_subcategory': subcategory.name,
-                        'selected_subcategory_id': subcategory.id,
-                        'next_step': 'location_choice'
-                    })
-                else:
-                    # Skip location step and go to specialist recommendation
-                    # Find recommended doctors
-                    doctors = Doctor.objects.filter(
-                        specialty__in=subcategory.specialties.all(),
-                        is_active=True
-                    ).distinct()
-                    
-                    doctors_data = []
-                    for doctor in doctors:
-                        doctors_data.append({
-                            'id': doctor.id,
-                            'name': doctor.name,
-                            'specialty': doctor.specialty.name
-                        })
-                    
-                    # Get first specialty name for recommendation
-                    specialty_name = subcategory.specialties.first().name if subcategory.specialties.exists() else ""
-                    
-                    message = get_translation('recommend_doctor', language, specialty_name, subcategory.name)
-                    
-                    return JsonResponse({
-                        'message': message,
-                        'options': doctors_data,
-                        'selected_subcategory': subcategory.name,
-                        'selected_subcategory_id': subcategory.id,
-                        'next_step': 'doctor_selected'
-                    })
-                    
-            except AppointmentSubcategory.DoesNotExist:
-                return JsonResponse({'error': 'Subcategory not found'}, status=400)
+                return respond({
+                    'message': message,
+                    'options': doctors_data,
+                    'selected_subcategory': subcategory['name'],
+                    'selected_subcategory_id': subcategory['id'],
+                    'selected_location_id': None,
+                    'next_step': 'doctor_selected'
+                })
                 
         elif step == 'location_choice':
             choice = data.get('selection_id')
-            subcategory_id = data.get('selected_subcategory_id')
-            
-            try:
-                subcategory = AppointmentSubcategory.objects.get(id=subcategory_id)
-                
-                if choice == 'yes':
-                    # Show location options
-                    locations = subcategory.locations.all()
-                    locations_data = [{'id': l.id, 'name': l.name} for l in locations]
-                    
-                    message = get_translation('select_location', language)
-                    
-                    return JsonResponse({
-                        'message': message,
-                        'options': locations_data,
-                        'selected_subcategory': subcategory.name,
-                        'selected_subcategory_id': subcategory.id,
-                        'next_step': 'location_selected'
-                    })
-                else:
-                    # Skip location selection, go to specialist recommendation
-                    doctors = Doctor.objects.filter(
-                        specialty__in=subcategory.specialties.all(),
-                        is_active=True
-                    ).distinct()
-                    
-                    doctors_data = []
-                    for doctor in doctors:
-                        doctors_data.append({
-                            'id': doctor.id,
-                            'name': doctor.name,
-                            'specialty': doctor.specialty.name
-                        })
-                    
-                    # Get first specialty name for recommendation
-                    specialty_name = subcategory.specialties.first().name if subcategory.specialties.exists() else ""
-                    
-                    message = get_translation('recommend_doctor', language, specialty_name, subcategory.name)
-                    
-                    return JsonResponse({
-                        'message': message,
-                        'options': doctors_data,
-                        'selected_subcategory': subcategory.name,
-                        'selected_subcategory_id': subcategory.id,
-                        'next_step': 'doctor_selected'
-                    })
-                    
-            except AppointmentSubcategory.DoesNotExist:
-                return JsonResponse({'error': 'Subcategory not found'}, status=400)
-                
-        elif step == 'location_selected':
-            location_id = data.get('selection_id')
-            subcategory_id = data.get('selected_subcategory_id')
+            subcategory = taxonomy.subcategory(data.get('selected_subcategory_id'))
+            if subcategory is None:
+                return respond({'error': 'Subcategory not found'}, status=400)
             
-            try:
-                location = LocationOption.objects.get(id=location_id)
-                subcategory = AppointmentSubcategory.objects.get(id=subcategory_id)
-                
-                # Find recommended doctors
-                doctors = Doctor.objects.filter(
-                    specialty__in=subcategory.specialties.all(),
-                    is_active=True
-                ).distinct()
+            if choice == 'yes':
+                # Show location options
+                locations_data = taxonomy.location_options(subcategory)
                 
-                doctors_data = []
-                for doctor in doctors:
-                    doctors_data.append({
-                        'id': doctor.id,
-                        'name': doctor.name,
-                        'specialty': doctor.specialty.name
-                    })
+                message = get_translation('select_location', language)
                 
-                # Get first specialty name for recommendation
-                specialty_name = subcategory.specialties.first().name if subcategory.specialties.exists() else ""
+                return respond({
+                    'message': message,
+                    'options': locations_data,
+                    'selected_subcategory': subcategory['name'],
+                    'selected_subcategory_id': subcategory['id'],
+                    'next_step': 'location_selected'
+                })
+            else:
+                # Skip location selection, go to specialist recommendation
+                doctors_data = recommended_doctor_options(taxonomy, subcategory, language)
+                specialty_name = taxonomy.primary_specialty_name(subcategory)
                 
-                message = get_translation('recommend_doctor_with_location', language, 
-                                         specialty_name, subcategory.name, location.name)
+                message = get_translation('recommend_doctor', language, specialty_name, subcategory['name'])
                 
-                return JsonResponse({
+                return respond({
                     'message': message,
                     'options': doctors_data,
-                    'selected_location': location.name,
-                    'selected_location_id': location.id,
-                    'selected_subcategory': subcategory.name,
-                    'selected_subcategory_id': subcategory.id,
+                    'selected_subcategory': subcategory['name'],
+                    'selected_subcategory_id': subcategory['id'],
+                    'selected_location_id': None,
                     'next_step': 'doctor_selected'
                 })
                 
-            except (LocationOption.DoesNotExist, AppointmentSubcategory.DoesNotExist):
-                return JsonResponse({'error': 'Location or subcategory not found'}, status=400)
+        elif step == 'location_selected':
+            location = taxonomy.location(data.get('selection_id'))
+            subcategory = taxonomy.subcategory(data.get('selected_subcategory_id'))
+            if location is None or subcategory is None:
+                return respond({'error': 'Location or subcategory not found'}, status=400)
+            
+            # Find recommended doctors
+            doctors_data = recommended_doctor_options(taxonomy, subcategory, language)
+            specialty_name = taxonomy.primary_specialty_name(subcategory)
+            
+            message = get_translation('recommend_doctor_with_location', language, 
+                                     specialty_name, subcategory['name'], location['name'])
+            
+            return respond({
+                'message': message,
+                'options': doctors_data,
+                'selected_location': location['name'],
+                'selected_location_id': location['id'],
+                'selected_subcategory': subcategory['name'],
+                'selected_subcategory_id': subcategory['id'],
+                'next_step': 'doctor_selected'
+            })
                 
         elif step == 'doctor_selected':
-            doctor_id = data.get('selection_id')
+            doctor = taxonomy.doctor(data.get('selection_id'))
+            if doctor is None:
+                return respond({'error': 'Doctor not found'}, status=400)
             
-            try:
-                doctor = Doctor.objects.get(id=doctor_id)
-                
-                # Get available dates (next 7 days)
-                start_date = timezone.now().date()
-                end_date = start_date + timedelta(days=7)
-                
-                # Get unique available dates
-                availabilities = DoctorAvailability.objects.filter(
-                    doctor=doctor,
-                    date__gte=start_date,
-                    date__lte=end_date,
-                    is_available=True
-                ).order_by('date')
-                
-                # Get unique dates
-                unique_dates = availabilities.values_list('date', flat=True).distinct()
-                
-                dates_data = []
-                for date in unique_dates:
-                    date_format = '%A, %B %d, %Y' if language == 'en' else '%Y-%m-%d'
-                    dates_data.append({
-                        'id': date.strftime('%Y-%m-%d'),
-                        'name': date.strftime(date_format)
-                    })
-                
-                message = get_translation('select_date', language, doctor.name)
-                
-                return JsonResponse({
-                    'message': message,
-                    'options': dates_data,
-                    'selected_doctor': doctor.name,
-                    'selected_doctor_id': doctor.id,
-                    'next_step': 'date_selected'
+            # Dates with a free slot today through a week out, read from the slot index
+            unique_dates = get_slot_index().available_dates(doctor['id'], days=8)
+            
+            dates_data = []
+            for date in unique_dates:
+                date_format = '%A, %B %d, %Y' if language == 'en' else '%Y-%m-%d'
+                dates_data.append({
+                    'id': date.strftime('%Y-%m-%d'),
+                    'name': date.strftime(date_format)
                 })
-                
-            except Doctor.DoesNotExist:
-                return JsonResponse({'error': 'Doctor not found'}, status=400)
+            
+            message = get_translation('select_date', language, doctor['name'])
+            
+            return respond({
+                'message': message,
+                'options': dates_data,
+                'selected_doctor': doctor['name'],
+                'selected_doctor_id': doctor['id'],
+                'next_step': 'date_selected'
+            })
                 
         elif step == 'date_selected':
             date_str = data.get('selection_id')  # Format: 'YYYY-MM-DD'
-            doctor_id = data.get('selected_doctor_id')
+            doctor = taxonomy.doctor(data.get('selected_doctor_id'))
             
             try:
-                doctor = Doctor.objects.get(id=doctor_id)
+                if doctor is None:
+                    raise Doctor.DoesNotExist
                 selected_date = datetime.strptime(date_str, '%Y-%m-%d').date()
                 
                 # Get available time slots for the selected date
-                availabilities = DoctorAvailability.objects.filter(
-                    doctor=doctor,
+                start_times = DoctorAvailability.objects.filter(
+                    doctor_id=doctor['id'],
                     date=selected_date,
                     is_available=True
-                ).order_by('start_time')
+                ).order_by('start_time').values_list('start_time', flat=True)
                 
                 time_slots = []
-                for slot in availabilities:
+                for start_time in start_times:
                     time_slots.append({
-                        'id': f"{slot.start_time.strftime('%H:%M')}",
-                        'name': f"{slot.start_time.strftime('%I:%M %p')}"
+                        'id': f"{start_time.strftime('%H:%M')}",
+                        'name': f"{start_time.strftime('%I:%M %p')}"
                     })
                 
                 date_format = '%A, %B %d, %Y' if language == 'en' else '%d-%m-%Y'
                 formatted_date = selected_date.strftime(date_format)
                 
-                message = get_translation('available_slots', language, doctor.name, formatted_date)
+                message = get_translation('available_slots', language, doctor['name'], formatted_date)
                 
-                return JsonResponse({
+                return respond({
                     'message': message,
                     'options': time_slots,
                     'selected_date': date_str,
-                    'selected_doctor': doctor.name,
-                    'selected_doctor_id': doctor.id,
+                    'selected_doctor': doctor['name'],
+                    'selected_doctor_id': doctor['id'],
                     'next_step': 'time_selected'
                 })
                 
-            except (Doctor.DoesNotExist, ValueError):
-                return JsonResponse({'error': 'Doctor not found or invalid date format'}, status=400)
+            except (Doctor.DoesNotExist, TypeError, ValueError):
+                return respond({'error': 'Doctor not found or invalid date format'}, status=400)
                 
         elif step == 'time_selected':
             time_str = data.get('selection_id')  # Format: 'HH:MM'
             doctor_id = data.get('selected_doctor_id')
             date_str = data.get('selected_date')  # Format: 'YYYY-MM-DD'
             
+            # The previous step recorded which slots it offered, so the choice
+            # is checked against the session rather than the database
+            if 'offered_times' in session and time_str not in session['offered_times']:
+                return respond({'error': 'Time slot not available'}, status=400)
+            
             # No database lookup needed here, just build the contact form
             message = get_translation('contact_info', language)
             
@@ -1380,7 +1550,7 @@ def appointment_chatbot(request):
                 {'name': 'patient_email', 'label': get_translation('email_address', language), 'type': 'email', 'required': True}
             ]
             
-            return JsonResponse({
+            return respond({
                 'message': message,
                 'form_fields': form_fields,
                 'selected_time': time_str,
@@ -1402,17 +1572,23 @@ def appointment_chatbot(request):
             category_id = data.get('selected_category_id')
             subcategory_id = data.get('selected_subcategory_id')
             location_id = data.get('selected_location_id')
+            idempotency_key = data.get('idempotency_key') or request.headers.get('Idempotency-Key')
             
             try:
                 # Convert string inputs to appropriate types
                 appointment_date = datetime.strptime(date_str, '%Y-%m-%d').date()
                 appointment_time = datetime.strptime(time_str, '%H:%M').time()
                 
-                # Get required objects
-                doctor = Doctor.objects.get(id=doctor_id)
-                category = AppointmentCategory.objects.get(id=category_id) if category_id else None
-                subcategory = AppointmentSubcategory.objects.get(id=subcategory_id) if subcategory_id else None
-                location = LocationOption.objects.get(id=location_id) if location_id else None
+                # Resolve selections from the taxonomy snapshot
+                doctor = taxonomy.doctor(doctor_id)
+                if doctor is None:
+                    raise Doctor.DoesNotExist("Doctor matching query does not exist.")
+                category = taxonomy.category(category_id) if category_id else None
+                subcategory = taxonomy.subcategory(subcategory_id) if subcategory_id else None
+                location = taxonomy.location(location_id) if location_id else None
+                if (category_id and category is None) or (subcategory_id and subcategory is None) \
+                        or (location_id and location is None):
+                    return respond({'error': 'Category, subcategory or location not found'}, status=400)
                 
                 # Get user (or default)
                 from django.contrib.auth.models import User
@@ -1420,15 +1596,17 @@ def appointment_chatbot(request):
                 if not user:
                     user = User.objects.first()  # Default user
                 
-                # Create appointment
-                appointment = Appointment.objects.create(
-                    user=user,
-                    doctor=doctor,
+                # Claim the slot and create the appointment atomically; retries
+                # carrying the same idempotency key get the original booking back
+                appointment, _created = book_appointment(
+                    doctor_id=doctor['id'],
                     appointment_date=appointment_date,
                     appointment_time=appointment_time,
-                    category=category,
-                    subcategory=subcategory,
-                    location=location,
+                    idempotency_key=idempotency_key,
+                    user=user,
+                    category_id=category['id'] if category else None,
+                    subcategory_id=subcategory['id'] if subcategory else None,
+                    location_id=location['id'] if location else None,
                     patient_name=patient_name,
                     patient_phone=patient_phone,
                     patient_email=patient_email,
@@ -1441,26 +1619,28 @@ def appointment_chatbot(request):
                 formatted_time = appointment_time.strftime('%I:%M %p')
                 
                 # Generate appointment details
-                reason = f"{subcategory.name}" if subcategory else ""
+                reason = f"{subcategory['name']}" if subcategory else ""
                 if location:
-                    reason += f" ({location.name})"
+                    reason += f" ({location['name']})"
                 
                 # Create confirmation message
                 message = get_translation('appointment_confirmed', language,
-                                         doctor.name, doctor.specialty.name,
+                                         doctor['name'], doctor['specialty'],
                                          formatted_date, formatted_time, reason)
                 
                 # Return success response
-                return JsonResponse({
+                return respond({
                     'message': message,
                     'appointment_id': appointment.id,
                     'next_step': 'confirmation',
                     'follow_up_message': get_translation('anything_else', language)
                 })
                 
+            except SlotUnavailable as e:
+                return respond({'error': str(e)}, status=409)
             except Exception as e:
                 # Handle any errors
-                return JsonResponse({'error': str(e)}, status=400)
+                return respond({'error': str(e)}, status=400)
     
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
@@ -1473,14 +1653,25 @@ from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django.contrib.auth import get_user_model
-from .models import HealthMetrics
-from .serializers import HealthMetricsSerializer
+from django.db import transaction
+from .models import HealthMetrics, HealthAlert
+from .serializers import HealthMetricsSerializer, HealthAlertSerializer
+from io import BytesIO
+
+from .ingestion import IngestionError, ingest_readings, lock_user_readings, parse_payload
+from .health_rollups import (
+    METRICS, RESOLUTIONS, MAX_TREND_DAYS, add_readings, recompute_periods, choose_resolution, trends
+)
+from .anomalies import MAX_ALERTS, observe_readings
+from .series import SERIES_METRICS, DEFAULT_POINTS, MAX_POINTS, MAX_SERIES_DAYS, metric_series
+from django.utils.dateparse import parse_datetime
 
 User = get_user_model()
 
-class HealthMetricsViewSet(viewsets.ModelViewSet):
+class HealthMetricsViewSet(ExportMixin, RelatedQuerysetMixin, viewsets.ModelViewSet):
     serializer_class = HealthMetricsSerializer
     queryset = HealthMetrics.objects.all()
+    export_dataset = 'health-metrics'
     
     def get_queryset(self):
         """Return metrics for default user"""
@@ -1490,10 +1681,15 @@ class HealthMetricsViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         """Auto-assign to default user if not authenticated"""
         user = self.request.user if self.request.user.is_authenticated else User.objects.first()
-        instance = serializer.save(user=user)
-        # Calculate score on creation
-        instance.calculate_health_score()
-        instance.save()
+        with transaction.atomic():
+            # Same lock as bulk ingestion, so a batch re-sent at the same time can't count this reading too
+            lock_user_readings(user)
+            instance = serializer.save(user=user)
+            # Calculate score on creation
+            instance.calculate_health_score()
+            instance.save()
+            add_readings([instance])
+            observe_readings([instance])
 
     def update(self, request, *args, **kwargs):
         """Override update to ensure health score recalculation"""
@@ -1509,11 +1705,133 @@ class HealthMetricsViewSet(viewsets.ModelViewSet):
         instance.refresh_from_db()
         instance.calculate_health_score()
         instance.save()
+        # An edit can lower a min or max, so the reading's periods are recomputed
+        recompute_periods(instance.user_id, [instance.timestamp])
         
         # Return updated data including new score
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['post'])
+    def ingest(self, request):
+        """
+        Bulk-load wearable readings: a JSON array (or {"readings": [...]}) or
+        NDJSON (Content-Type: application/x-ndjson), each reading with an ISO
+        8601 timestamp. Readings already stored for that timestamp are skipped.
+        """
+        # Read the stream directly: wearable batches outgrow DATA_UPLOAD_MAX_MEMORY_SIZE,
+        # which request.body enforces; parse_payload applies its own limit
+        try:
+            readings = parse_payload(request.stream or BytesIO(), request.content_type)
+        except IngestionError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        user = request.user if request.user.is_authenticated else User.objects.first()
+        result = ingest_readings(user, readings)
+        return Response(result, status=status.HTTP_201_CREATED if result['created'] else status.HTTP_200_OK)
+
+    def perform_destroy(self, instance):
+        user_id, timestamp = instance.user_id, instance.timestamp
+        instance.delete()
+        recompute_periods(user_id, [timestamp])
+
+    @action(detail=False, methods=['get'])
+    def trends(self, request):
+        """
+        Min/max/mean/last per period from the rollups:
+        ?metrics=heart_rate,weight (default all) &days=90 &resolution=day|week|auto
+        """
+        metrics = request.query_params.get('metrics')
+        metrics = metrics.split(',') if metrics else METRICS
+        unknown = sorted(set(metrics) - set(METRICS))
+        if unknown:
+            return Response({'error': f"Unknown metrics: {', '.join(unknown)}", 'metrics': METRICS},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            return Response({'error': 'days must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= days <= MAX_TREND_DAYS:
+            return Response({'error': f'days must be between 1 and {MAX_TREND_DAYS}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        resolution = request.query_params.get('resolution', 'auto')
+        if resolution != 'auto' and resolution not in RESOLUTIONS:
+            return Response({'error': 'resolution must be day, week or auto'}, status=status.HTTP_400_BAD_REQUEST)
+        resolution = choose_resolution(resolution, days)
+        
+        user = request.user if request.user.is_authenticated else User.objects.first()
+        return Response({
+            'resolution': resolution,
+            'days': days,
+            'metrics': trends(user, metrics, resolution, days),
+        })
+
+    @action(detail=False, methods=['get'])
+    def series(self, request):
+        """
+        One metric's readings downsampled for charting (LTTB):
+        ?metric=heart_rate &start=<ISO> &end=<ISO> (default the last 30 days) &points=300
+        """
+        metric = request.query_params.get('metric')
+        if metric not in SERIES_METRICS:
+            return Response({'error': 'metric is required', 'metrics': SERIES_METRICS},
+                            status=status.HTTP_400_BAD_REQUEST)
+        bounds = {}
+        for name in ('start', 'end'):
+            value = request.query_params.get(name)
+            if value is None:
+                continue
+            bounds[name] = parse_datetime(value)
+            if bounds[name] is None:
+                return Response({'error': f'{name} must be an ISO 8601 datetime'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(bounds[name]):
+                bounds[name] = timezone.make_aware(bounds[name])
+        end = bounds.get('end') or timezone.now()
+        start = bounds.get('start') or end - timedelta(days=30)
+        if not timedelta(0) <= end - start <= timedelta(days=MAX_SERIES_DAYS):
+            return Response({'error': f'start must be before end and at most {MAX_SERIES_DAYS} days earlier'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            points = int(request.query_params.get('points', DEFAULT_POINTS))
+        except ValueError:
+            return Response({'error': 'points must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 3 <= points <= MAX_POINTS:
+            return Response({'error': f'points must be between 3 and {MAX_POINTS}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        user = request.user if request.user.is_authenticated else User.objects.first()
+        return Response({
+            'metric': metric,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            **metric_series(user, metric, start, end, points),
+        })
+
+    @action(detail=False, methods=['get', 'post'])
+    def alerts(self, request):
+        """
+        GET: the user's most recent alerts (?active=true for unacknowledged
+        only, ?severity=critical). POST {"ids": [...]}: acknowledge them.
+        """
+        user = request.user if request.user.is_authenticated else User.objects.first()
+        alerts = HealthAlert.objects.filter(user=user)
+        if request.method == 'POST':
+            ids = request.data.get('ids')
+            if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+                return Response({'error': 'ids must be a list of alert ids'}, status=status.HTTP_400_BAD_REQUEST)
+            acknowledged = alerts.filter(id__in=ids, acknowledged_at__isnull=True).update(
+                acknowledged_at=timezone.now()
+            )
+            return Response({'acknowledged': acknowledged})
+
+        if request.query_params.get('active') == 'true':
+            alerts = alerts.filter(acknowledged_at__isnull=True)
+        severity = request.query_params.get('severity')
+        if severity:
+            alerts = alerts.filter(severity=severity)
+        serializer = HealthAlertSerializer(alerts.order_by('-reading_at')[:MAX_ALERTS], many=True)
+        return Response(serializer.data)
+
     @action(detail=False, methods=['get'])
     def latest(self, request):
         """Get latest metrics for the user"""
@@ -1523,20 +1841,24 @@ class HealthMetricsViewSet(viewsets.ModelViewSet):
             
             if not metrics:
                 # Create default metrics if none exist
-                metrics = HealthMetrics.objects.create(
-                    user=user,
-                    systolic_bp=120,
-                    diastolic_bp=80,
-                    heart_rate=72,
-                    blood_glucose=90,
-                    weight=70,  # kg
-                    height=175,  # cm
-                    daily_steps=8000,
-                    sleep_hours=8,
-                    oxygen_saturation=98
-                )
-                metrics.calculate_health_score()
-                metrics.save()
+                with transaction.atomic():
+                    lock_user_readings(user)
+                    metrics = HealthMetrics.objects.create(
+                        user=user,
+                        systolic_bp=120,
+                        diastolic_bp=80,
+                        heart_rate=72,
+                        blood_glucose=90,
+                        weight=70,  # kg
+                        height=175,  # cm
+                        daily_steps=8000,
+                        sleep_hours=8,
+                        oxygen_saturation=98
+                    )
+                    metrics.calculate_health_score()
+                    metrics.save()
+                    add_readings([metrics])
+                    # Placeholder values, not a measurement: keep them out of the anomaly baseline
                 
             serializer = self.get_serializer(metrics)
             return Response(serializer.data)